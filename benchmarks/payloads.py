@@ -0,0 +1,139 @@
+"""
+Geradores de Payloads para o Benchmark.
+
+Produz uma mistura realista de webhooks da Evolution API (comandos, conversa,
+mensagens de outros grupos, status, presença e media), ou reproduz os payloads
+de um ficheiro de histórico capturado com `/v1/webhook/inspect/history`.
+"""
+import base64
+import itertools
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Pesos padrão da mistura de tráfego (tipo -> peso relativo).
+DEFAULT_MIX = {
+    "command": 10,
+    "chatter": 30,
+    "other_group": 20,
+    "status": 20,
+    "presence": 15,
+    "media": 5,
+}
+
+_counter = itertools.count()
+
+
+def _message_id() -> str:
+    return f"BENCH{next(_counter):012d}"
+
+
+def _message(instance: str, remote_jid: str, text: Optional[str] = None,
+             message: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "event": "messages.upsert",
+        "instance": instance,
+        "data": {
+            "key": {
+                "remoteJid": remote_jid,
+                "fromMe": False,
+                "id": _message_id(),
+                "participant": f"55119{random.randint(10000000, 99999999)}@s.whatsapp.net",
+            },
+            "pushName": "Bench",
+            "message": message if message is not None else {"conversation": text},
+            "messageType": "conversation",
+            "messageTimestamp": int(time.time()),
+        },
+        "sender": "bench@s.whatsapp.net",
+    }
+
+
+class PayloadGenerator:
+    """Gera payloads sintéticos segundo a mistura de tipos configurada."""
+
+    def __init__(self, instance: str, target_group: str, mix: Optional[Dict[str, int]] = None,
+                 media_bytes: int = 32 * 1024, seed: Optional[int] = None):
+        self.instance = instance
+        self.target_group = target_group
+        self.mix = mix or DEFAULT_MIX
+        self._kinds = list(self.mix)
+        self._weights = [self.mix[kind] for kind in self._kinds]
+        self._random = random.Random(seed)
+        self._media_blob = base64.b64encode(os.urandom(media_bytes)).decode()
+
+    def next(self) -> Tuple[str, Dict[str, Any]]:
+        """Retorna (tipo, payload)."""
+        kind = self._random.choices(self._kinds, self._weights)[0]
+        return kind, getattr(self, f"_{kind}")()
+
+    def _command(self):
+        return _message(self.instance, self.target_group, "/ping")
+
+    def _chatter(self):
+        words = self._random.randint(3, 60)
+        return _message(self.instance, self.target_group, " ".join(["bla"] * words))
+
+    def _other_group(self):
+        return _message(self.instance, f"1203630{self._random.randint(10**9, 10**10)}@g.us", "/ping")
+
+    def _status(self):
+        return {
+            "event": "messages.update",
+            "instance": self.instance,
+            "data": {
+                "keyId": _message_id(),
+                "remoteJid": self.target_group,
+                "fromMe": True,
+                "status": self._random.choice(["DELIVERY_ACK", "READ", "SERVER_ACK"]),
+            },
+        }
+
+    def _presence(self):
+        return {
+            "event": "presence.update",
+            "instance": self.instance,
+            "data": {"id": self.target_group, "presences": {"x@s.whatsapp.net": {"lastKnownPresence": "composing"}}},
+        }
+
+    def _media(self):
+        return _message(self.instance, self.target_group, message={
+            "imageMessage": {
+                "mimetype": "image/jpeg",
+                "caption": "",
+                "jpegThumbnail": self._media_blob,
+            },
+        })
+
+
+class HistoryReplay:
+    """
+    Reproduz payloads capturados. Aceita um JSON com a lista retornada por
+    `/inspect/history` ou um ficheiro JSONL (um payload ou entrada por linha).
+    Os ids das mensagens são reescritos para não serem descartados como duplicados.
+    """
+
+    def __init__(self, path: str):
+        text = Path(path).read_text(encoding="utf-8")
+        try:
+            items = json.loads(text)
+            if not isinstance(items, list):
+                items = [items]
+        except json.JSONDecodeError:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        self._payloads: List[Dict[str, Any]] = [
+            item["payload"] if isinstance(item, dict) and "payload" in item else item for item in items
+        ]
+        if not self._payloads:
+            raise ValueError(f"Nenhum payload encontrado em {path}.")
+        self._cycle = itertools.cycle(self._payloads)
+
+    def next(self) -> Tuple[str, Dict[str, Any]]:
+        payload = json.loads(json.dumps(next(self._cycle)))
+        key = payload.get("data", {}).get("key") if isinstance(payload.get("data"), dict) else None
+        if isinstance(key, dict) and "id" in key:
+            key["id"] = _message_id()
+        return f"replay:{payload.get('event', 'unknown')}", payload
@@ -0,0 +1,304 @@
+"""
+Benchmark de Carga do Bot.
+
+Sobe um stub da Evolution API e a aplicação (`main:app`) em processos uvicorn
+separados, envia uma mistura realista de webhooks para `/v1/webhook/inspect`
+e reporta:
+
+- throughput (pedidos/s) e percentis de latência por endpoint e por tipo de payload;
+- latência de resposta de ponta a ponta (webhook de comando -> chamada ao stub);
+- percentis por etapa do pipeline, a partir de `/metrics`;
+- crescimento de memória (RSS) do processo da aplicação.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.run --requests 5000 --concurrency 50
+    python -m benchmarks.run --history-file captura.json --output resultado.json
+    python -m benchmarks.run --env DISPATCH_MODE=http --stub-latency-ms 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import httpx
+from benchmarks.payloads import DEFAULT_MIX, HistoryReplay, PayloadGenerator
+
+ROOT = Path(__file__).resolve().parent.parent
+INSTANCE = "bench"
+TARGET_GROUP = "120363000000000000@g.us"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pick(0.50) * 1000,
+        "p90_ms": pick(0.90) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _rss_kb(pid: int) -> Optional[int]:
+    """RSS do processo em KB (Linux); None noutros sistemas."""
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _histogram_percentiles(metrics_text: str, metric: str, label: str) -> Dict[str, Dict[str, float]]:
+    """Estima percentis a partir dos buckets de um histograma Prometheus."""
+    pattern = re.compile(rf'^{metric}_bucket\{{(.*)\}} (\S+)$')
+    buckets: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+    for line in metrics_text.splitlines():
+        match = pattern.match(line)
+        if not match:
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1)))
+        le = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        series = ",".join(f"{k}={v}" for k, v in labels.items() if k != "le") if label == "*" else labels.get(label, "")
+        buckets[series].append((le, float(match.group(2))))
+    result = {}
+    for series, points in buckets.items():
+        points.sort()
+        total = points[-1][1]
+        if total == 0:
+            continue
+        summary = {"count": total}
+        for name, q in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p99_ms", 0.99)):
+            target = q * total
+            upper = next((le for le, count in points if count >= target), float("inf"))
+            summary[name] = upper * 1000
+        result[series] = summary
+    return result
+
+
+class Server:
+    """Um processo uvicorn gerido pelo benchmark."""
+
+    def __init__(self, app: str, port: int, env: Dict[str, str], cwd: Path):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self._cmd = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1",
+                     "--port", str(port), "--log-level", "warning"]
+        self._env = env
+        self._cwd = cwd
+        self.process: Optional[subprocess.Popen] = None
+
+    async def __aenter__(self) -> "Server":
+        self.process = subprocess.Popen(self._cmd, env=self._env, cwd=self._cwd)
+        async with httpx.AsyncClient() as client:
+            for _ in range(100):
+                try:
+                    await client.get(self.url + "/docs")
+                    return self
+                except httpx.HTTPError:
+                    await asyncio.sleep(0.1)
+        raise RuntimeError(f"O servidor {' '.join(self._cmd)} não arrancou.")
+
+    async def __aexit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def _drive(app_url: str, source, total: int, concurrency: int,
+                 history_ratio: float) -> Tuple[Dict[str, List[float]], List[float], float, int]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    command_sent_at: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        for _ in counter:
+            if history_ratio and random.random() < history_ratio:
+                endpoint, kind, payload = "GET /inspect/history", None, None
+            else:
+                kind, payload = source.next()
+                endpoint = "POST /inspect"
+            started = time.perf_counter()
+            sent_wall = time.time()
+            try:
+                if payload is None:
+                    response = await client.get("/v1/webhook/inspect/history", params={"limit": 30})
+                else:
+                    response = await client.post("/v1/webhook/inspect", json=payload)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            elapsed = time.perf_counter() - started
+            latencies[endpoint].append(elapsed)
+            if kind is not None:
+                latencies[f"{endpoint} [{kind}]"].append(elapsed)
+            if kind == "command":
+                command_sent_at.append(sent_wall)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return latencies, command_sent_at, duration, errors
+
+
+def _reply_latencies(command_sent_at: List[float], calls: List[dict], separator: str) -> List[float]:
+    """
+    Associa cada chamada ao stub aos comandos que ela responde, por ordem (FIFO).
+    Uma chamada agrupada com N "pong" responde aos N comandos mais antigos pendentes.
+    """
+    pending = sorted(command_sent_at)
+    latencies = []
+    for call in sorted(calls, key=lambda c: c["arrived"]):
+        replies = max(1, call["text"].count(separator) + 1)
+        for _ in range(replies):
+            if not pending:
+                break
+            latencies.append(call["arrived"] - pending.pop(0))
+    return latencies
+
+
+async def run(args) -> dict:
+    stub_port, app_port = _free_port(), _free_port()
+    tmpdir = tempfile.mkdtemp(prefix="bench-")
+    app_env = {
+        **os.environ,
+        "EVOLUTION_API_URL": f"http://127.0.0.1:{stub_port}",
+        "AUTHENTICATION_API_KEY": "bench",
+        "TARGET_GROUP_ID": TARGET_GROUP,
+        "INTERNAL_API_URL": f"http://127.0.0.1:{app_port}",
+        "HISTORY_SQLITE_PATH": str(Path(tmpdir) / "history.sqlite3"),
+        "DEAD_LETTER_PATH": str(Path(tmpdir) / "dead_letters.jsonl"),
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+
+    if args.history_file:
+        source = HistoryReplay(args.history_file)
+    else:
+        mix = dict(DEFAULT_MIX)
+        for item in args.mix:
+            kind, _, weight = item.partition("=")
+            mix[kind] = int(weight)
+        source = PayloadGenerator(INSTANCE, TARGET_GROUP, mix=mix, media_bytes=args.media_kb * 1024, seed=args.seed)
+
+    stub = Server("benchmarks.stub_evolution:app", stub_port, dict(os.environ), ROOT)
+    app = Server("main:app", app_port, app_env, ROOT)
+    async with stub, app:
+        async with httpx.AsyncClient(base_url=stub.url) as client:
+            await client.post("/_config", json={"latency_ms": args.stub_latency_ms, "jitter_ms": args.stub_jitter_ms})
+
+        # Aquecimento: não entra nas estatísticas.
+        await _drive(app.url, source, args.warmup, min(args.concurrency, 10), 0)
+        rss_before = _rss_kb(app.process.pid)
+        latencies, command_sent_at, duration, errors = await _drive(
+            app.url, source, args.requests, args.concurrency, args.history_ratio
+        )
+        await asyncio.sleep(args.settle)
+        rss_after = _rss_kb(app.process.pid)
+
+        async with httpx.AsyncClient() as client:
+            metrics_text = (await client.get(app.url + "/metrics")).text
+            calls = (await client.get(stub.url + "/_stats")).json()["calls"]
+
+    measured_calls = [c for c in calls if command_sent_at and c["arrived"] >= min(command_sent_at)]
+    separator = app_env.get("OUTBOUND_COALESCE_SEPARATOR", "\n\n")
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "duration_s": duration,
+        "throughput_rps": args.requests / duration if duration else 0.0,
+        "errors": errors,
+        "endpoints": {name: _percentiles(values) for name, values in sorted(latencies.items())},
+        "reply_latency": _percentiles(_reply_latencies(command_sent_at, measured_calls, separator)),
+        "evolution_calls": len(measured_calls),
+        "commands_sent": len(command_sent_at),
+        "pipeline_stages": _histogram_percentiles(metrics_text, "webhook_stage_seconds", "stage"),
+        "command_handlers": _histogram_percentiles(metrics_text, "command_handler_seconds", "*"),
+        "memory_kb": {
+            "before": rss_before,
+            "after": rss_after,
+            "growth": (rss_after - rss_before) if rss_before and rss_after else None,
+        },
+    }
+
+
+def _print_report(result: dict):
+    print(f"\nPedidos: {result['requests']}  Concorrência: {result['concurrency']}  "
+          f"Duração: {result['duration_s']:.2f}s  Throughput: {result['throughput_rps']:.1f} req/s  "
+          f"Erros: {result['errors']}")
+
+    def table(title: str, rows: Dict[str, Dict[str, float]]):
+        print(f"\n{title}")
+        print(f"  {'':44} {'n':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+        for name, s in rows.items():
+            if s:
+                print(f"  {name:44} {int(s['count']):>7} {s['p50_ms']:>9.2f} {s['p90_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+
+    table("Latência por endpoint (cliente):", result["endpoints"])
+    table("Latência de resposta (comando -> Evolution):", {"reply": result["reply_latency"]})
+    table("Etapas do pipeline (limite superior do bucket):", result["pipeline_stages"])
+    table("Handlers de comando:", result["command_handlers"])
+    print(f"\nComandos enviados: {result['commands_sent']}  Chamadas à Evolution: {result['evolution_calls']}")
+    memory = result["memory_kb"]
+    print(f"Memória (RSS): antes={memory['before']} KB  depois={memory['after']} KB  crescimento={memory['growth']} KB\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000, help="Número de pedidos medidos.")
+    parser.add_argument("--warmup", type=int, default=200, help="Pedidos de aquecimento (não medidos).")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--history-file", help="Reproduz payloads capturados (JSON de /inspect/history ou JSONL).")
+    parser.add_argument("--history-ratio", type=float, default=0.01, help="Fração de pedidos GET /inspect/history.")
+    parser.add_argument("--mix", action="append", default=[], metavar="TIPO=PESO",
+                        help=f"Altera o peso de um tipo de payload ({', '.join(DEFAULT_MIX)}).")
+    parser.add_argument("--media-kb", type=int, default=32, help="Tamanho do blob base64 dos payloads de media.")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--settle", type=float, default=3.0, help="Segundos a aguardar pelas respostas pendentes.")
+    parser.add_argument("--env", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="Variável de ambiente extra para a aplicação (ex: DISPATCH_MODE=http).")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", help="Grava o resultado em JSON (para comparar branches).")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    _print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"Resultado gravado em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
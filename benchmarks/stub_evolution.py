@@ -0,0 +1,62 @@
+"""
+Stub Local da Evolution API.
+
+Simula o endpoint `/message/sendText/{instance}` com uma latência configurável
+e regista o instante de chegada de cada chamada, para que o benchmark possa
+medir a latência de resposta de ponta a ponta.
+
+Execução isolada:
+    python -m benchmarks.stub_evolution --port 8081 --latency-ms 80
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Stub da Evolution API")
+
+config = {"latency_ms": 50.0, "jitter_ms": 10.0, "error_rate": 0.0}
+calls: List[Dict[str, Any]] = []
+
+
+@app.post("/message/sendText/{instance}")
+async def send_text(instance: str, request: Request):
+    arrived = time.time()
+    body = await request.json()
+    delay = max(0.0, config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])) / 1000
+    await asyncio.sleep(delay)
+    calls.append({"arrived": arrived, "instance": instance, "number": body.get("number"), "text": body.get("text", "")})
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        return JSONResponse({"error": "stub"}, status_code=503)
+    return {"key": {"id": f"STUB{len(calls)}"}, "status": "PENDING"}
+
+
+@app.get("/_stats")
+async def stats():
+    return {"calls": calls}
+
+
+@app.post("/_config")
+async def set_config(values: Dict[str, float]):
+    config.update(values)
+    return config
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,84 @@ Ponto de entrada principal da aplicação FastAPI.
 
 Este arquivo é responsável por:
 1. Inicializar o objeto principal da aplicação FastAPI.
-2. Configurar o logging básico para a aplicação.
-3. Incluir os roteadores da API (neste caso, o roteador da v1).
-4. Definir uma rota raiz ("/") para uma verificação de saúde (health check).
+2. Configurar o logging (estruturado, escrito numa thread em segundo plano).
+3. Gerir o ciclo de vida (arranque/encerramento) dos componentes em segundo plano.
+4. Incluir os roteadores da API (neste caso, o roteador da v1).
+5. Definir uma rota raiz ("/") para uma verificação de saúde (health check).
 
 Para rodar esta aplicação:
 1. Abra o terminal.
 2. Ative o ambiente virtual: `source venv/bin/activate` (ou `.\venv\Scripts\activate` no Windows).
 3. Execute o servidor uvicorn: `uvicorn main:app --reload`
 """
-import logging
+from contextlib import AsyncExitStack, asynccontextmanager
 from fastapi import FastAPI
 from src.api.v1.api import api_router  # Importa o agregador de rotas da v1
+from src.api.metrics import router as metrics_router
+from src.api.v1.endpoints.webhook import (
+    background_tasks,
+    dispatch_queue,
+    history_store,
+    inspector_hub,
+)
+from src.infra.config import settings
+from src.infra.executors import executors
+from src.infra.json_codec import FastJSONResponse
+from src.infra.log_pipeline import log_pipeline
+from src.infra.profiling import profiler
+from src.infra.redis import close_redis
+from src.infra.routing import routing_table
+from src.services.evolution_api import evolution_client
+from src.services.media import media_pipeline
+from src.services.metadata import metadata
+from src.services.outbound import outbound
+from src.services.processor_api import processor_client
 
 # --- Configuração do Logging ---
-# Configura o logging para exibir mensagens de nível INFO e acima.
-# Isso garante que os logs dos nossos módulos (ex: webhook.py) sejam visíveis no console.
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-)
+# Os registos de nível LOG_LEVEL e acima são postos numa fila e formatados e
+# escritos por uma thread em segundo plano (JSON por omissão, ver LOG_FORMAT),
+# para que o logging nunca bloqueie o event loop.
+log_pipeline.configure()
+
+# --- Ciclo de Vida da Aplicação ---
+# Tudo o que precisa de ser iniciado antes do primeiro pedido (filas, workers)
+# e encerrado de forma ordenada num deploy é gerido aqui.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timeout = settings.DISPATCH_SHUTDOWN_TIMEOUT
+    try:
+        # Cada componente regista o seu encerramento logo depois de arrancar.
+        # O encerramento corre na ordem inversa: primeiro esvazia a fila e as
+        # tarefas em curso (que ainda podem enviar respostas), só depois fecha
+        # os clientes HTTP de saída. Se um arranque falhar, os componentes já
+        # iniciados são encerrados da mesma forma.
+        async with AsyncExitStack() as stack:
+            stack.push_async_callback(close_redis)
+            await history_store.start()
+            stack.push_async_callback(history_store.close)
+            await inspector_hub.start()
+            stack.push_async_callback(inspector_hub.close)
+            await routing_table.start()
+            stack.push_async_callback(routing_table.close)
+            await evolution_client.start()
+            stack.push_async_callback(evolution_client.close)
+            stack.push_async_callback(metadata.close)
+            executors.start()
+            stack.push_async_callback(executors.shutdown)
+            await media_pipeline.start()
+            stack.push_async_callback(media_pipeline.close)
+            await outbound.start()
+            stack.push_async_callback(outbound.stop, timeout=timeout)
+            if settings.DISPATCH_MODE == "http":
+                await processor_client.start()
+                stack.push_async_callback(processor_client.close)
+            await dispatch_queue.start()
+            stack.push_async_callback(dispatch_queue.stop, timeout=timeout)
+            stack.push_async_callback(background_tasks.drain, timeout=timeout)
+            stack.callback(profiler.stop)
+            yield
+    finally:
+        log_pipeline.shutdown()
 
 # --- Inicialização da Aplicação ---
 # Cria a instância principal da aplicação FastAPI.
@@ -30,7 +88,9 @@ logging.basicConfig(
 app = FastAPI(
     title="Bot de WhatsApp com Evolution API",
     description="Servidor de webhook para processar eventos e executar comandos.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # --- Inclusão das Rotas da API ---
@@ -40,6 +100,9 @@ app = FastAPI(
 # [URL_DO_NGROK] + /v1 + /webhook + /inspect
 app.include_router(api_router, prefix="/v1")
 
+# Métricas Prometheus na raiz: [URL_DO_NGROK] + /metrics
+app.include_router(metrics_router)
+
 # --- Rota Raiz (Health Check) ---
 @app.get("/", tags=["Root"])
 def read_root():
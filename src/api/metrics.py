@@ -0,0 +1,20 @@
+"""
+Endpoint de Métricas (Prometheus).
+
+Fica na raiz da aplicação (`/metrics`), fora do versionamento da API,
+porque é esse o caminho que o Prometheus consulta por padrão.
+"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.infra.metrics import metrics
+
+router = APIRouter()
+
+@router.get("/metrics",
+    summary="Métricas Prometheus",
+    description="Exporta as métricas da aplicação no formato de texto do Prometheus.",
+    response_class=PlainTextResponse,
+    tags=["Root"],
+)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
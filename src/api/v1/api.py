@@ -8,6 +8,8 @@ Isto torna a nossa aplicação modular e fácil de expandir no futuro.
 from fastapi import APIRouter
 # Importa o roteador que contém os nossos endpoints de webhook e inspeção.
 from src.api.v1.endpoints import webhook
+# Importa o roteador dos endpoints de administração (protegidos por chave).
+from src.api.v1.endpoints import admin
 
 # Cria um roteador principal para a v1 da nossa API
 api_router = APIRouter()
@@ -26,6 +28,14 @@ api_router.include_router(
     tags=["Webhook & Inspector"] # Agrupa estes endpoints na documentação interativa (/docs)
 )
 
+# Endpoints de administração, protegidos pelo cabeçalho 'X-Admin-Key'.
+# -> https://aleatorio.ngrok.io/v1/admin/dead-letters
+api_router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["Administração"]
+)
+
 # Se no futuro tivéssemos endpoints para utilizadores, adicionaríamos aqui,
 # mantendo o nosso código organizado:
 #
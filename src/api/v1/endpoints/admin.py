@@ -0,0 +1,120 @@
+"""
+Define os endpoints de administração do bot.
+
+Todos exigem o cabeçalho `X-Admin-Key` igual a `settings.ADMIN_API_KEY`.
+Se essa variável não estiver definida, os endpoints respondem 403.
+"""
+import logging
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from src.infra.config import settings
+from src.infra.dead_letter import dead_letters
+from src.infra.profiling import profiler
+from src.infra.routing import routing_table
+from src.services.evolution_api import evolution_client
+from src.services.processor_api import processor_client
+
+logger = logging.getLogger(__name__)
+
+
+async def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Dependência que protege os endpoints de administração."""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Endpoints de administração desativados (ADMIN_API_KEY não definida).")
+    if x_admin_key is None or not secrets.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=401, detail="Chave de administração inválida.")
+
+
+router = APIRouter(dependencies=[Depends(require_admin_key)])
+
+
+# --- DEAD-LETTER ---
+@router.get("/dead-letters",
+    summary="Listar Pedidos Falhados",
+    description="Retorna os pedidos de saída que esgotaram as retentativas e aguardam reenvio.",
+)
+async def list_dead_letters():
+    return await dead_letters.list()
+
+@router.post("/dead-letters/replay",
+    summary="Reenviar Pedidos Falhados",
+    description="Tenta reenviar todos os pedidos da dead-letter. Os que voltarem a falhar permanecem guardados.",
+)
+async def replay_dead_letters():
+    return await dead_letters.replay({
+        evolution_client.DEAD_LETTER_KIND: evolution_client.replay,
+        processor_client.DEAD_LETTER_KIND: processor_client.replay,
+    })
+
+
+# --- TABELA DE ROTAS ---
+@router.get("/routes",
+    summary="Listar Rotas",
+    description="Retorna a tabela de rotas (instância, grupo) em uso, com os comandos ativos e as definições de resposta.",
+)
+async def list_routes():
+    return routing_table.describe()
+
+@router.post("/routes/reload",
+    summary="Recarregar Rotas",
+    description="Relê o ficheiro de rotas sem reiniciar. Se a configuração for inválida, a tabela anterior mantém-se.",
+)
+async def reload_routes():
+    try:
+        routing_table.load()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Configuração de rotas rejeitada: {e}")
+    return routing_table.describe()
+
+
+# --- PROFILING ---
+@router.post("/profiling/start",
+    summary="Ligar o Profiler",
+    description="Perfila uma fração dos webhooks e regista o atraso e os bloqueios do event loop durante um período limitado.",
+)
+async def start_profiling(
+    sample_rate: float = Query(settings.PROFILING_SAMPLE_RATE, ge=0.0, le=1.0),
+    duration_seconds: float = Query(settings.PROFILING_DURATION_SECONDS, gt=0),
+    interval_ms: float = Query(settings.PROFILING_INTERVAL_MS, ge=1),
+    slow_callback_ms: float = Query(settings.PROFILING_SLOW_CALLBACK_MS, gt=0),
+):
+    profiler.start(sample_rate, duration_seconds, interval_ms, slow_callback_ms)
+    return profiler.describe()
+
+@router.post("/profiling/stop",
+    summary="Desligar o Profiler",
+    description="Desliga o profiler. Os perfis e relatórios já recolhidos continuam disponíveis.",
+)
+async def stop_profiling():
+    profiler.stop()
+    return profiler.describe()
+
+@router.get("/profiling",
+    summary="Estado do Profiler",
+    description="Retorna a sessão atual, os perfis recentes e os relatórios de bloqueios do event loop.",
+)
+async def get_profiling():
+    return profiler.describe()
+
+@router.get("/profiling/collapsed",
+    summary="Descarregar Perfis (Collapsed Stacks)",
+    description="Soma os perfis indicados (ou todos os recentes) no formato lido por flamegraph.pl, speedscope ou inferno.",
+    response_class=PlainTextResponse,
+)
+async def download_collapsed(ids: Optional[str] = Query(None, description="Ids separados por vírgulas.")):
+    try:
+        profile_ids = [int(value) for value in ids.split(",")] if ids else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="'ids' deve ser uma lista de inteiros separados por vírgulas.")
+    return PlainTextResponse(profiler.collapsed(profile_ids))
+
+@router.get("/profiling/profiles/{profile_id}",
+    summary="Descarregar um Perfil (Collapsed Stacks)",
+    response_class=PlainTextResponse,
+)
+async def download_profile(profile_id: int):
+    if profiler.get(profile_id) is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (pode já ter sido descartado).")
+    return PlainTextResponse(profiler.collapsed([profile_id]))
@@ -3,44 +3,110 @@ Define o endpoint que recebe os webhooks da Evolution API.
 (VERSÃO FINAL - CONECTADA AO DISPATCHER DE COMANDOS)
 """
 import logging
-import json
 import datetime
-import asyncio
-import httpx
-from collections import deque
-from typing import List
+import time
+from typing import Any, Callable, Optional
 from pathlib import Path
-from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import HTMLResponse, JSONResponse
 from pydantic import ValidationError
 from src.infra.config import settings
 from src.models.evolution import WebhookPayload
-from src.commands.dispatcher import dispatch
+from src.commands.dispatcher import command_throttle, dispatch
+from src.commands.prefilter import PreFilter, normalize_event
+from src.commands.registry import registry
+from src.infra import json_codec
+from src.infra.admission import LANE_PRIORITY, AdmissionController, AdmissionSlot, Lane, classify_lane
+from src.infra.dedup import DedupKey, create_dedup_cache, extract_dedup_key
+from src.infra.dispatch_queue import DispatchQueue
+from src.infra.executors import executors
+from src.infra.history import create_history_store
+from src.infra.log_pipeline import log_context, log_pipeline
+from src.infra.inspector_hub import InspectorHub
+from src.infra.profiling import profiler
+from src.infra.pubsub import create_pubsub
+from src.infra.recent_messages import recent_messages
+from src.infra.routing import routing_table
+from src.infra.metrics import WEBHOOK_EVENTS_TOTAL, WEBHOOK_STAGE_SECONDS, metrics
+from src.infra.tasks import TaskSupervisor
+from src.services.evolution_api import evolution_client
+from src.services.media import media_pipeline
+from src.services.metadata import metadata
+from src.services.outbound import outbound
+from src.services.processor_api import processor_client
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-# --- ARMAZENAMENTO EM MEMÓRIA PARA O INSPETOR ---
-# Usamos uma lista com um tamanho máximo para armazenar os últimos 20 payloads.
+# --- ARMAZENAMENTO DO HISTÓRICO PARA O INSPETOR ---
+# Backend configurável (SQLite local por padrão, ver src/infra/history.py).
+# As escritas são feitas em lotes fora do caminho do pedido.
+history_store = create_history_store()
 
-payload_history = deque(maxlen=30)
-active_connections: List[WebSocket] = []
+# Difusão para os clientes WebSocket do inspetor, desacoplada da receção:
+# publicar nunca espera por nenhum socket. Com PUBSUB_BACKEND=redis, cada
+# inspetor recebe os eventos de todos os workers.
+inspector_hub = InspectorHub(
+    queue_size=settings.INSPECTOR_WS_QUEUE_SIZE,
+    slow_client_policy=settings.INSPECTOR_SLOW_CLIENT_POLICY,
+    pubsub=create_pubsub(),
+)
 
-# --- FUNÇÕES AUXILIARES (recepcionista)---
-async def broadcast_payload(payload_entry: dict):
-    """Envia o novo payload para todos os clientes WebSocket conectados."""
-    for connection in active_connections:
-        await connection.send_json(payload_entry)
+# --- DEDUPLICAÇÃO ---
+# A Evolution API reenvia entregas; os duplicados são confirmados sem reprocessar.
+dedup_cache = create_dedup_cache()
 
-async def forward_to_processor(payload_dict: dict):
-    """Envia um payload validado para o endpoint de processamento interno."""
-    processor_url = f"{settings.INTERNAL_API_URL}/v1/webhook/process"
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(processor_url, json=payload_dict)
-            response.raise_for_status()
-            logger.info("Payload encaminhado com sucesso para o processador de comandos.")
-    except httpx.RequestError as e:
-        logger.error(f"Falha ao encaminhar payload para o processador: {e}")
+# --- PRÉ-FILTRO DA ROTA /inspect ---
+# Descarta, sem construir o modelo Pydantic, tudo o que o dispatcher iria ignorar.
+inspect_prefilter = PreFilter(
+    events={"messages.upsert"},
+    remote_jids=routing_table,
+    allow_from_me=False,
+    commands=registry,
+) if settings.PREFILTER_ENABLED else None
+
+# --- FILA DE DESPACHO EM PROCESSO ---
+# No modo "inprocess" (padrão), os payloads validados seguem por esta fila
+# diretamente para o dispatcher. É iniciada/parada no lifespan do main.py.
+dispatch_queue = DispatchQueue(
+    handler=dispatch,
+    maxsize=settings.DISPATCH_QUEUE_MAXSIZE,
+    workers=settings.DISPATCH_WORKERS,
+)
+
+# --- SUPERVISOR DE TAREFAS EM SEGUNDO PLANO ---
+# No modo "http", cada encaminhamento para /process corre sob este supervisor,
+# que limita a concorrência e esvazia as tarefas em curso no encerramento.
+background_tasks = TaskSupervisor(
+    name="forwarder",
+    max_concurrency=settings.BACKGROUND_MAX_CONCURRENCY,
+    max_pending=settings.BACKGROUND_MAX_PENDING,
+)
+
+# --- CONTROLO DE ADMISSÃO ---
+# Classifica cada payload numa faixa de prioridade e recusa as faixas menos
+# prioritárias primeiro quando o pipeline a jusante começa a encher.
+admission = AdmissionController(
+    lanes=[
+        Lane("command", settings.ADMISSION_COMMAND_MAX_INFLIGHT, max_load=1.0, policy="reject"),
+        Lane("message", settings.ADMISSION_MESSAGE_MAX_INFLIGHT,
+             max_load=settings.ADMISSION_MESSAGE_MAX_LOAD, policy="reject"),
+        Lane("status", settings.ADMISSION_STATUS_MAX_INFLIGHT,
+             max_load=settings.ADMISSION_STATUS_MAX_LOAD, policy=settings.ADMISSION_STATUS_POLICY),
+    ],
+    load=lambda: background_tasks.load if settings.DISPATCH_MODE == "http" else dispatch_queue.load,
+) if settings.ADMISSION_ENABLED else None
+
+# --- GAUGES (lidos apenas quando /metrics é consultado) ---
+metrics.gauge("dispatch_queue_depth", "Payloads à espera na fila de despacho.", lambda: dispatch_queue.size)
+metrics.gauge("background_tasks_running", "Tarefas em segundo plano em execução.",
+              lambda: background_tasks.stats()["running"])
+metrics.gauge("background_tasks_queued", "Tarefas em segundo plano à espera de vaga.",
+              lambda: background_tasks.stats()["queued"])
+metrics.gauge("inspector_connections", "Clientes WebSocket ligados ao inspetor.",
+              lambda: inspector_hub.connection_count)
+metrics.gauge("outbound_pending_messages", "Mensagens de saída à espera de envio.",
+              lambda: outbound.stats()["pending"])
 
 # --- ENDPOINT PÚBLICO PRINCIPAL ---
 @router.post("/inspect",
@@ -52,32 +118,201 @@ async def inspect_and_delegate_payload(request: Request):
     """
     Recebe, regista, transmite via WebSocket e, se válido, encaminha para processamento.
     """
-    payload_dict = {}
+    stage_start = time.perf_counter()
+    # Uma única descodificação; os bytes originais são reutilizados tal como
+    # chegaram no histórico, na difusão e no encaminhamento.
+    raw_payload = await request.body()
     try:
-        payload_dict = await request.json()
-    except json.JSONDecodeError:
+        payload_dict = json_codec.loads(raw_payload)
+    except ValueError:
         logger.warning("Webhook recebido com corpo não-JSON.")
+        WEBHOOK_EVENTS_TOTAL.inc("unknown", "non_json")
         return {"status": "ignored_non_json_payload"}
+    stage_start = _observe_stage("decode", stage_start)
+    event = _event_label(payload_dict)
+    # Desligado e sem cabeçalho, o profiler retorna um contexto vazio.
+    force_profile = profiler.authorized(request.headers.get("x-profile"))
+    with profiler.profile("inspect", event, force=force_profile), \
+            log_context(**_correlation_ids(payload_dict, event)):
+        return await _admit(payload_dict, raw_payload, event, stage_start)
+
+async def _admit(payload_dict: dict, raw_payload: bytes, event: str, stage_start: float):
+    """
+    Controlo de admissão: em sobrecarga, as faixas menos prioritárias cedem
+    primeiro. A vaga acompanha o trabalho despachado até ele terminar.
+    """
+    lane = classify_lane(payload_dict, registry)
+    if admission is None:
+        return await _ingest(payload_dict, raw_payload, event, lane, stage_start)
+    refused = admission.try_admit(lane)
+    stage_start = _observe_stage("admission", stage_start)
+    if refused is not None:
+        return _refuse(event, lane)
+    slot = AdmissionSlot(admission, lane)
+    try:
+        return await _ingest(payload_dict, raw_payload, event, lane, stage_start, slot)
+    finally:
+        if not slot.dispatched:
+            slot.release()
 
-    # 1. Regista e transmite CADA payload que chega.
+def _refuse(event: str, lane: str):
+    """Resposta a um pedido não admitido, de acordo com a política da faixa."""
+    if admission.lane(lane).policy == "shed":
+        WEBHOOK_EVENTS_TOTAL.inc(event, "shed")
+        return {"status": "shed"}
+    WEBHOOK_EVENTS_TOTAL.inc(event, "rejected")
+    return _overloaded()
+
+def _overloaded() -> JSONResponse:
+    """Resposta não-2xx com Retry-After: a Evolution API volta a entregar o webhook."""
+    return JSONResponse(
+        status_code=settings.ADMISSION_REJECT_STATUS_CODE,
+        content={"status": "overloaded"},
+        headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+    )
+
+async def _ingest(payload_dict: dict, raw_payload: bytes, event: str, lane: str, stage_start: float,
+                  slot: Optional[AdmissionSlot] = None):
+    """
+    Deduplicação, histórico, difusão, pré-filtro, validação e despacho de um
+    payload admitido. Se o payload for despachado, a `slot` de admissão passa
+    para o trabalho despachado.
+    """
+    # 0. Descarta reenvios da mesma mensagem (mesma instância, key.id e evento).
+    dedup_key = None
+    if dedup_cache is not None:
+        dedup_key = extract_dedup_key(payload_dict)
+        duplicate = dedup_key is not None and await dedup_cache.is_duplicate(dedup_key)
+        stage_start = _observe_stage("dedup", stage_start)
+        if duplicate:
+            WEBHOOK_EVENTS_TOTAL.inc(event, "duplicate")
+            return {"status": "duplicate_ignored"}
+    try:
+        return await _process(payload_dict, raw_payload, event, lane, stage_start, slot, dedup_key)
+    except BaseException:
+        # O payload não foi aceite: o reenvio da Evolution API não pode ser
+        # ignorado como duplicado.
+        if dedup_key is not None:
+            await dedup_cache.forget(dedup_key)
+        raise
+
+async def _process(payload_dict: dict, raw_payload: bytes, event: str, lane: str, stage_start: float,
+                   slot: Optional[AdmissionSlot], dedup_key: Optional[DedupKey]):
+    # 1. Pré-filtro: descarta de forma barata o que nunca será um comando.
+    skip_reason = None
+    if inspect_prefilter is not None:
+        skip_reason = inspect_prefilter.check(payload_dict)
+        stage_start = _observe_stage("prefilter", stage_start)
+
+    # 2. Tenta validar o payload contra o nosso schema de comandos.
+    payload = None
+    if skip_reason is None:
+        try:
+            payload = WebhookPayload.model_validate(payload_dict)
+        except ValidationError:
+            pass
+        stage_start = _observe_stage("validate", stage_start)
+
+    # 3. Um payload a despachar sem espaço a jusante é recusado antes de
+    # qualquer efeito (histórico, difusão, índices), para que o reenvio da
+    # Evolution API não fique registado duas vezes.
+    if payload is not None and not _can_dispatch():
+        return await _refuse_dispatch(event, dedup_key)
+
+    # Invalida metadados de grupos (ex: participantes) alterados por este webhook.
+    metadata.observe(event, payload_dict)
+
+    # 4. Regista e transmite CADA payload que chega.
     payload_entry = {
         "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
         "payload": payload_dict
     }
-    payload_history.appendleft(payload_entry)
-    await broadcast_payload(payload_entry)
-    
-    # 2. Tenta validar o payload contra o nosso schema de comandos.
-    try:
-        WebhookPayload.model_validate(payload_dict)
-        # Se a validação for bem-sucedida, envia para a lógica de comandos em segundo plano.
-        asyncio.create_task(forward_to_processor(payload_dict))
-    except ValidationError:
+    history_store.append(payload_entry, raw_payload)
+    stage_start = _observe_stage("history_append", stage_start)
+    inspector_hub.publish(payload_entry, raw_payload)
+    stage_start = _observe_stage("broadcast", stage_start)
+
+    # As mensagens que não são comandos também podem vir a ser citadas,
+    # respondidas ou apagadas por um comando.
+    if settings.RECENT_MESSAGES_ENABLED:
+        recent_messages.observe(event, payload_dict)
+        stage_start = _observe_stage("recent_index", stage_start)
+
+    if skip_reason is not None:
+        WEBHOOK_EVENTS_TOTAL.inc(event, f"skipped_{skip_reason}")
+        return {"status": "payload_received"}
+    if payload is None:
         # Se a validação falhar (ex: áudio, status), apenas regista e ignora.
-        logger.info(f"Payload recebido mas não corresponde a um schema de comando. A ignorar o processamento.")
-    
+        logger.info("Payload recebido mas não corresponde a um schema de comando. A ignorar o processamento.",
+                    extra={"log_event": "payload_ignored"})
+        WEBHOOK_EVENTS_TOTAL.inc(event, "invalid")
+        return {"status": "payload_received"}
+
+    # 5. Envia para a lógica de comandos em segundo plano.
+    on_done = slot.release if slot is not None else None
+    if settings.DISPATCH_MODE == "http":
+        # Modo de deploy separado: eco HTTP para o endpoint /process.
+        accepted = background_tasks.submit(_forward, raw_payload, on_done)
+    else:
+        # Modo padrão: reutiliza o modelo já validado, sem nova ida e volta HTTP.
+        accepted = dispatch_queue.submit(payload, priority=LANE_PRIORITY[lane], on_done=on_done)
+    _observe_stage("enqueue", stage_start)
+    if not accepted:
+        # Não acontece depois de `_can_dispatch()` (não há nenhum await pelo meio),
+        # mas a recusa é tratada da mesma forma.
+        return await _refuse_dispatch(event, dedup_key)
+    if slot is not None:
+        slot.dispatched = True
+    WEBHOOK_EVENTS_TOTAL.inc(event, "dispatched")
     return {"status": "payload_received"}
 
+def _can_dispatch() -> bool:
+    if settings.DISPATCH_MODE == "http":
+        return background_tasks.has_capacity
+    return dispatch_queue.has_capacity
+
+async def _refuse_dispatch(event: str, dedup_key: Optional[DedupKey]):
+    """
+    Fila cheia (ou em encerramento): a chave de deduplicação é esquecida e a
+    resposta não-2xx faz a Evolution API reenviar, em vez de o comando se
+    perder e o reenvio ser ignorado como duplicado.
+    """
+    WEBHOOK_EVENTS_TOTAL.inc(event, "dropped")
+    if dedup_key is not None:
+        await dedup_cache.forget(dedup_key)
+    return _overloaded()
+
+async def _forward(raw_payload: bytes, on_done: Optional[Callable[[], None]]):
+    """Encaminha para /process e liberta a vaga de admissão no fim."""
+    try:
+        await processor_client.forward(raw_payload)
+    finally:
+        if on_done is not None:
+            on_done()
+
+def _observe_stage(stage: str, started: float) -> float:
+    """Regista a duração de uma etapa e retorna o instante de início da seguinte."""
+    now = time.perf_counter()
+    WEBHOOK_STAGE_SECONDS.observe(now - started, stage)
+    return now
+
+def _correlation_ids(payload: Any, event: str) -> dict:
+    """Ids anexados a todos os registos do pedido (ver src/infra/log_pipeline.py)."""
+    ids = {"event": event}
+    if not isinstance(payload, dict):
+        return ids
+    ids["instance"] = payload.get("instance")
+    data = payload.get("data")
+    key = data.get("key") if isinstance(data, dict) else None
+    if isinstance(key, dict):
+        ids["chat"] = key.get("remoteJid")
+        ids["message_id"] = key.get("id")
+    return ids
+
+def _event_label(payload: Any) -> str:
+    event = payload.get("event") if isinstance(payload, dict) else None
+    return normalize_event(event) if isinstance(event, str) else "unknown"
+
 
 # --- ENDPOINT DE INTERNO ---
 @router.post("/process",
@@ -85,11 +320,19 @@ async def inspect_and_delegate_payload(request: Request):
     description="[INTERNO] Este endpoint só deve ser chamado pelo serviço. Ele executa a lógica de comandos.",
     include_in_schema=False # Oculta este endpoint da documentação pública.
 )
-async def process_validated_webhook(payload: WebhookPayload):
+async def process_validated_webhook(request: Request):
     """
     Contém a lógica de negócio para executar comandos.
+
+    O corpo é validado diretamente a partir dos bytes (`model_validate_json`),
+    sem passar por um dicionário intermédio.
     """
-    logger.info(f"A processar webhook validado: Evento='{payload.event}', Instância='{payload.instance}'.")
+    try:
+        payload = WebhookPayload.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    logger.info("A processar webhook validado: Evento='%s', Instância='%s'.", payload.event, payload.instance,
+                extra={"log_event": "payload_processing"})
     try:
         await dispatch(payload)
         return {"status": "command_processed_successfully"}
@@ -98,13 +341,63 @@ async def process_validated_webhook(payload: WebhookPayload):
         return {"status": "error_processing_command"}
 
 
+# --- ENDPOINT DE ESTATÍSTICAS ---
+@router.get("/stats",
+    summary="Estatísticas do Pipeline",
+    description="Retorna os contadores da fila de despacho, do controlo de admissão, das tarefas em segundo plano, do histórico, da deduplicação, do pré-filtro, do limite de comandos, das mensagens de saída, do índice de mensagens recentes, da cache de metadados, da media, dos executores e do logging.",
+)
+async def get_pipeline_stats():
+    return {
+        "dispatch_mode": settings.DISPATCH_MODE,
+        "dispatch_queue": dispatch_queue.stats(),
+        "admission": admission.stats() if admission is not None else None,
+        "background_tasks": background_tasks.stats(),
+        "dedup": dedup_cache.stats() if dedup_cache is not None else None,
+        "history": history_store.stats(),
+        "prefilter": inspect_prefilter.stats() if inspect_prefilter is not None else None,
+        "throttle": command_throttle.stats() if command_throttle is not None else None,
+        "outbound": outbound.stats(),
+        "media": media_pipeline.stats(),
+        "metadata": metadata.stats(),
+        "recent_messages": recent_messages.stats() if settings.RECENT_MESSAGES_ENABLED else None,
+        "executors": executors.stats(),
+        "logging": log_pipeline.stats(),
+        "circuits": {
+            "evolution": evolution_client.resilience.stats(),
+            "processor": processor_client.resilience.stats(),
+        },
+    }
+
+
 # --- ENDPOINTS DO VISUALIZADOR WEB ---
 @router.get("/inspect/history",
     summary="Histórico de Payloads",
-    description="Retorna os últimos 30 payloads recebidos em formato JSON.",
+    description="Retorna os payloads recebidos (mais recentes primeiro), com paginação e filtros opcionais.",
 )
-async def get_inspection_history():
-    return list(payload_history)
+async def get_inspection_history(
+    limit: int = Query(30, ge=1, le=500, description="Número máximo de entradas a retornar."),
+    offset: int = Query(0, ge=0, description="Número de entradas a saltar (paginação)."),
+    event: Optional[str] = Query(None, description="Filtra pelo tipo de evento (ex: messages.upsert)."),
+    instance: Optional[str] = Query(None, description="Filtra pelo nome da instância."),
+    remote_jid: Optional[str] = Query(None, alias="remoteJid", description="Filtra pelo JID do chat."),
+    since: Optional[datetime.datetime] = Query(None, description="Apenas entradas a partir desta data (ISO 8601)."),
+    until: Optional[datetime.datetime] = Query(None, description="Apenas entradas até esta data (ISO 8601)."),
+):
+    return await history_store.query(
+        limit=limit,
+        offset=offset,
+        event=normalize_event(event) if event else None,
+        instance=instance,
+        remote_jid=remote_jid,
+        since=_as_utc(since),
+        until=_as_utc(until),
+    )
+
+def _as_utc(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Datas sem fuso horário são interpretadas como UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
 
 @router.get("/inspect/view",
     summary="Visualizador de Payloads",
@@ -120,14 +413,23 @@ async def serve_inspector_page():
 
 @router.websocket("/inspect/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """Endpoint WebSocket para o visualizador de payloads."""
+    """
+    Endpoint WebSocket para o visualizador de payloads.
+
+    O cliente pode enviar `{"action": "subscribe", "filters": {...}, "fields": [...]}`
+    para receber apenas os eventos e campos que lhe interessam (ver
+    `src/infra/subscriptions.py`) e `{"action": "unsubscribe"}` para voltar a
+    receber tudo. Outras mensagens servem apenas para manter a conexão viva.
+    """
     await websocket.accept()
-    active_connections.append(websocket)
+    subscriber = inspector_hub.subscribe(websocket)
     logger.info("Novo cliente WebSocket conectado ao inspetor.")
     try:
         while True:
-            # Mantém a conexão viva.
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        active_connections.remove(websocket)
+            inspector_hub.handle_client_message(subscriber, await websocket.receive_text())
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: o socket já foi fechado pelo hub (cliente lento).
+        pass
+    finally:
+        await inspector_hub.unsubscribe(subscriber)
         logger.info("Cliente WebSocket desconectado.")
\ No newline at end of file
@@ -4,54 +4,139 @@ Módulo Roteador de Comandos (Dispatcher).
 Este é o controlador de tráfego para a lógica do bot. Ele recebe
 o payload validado, analisa o conteúdo da mensagem e decide qual
 função do módulo 'handlers' deve ser chamada.
+
+Cada handler corre no modo que declarou (no event loop, no pool de threads ou
+no pool de processos) e é abandonado ao fim do seu timeout, para que um
+comando lento ou bloqueado não atrase os restantes webhooks. Antes disso,
+as invocações acima do limite de cada membro ou do chat são descartadas
+(ver src/commands/throttle.py).
 """
+import asyncio
 import logging
+import time
 from src.models.evolution import WebhookPayload
-from src.commands import handlers
+from src.commands import handlers  # noqa: F401 - regista os comandos no 'registry'
+from src.commands.registry import ArgumentError, Invocation, registry
+from src.commands.throttle import create_command_throttle
 from src.infra.config import settings
+from src.infra.executors import ExecutorSaturatedError, executors
+from src.infra.log_pipeline import log_context
+from src.infra.metrics import COMMAND_SECONDS, COMMAND_THROTTLED_TOTAL
+from src.infra.profiling import profiler
+from src.infra.routing import routing_table
+from src.services.outbound import outbound
 
 logger = logging.getLogger(__name__)
 
-# Mapeia strings de comando para as suas funções de handler correspondentes.
-# Adicionar um novo comando é tão simples quanto adicionar uma nova entrada aqui.
-COMMANDS_MAP = {
-    "/ping": handlers.handle_ping,
-    # "/excluir": handlers.handle_delete_message,
-}
+# Limitador de invocações por membro e por chat (None se THROTTLE_ENABLED=False).
+command_throttle = create_command_throttle()
+
+# Os comandos são registados nos próprios handlers com `@registry.command(...)`.
+# Adicionar um novo comando é tão simples quanto decorar uma nova função em handlers.py.
 
 async def dispatch(payload: WebhookPayload):
     """
     Recebe um payload de webhook e o direciona para o handler de comando apropriado.
     """
+    # Os workers da fila de despacho não herdam o contexto do pedido: os ids
+    # de correlação são associados aqui, para os registos deste comando.
+    key = payload.data.key
+    with profiler.profile("dispatch", payload.event), \
+            log_context(inherit=False, event=payload.event, instance=payload.instance,
+                        chat=key.remote_jid, message_id=key.id):
+        await _dispatch(payload)
+
+
+async def _dispatch(payload: WebhookPayload):
     # --- Filtros Iniciais ---
-    # Ignorar se não for do grupo alvo ou se for uma mensagem do próprio bot
-    if payload.data.key.remote_jid != settings.TARGET_GROUP_ID or payload.data.key.from_me:
+    # Ignorar mensagens do próprio bot e chats sem rota na tabela de rotas
+    if payload.data.key.from_me:
+        return
+    route = routing_table.lookup(payload.instance, payload.data.key.remote_jid)
+    if route is None:
         return
 
     # Ignorar se a mensagem não tiver conteúdo de texto
     if not payload.data.message:
         return
 
-    # Extrai o texto da mensagem, seja de uma 'conversation' ou 'extendedTextMessage'
-    text = ""
-    if payload.data.message.conversation:
-        text = payload.data.message.conversation.strip().lower()
-    elif payload.data.message.extended_text_message and payload.data.message.extended_text_message.get('text'):
-        text = payload.data.message.extended_text_message.get('text').strip().lower()
+    # Extrai o texto da mensagem: 'conversation', 'extendedTextMessage' ou a legenda de uma media
+    text = payload.data.message.text
 
     if not text:
         return
 
     # --- Lógica de Roteamento ---
-    # Verifica se o texto começa com um prefixo de comando conhecido
-    command_word = text.split()[0] # Pega a primeira palavra, ex: "/ping"
-
-    # Ver se da pra adaptar com um Parser futuramente ------------------------------------------------------------------------------
+    # O registo percorre apenas a palavra de comando (ex: "/ping") numa trie;
+    # se não for um comando conhecido, o resto da mensagem nunca é lido.
+    try:
+        invocation = registry.resolve(text)
+    except ArgumentError as e:
+        logger.info("Argumentos inválidos para comando no chat %s: %s", payload.data.key.remote_jid, e)
+        return
 
-    handler = COMMANDS_MAP.get(command_word)
+    # As rotas ativam comandos de topo; um subcomando segue o comando a que pertence.
+    if invocation and not route.allows(invocation.command.root.name):
+        logger.info("Comando %s desativado no chat %s.", invocation.command.root.name, payload.data.key.remote_jid)
+        return
 
-    if handler:
-        await handler(payload)
+    if invocation:
+        # Flood: descarta antes de qualquer trabalho do handler ou envio de resposta.
+        if await _throttled(invocation, payload):
+            return
+        await _run(invocation, payload)
     # Opcional: Responder a qualquer mensagem que comece com "/" mas não seja um comando conhecido.
-    # elif command_word.startswith("/"):
-    #     await handlers.handle_unrecognized_command(payload)
+    # elif text.lstrip().startswith("/"):
+    #     await handlers.handle_unrecognized_command(payload, {})
+
+
+async def _throttled(invocation: Invocation, payload: WebhookPayload) -> bool:
+    """True se a invocação excede o limite do membro ou do chat."""
+    if command_throttle is None:
+        return False
+    key = payload.data.key
+    root = invocation.command.root
+    scope = await command_throttle.check(
+        payload.instance, key.remote_jid, key.participant or key.remote_jid, root.name, root.rate_limit,
+    )
+    if scope is None:
+        return False
+    COMMAND_THROTTLED_TOTAL.inc(root.name, scope)
+    logger.info("Comando %s limitado (%s) no chat %s.", root.name, scope, key.remote_jid)
+    return True
+
+
+async def _run(invocation: Invocation, payload: WebhookPayload):
+    """Executa o handler no seu modo, com timeout, e regista a duração e o desfecho."""
+    command = invocation.command
+    timeout = command.timeout if command.timeout is not None else settings.COMMAND_DEFAULT_TIMEOUT
+    chat_id = payload.data.key.remote_jid
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if command.mode == "inline":
+            call = command.handler(payload, invocation.args)
+        else:
+            call = executors.get(command.mode).run(command.handler, payload, invocation.args)
+        result = await asyncio.wait_for(call, timeout) if timeout > 0 else await call
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        logger.warning("Comando %s excedeu o timeout de %ss no chat %s.", command.name, timeout, chat_id)
+        return
+    except ExecutorSaturatedError as e:
+        outcome = "rejected"
+        logger.warning("Comando %s recusado no chat %s: %s", command.name, chat_id, e)
+        return
+    finally:
+        elapsed = time.perf_counter() - started
+        COMMAND_SECONDS.observe(elapsed, command.name, outcome)
+        # Nunca amostrado: todas as execuções de comandos ficam registadas.
+        logger.info("Comando %s executado: %s em %.3fs.", command.name, outcome, elapsed,
+                    extra={"log_event": "command", "command": command.name, "outcome": outcome,
+                           "duration_ms": round(elapsed * 1000, 1)})
+
+    # Os handlers fora do event loop não podem usar o 'outbound' (que vive no
+    # loop); se retornarem texto, é enviado aqui como resposta.
+    if command.mode != "inline" and isinstance(result, str) and result:
+        outbound.send_text(instance=payload.instance, to_number=chat_id, text=result)
@@ -2,17 +2,21 @@
 Módulo de Handlers (Manipuladores) de Comandos.
 
 Aqui reside a lógica de negócio para cada comando que o bot pode executar.
-Cada função recebe o payload validado do webhook e executa uma ação,
-geralmente chamando uma ou mais funções do módulo de serviços.
+Cada função é registada com o decorador `@registry.command(...)`, recebe o
+payload validado do webhook e os argumentos já interpretados pelo parser,
+e executa uma ação, geralmente chamando uma ou mais funções do módulo de serviços.
 """
 import logging
+from typing import Any, Dict
+from src.commands.registry import registry
 from src.models.evolution import WebhookPayload
-from src.services import evolution_api
+from src.services.outbound import outbound
 from src.infra.config import settings
 
 logger = logging.getLogger(__name__)
 
-async def handle_ping(payload: WebhookPayload):
+@registry.command("/ping", description="Responde com 'pong' para testar se o bot está online.")
+async def handle_ping(payload: WebhookPayload, args: Dict[str, Any]):
     """
     Handler para o comando /ping. Responde com 'pong'.
     """
@@ -20,62 +24,51 @@ async def handle_ping(payload: WebhookPayload):
     chat_id = payload.data.key.remote_jid
     response_text = "pong"
 
-    logger.info(f"Executando comando /ping para o chat {chat_id}")
+    logger.info("Executando comando /ping para o chat %s", chat_id)
     
-    evolution_api.send_text_message(
+    # A resposta entra na fila de saída do chat; o Future retornado pode ser
+    # aguardado se o handler precisar do resultado da entrega.
+    outbound.send_text(
         instance=instance_name,
         to_number=chat_id,
         text=response_text
     )
 
-# async def handle_delete_message(payload: WebhookPayload):
+# @registry.command("/excluir", description="Apaga a mensagem citada.")
+# async def handle_delete_message(payload: WebhookPayload, args: Dict[str, Any]):
 #     """
 #     Handler para o comando /excluir.
 #     Deleta a mensagem que foi respondida pelo comando.
 #     """
 #     # Para o comando /excluir funcionar, o utilizador deve responder (citar)
-#     # a mensagem que deseja apagar ao enviar o comando.
-#     # A informação da mensagem citada está dentro de 'extendedTextMessage'.
-#     msg_content = payload.data.message
-#     if not (msg_content and msg_content.extended_text_message):
-#         evolution_api.send_text_message(
+#     # a mensagem que deseja apagar ao enviar o comando. A mensagem citada é
+#     # procurada no índice de mensagens recentes (src/infra/recent_messages.py),
+#     # sem nenhum pedido à Evolution API.
+#     quoted = recent_messages.quoted(payload)
+#     if quoted is None:
+#         outbound.send_text(
 #             instance=payload.instance,
-#             to_jid=payload.data.key.remote_jid,
-#             text="⚠️ Para usar o comando /excluir, você deve responder à mensagem que deseja apagar."
+#             to_number=payload.data.key.remote_jid,
+#             text="⚠️ Para usar o comando /excluir, você deve responder a uma mensagem recente."
 #         )
 #         return
 
-#     # Extraímos os detalhes da mensagem citada
-#     quoted_msg_context = msg_content.extended_text_message.get("contextInfo", {})
-#     quoted_msg_id = quoted_msg_context.get("stanzaId")
-#     quoted_msg_participant = quoted_msg_context.get("participant")
+#     logger.info(f"Executando comando /excluir para a mensagem {quoted.id}")
 
-#     if not all([quoted_msg_id, quoted_msg_participant]):
-#         logger.warning("Não foi possível extrair os detalhes da mensagem a ser excluída.")
-#         return
-
-#     logger.info(f"Executando comando /excluir para a mensagem {quoted_msg_id}")
-
-#     # Montamos o objeto 'key' da mensagem a ser deletada
-#     key_to_delete = {
-#         "remoteJid": payload.data.key.remote_jid,
-#         "id": quoted_msg_id,
-#         "participant": quoted_msg_participant
-#     }
-
-#     evolution_api.delete_message(instance=payload.instance, message_key=key_to_delete)
+#     # A 'key' da mensagem a ser deletada vem pronta do índice
+#     await evolution_client.delete_message(instance=payload.instance, message_key=quoted.key())
 
 #     # Opcional: Apagar também a mensagem de comando ("/excluir")
-#     key_of_command_msg = payload.data.key.dict(by_alias=True)
-#     evolution_api.delete_message(instance=payload.instance, message_key=key_of_command_msg)
+#     key_of_command_msg = payload.data.key.model_dump(by_alias=True, exclude_none=True)
+#     await evolution_client.delete_message(instance=payload.instance, message_key=key_of_command_msg)
 
 
-# async def handle_unrecognized_command(payload: WebhookPayload):
+# async def handle_unrecognized_command(payload: WebhookPayload, args: Dict[str, Any]):
 #     """
 #     Handler para quando um comando não é reconhecido.
 #     """
 #     logger.info(f"Comando não reconhecido recebido de {payload.data.key.participant}")
-#     evolution_api.send_text_message(
+#     outbound.send_text(
 #         instance=payload.instance,
 #         to_jid=payload.data.key.remote_jid,
 #         text="😕 Comando não reconhecido. Tente /ping ou /excluir."
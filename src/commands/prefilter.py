@@ -0,0 +1,126 @@
+"""
+Módulo de Pré-Filtro de Comandos.
+
+A maior parte do tráfego que chega ao `/inspect` (status, presença, media,
+conversa noutros grupos) nunca vai gerar um comando. Em vez de construir o
+modelo Pydantic completo para depois o `dispatcher` o descartar, este
+pré-filtro olha apenas para alguns campos do dicionário bruto:
+
+- `event`
+- `data.key.remoteJid`
+- `data.key.fromMe`
+- a primeira palavra do texto da mensagem
+
+Cada rota declara o seu próprio `PreFilter` com as regras que lhe interessam.
+"""
+import logging
+import re
+from collections import Counter
+from typing import Any, Container, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Apenas a primeira palavra é examinada; o resto da mensagem nunca é percorrido.
+_LEADING_TOKEN_RE = re.compile(r"\s*(\S+)")
+
+
+def normalize_event(event: str) -> str:
+    """Normaliza nomes de eventos: 'MESSAGES_UPSERT' e 'messages.upsert' são equivalentes."""
+    return event.lower().replace("_", ".")
+
+
+# Mensagens de media cuja legenda pode conter um comando.
+_CAPTIONED_MEDIA = ("imageMessage", "videoMessage", "documentMessage")
+
+
+def extract_text(message: Any) -> Optional[str]:
+    """
+    Extrai o texto de 'conversation', 'extendedTextMessage.text' ou da legenda
+    de uma imagem, vídeo ou documento, a partir de um dicionário bruto.
+    """
+    if not isinstance(message, dict):
+        return None
+    text = message.get("conversation")
+    if not text:
+        extended = message.get("extendedTextMessage")
+        if isinstance(extended, dict):
+            text = extended.get("text")
+    if not text:
+        for media_key in _CAPTIONED_MEDIA:
+            media = message.get(media_key)
+            if isinstance(media, dict) and media.get("caption"):
+                text = media["caption"]
+                break
+    return text if isinstance(text, str) else None
+
+
+def leading_token(text: str) -> Optional[str]:
+    """Retorna a primeira palavra do texto em minúsculas, sem dividir o texto inteiro."""
+    match = _LEADING_TOKEN_RE.match(text)
+    return match.group(1).lower() if match else None
+
+
+class PreFilter:
+    """
+    Conjunto declarativo de regras aplicado antes da validação Pydantic.
+
+    Args:
+        events: Eventos aceites (ex: {"messages.upsert"}). None aceita todos.
+        remote_jids: Chats aceites (qualquer contentor com `in`, ex: a tabela
+                     de rotas). None aceita todos.
+        allow_from_me: Se False, descarta mensagens enviadas pelo próprio bot.
+        commands: Palavras de comando aceites (qualquer contentor com `in`,
+                  ex: o `registry` de comandos). None aceita qualquer texto.
+    """
+
+    def __init__(
+        self,
+        events: Optional[Iterable[str]] = None,
+        remote_jids: Optional[Container[str]] = None,
+        allow_from_me: bool = False,
+        commands: Optional[Container[str]] = None,
+    ):
+        self.events = {normalize_event(e) for e in events} if events is not None else None
+        self.remote_jids = remote_jids
+        self.allow_from_me = allow_from_me
+        self.commands = commands
+        self._counters: Counter = Counter()
+
+    def check(self, payload: Any) -> Optional[str]:
+        """
+        Avalia o payload bruto.
+
+        Returns:
+            None se o payload deve seguir para validação e despacho, ou o
+            motivo (string curta) pelo qual foi descartado.
+        """
+        reason = self._evaluate(payload)
+        self._counters[reason or "passed"] += 1
+        return reason
+
+    def _evaluate(self, payload: Any) -> Optional[str]:
+        if not isinstance(payload, dict):
+            return "malformed"
+        event = payload.get("event")
+        if self.events is not None and (not isinstance(event, str) or normalize_event(event) not in self.events):
+            return "event"
+        data = payload.get("data")
+        key = data.get("key") if isinstance(data, dict) else None
+        if not isinstance(key, dict):
+            return "malformed"
+        if self.remote_jids is not None and key.get("remoteJid") not in self.remote_jids:
+            return "remote_jid"
+        if not self.allow_from_me and key.get("fromMe"):
+            return "from_me"
+        text = extract_text(data.get("message"))
+        if not text:
+            return "no_text"
+        if self.commands is not None:
+            token = leading_token(text)
+            if token is None or token not in self.commands:
+                return "not_command"
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de payloads aceites ("passed") e descartados por motivo."""
+        return dict(self._counters)
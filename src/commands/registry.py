@@ -0,0 +1,281 @@
+"""
+Módulo de Registo e Parser de Comandos.
+
+Substitui o dicionário plano `COMMANDS_MAP` por um registo alimentado por
+decoradores nos próprios handlers:
+
+    @registry.command("/ping", aliases=["/p"], description="Responde com pong.")
+    async def handle_ping(payload, args): ...
+
+As palavras de comando (e aliases) são compiladas numa trie. O roteamento
+percorre o texto carácter a carácter apenas enquanto houver um ramo na trie,
+por isso uma mensagem que não é comando é rejeitada sem ser dividida em
+tokens, e o custo é O(tamanho da palavra de comando) mesmo com dezenas de
+comandos registados.
+
+Um prefixo não ambíguo também resolve o comando: com `/ping` e `/perfil`
+registados, `/pi` é `/ping`, mas `/p` não é nenhum dos dois (a menos que
+seja, ele próprio, uma palavra registada, que tem sempre precedência). Cada
+nó da trie guarda o único comando abaixo dele, por isso a resolução de um
+prefixo custa o mesmo que a de uma palavra completa. Os argumentos só são
+lidos depois de o comando ser encontrado, e chegam ao handler já
+convertidos para o tipo declarado.
+
+Cada comando declara também onde corre e quanto tempo pode demorar:
+
+    @registry.command("/relatorio", mode="process", timeout=60)
+    def handle_report(payload, args) -> str: ...
+
+- "inline" (padrão): corrotina executada no event loop;
+- "thread" / "process": função síncrona executada no pool partilhado de
+  threads ou de processos (ver src/infra/executors.py). Se retornar uma
+  string, o dispatcher envia-a como resposta no chat.
+
+e, opcionalmente, quantas vezes cada membro o pode usar (`rate_limit="3/60s"`,
+ver src/commands/throttle.py).
+"""
+import inspect
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from src.commands.throttle import parse_optional_limit
+from src.infra.executors import ExecutionMode
+from src.models.evolution import WebhookPayload
+
+CommandHandler = Callable[[WebhookPayload, Dict[str, Any]], Union[Awaitable[None], Any]]
+
+_TOKEN_RE = re.compile(r"\S+")
+
+# Tamanho mínimo de um prefixo abreviado (ex: "/" sozinho nunca é um comando).
+_MIN_PREFIX = 2
+
+
+class ArgumentError(ValueError):
+    """Os argumentos de um comando não correspondem à sua declaração."""
+
+
+class Arg:
+    """
+    Declaração de um argumento posicional de um comando.
+
+    Args:
+        name: Nome com que o valor chega ao handler.
+        type: Conversor do texto para o valor (ex: str, int, float).
+        required: Se True, a ausência do argumento é um erro.
+        default: Valor usado quando o argumento opcional não é fornecido.
+        greedy: Se True, consome todo o resto da mensagem (apenas no último argumento).
+    """
+
+    def __init__(self, name: str, type: Callable[[str], Any] = str, required: bool = True,
+                 default: Any = None, greedy: bool = False):
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.greedy = greedy
+
+
+class Command:
+    """
+    Um comando registado, com os seus metadados e subcomandos.
+
+    Args:
+        mode: Onde o handler corre: "inline", "thread" ou "process".
+        timeout: Segundos até o handler ser abandonado. None usa
+                 `settings.COMMAND_DEFAULT_TIMEOUT`.
+        rate_limit: Invocações permitidas por participante (ex: "3/60s", ou
+                    "unlimited"). None usa `settings.THROTTLE_DEFAULT_LIMIT`.
+                    Os subcomandos partilham o limite do comando de topo.
+    """
+
+    def __init__(self, name: str, handler: CommandHandler, aliases: Iterable[str] = (),
+                 args: Iterable[Arg] = (), description: str = "", mode: ExecutionMode = "inline",
+                 timeout: Optional[float] = None, rate_limit: Optional[str] = None,
+                 parent: Optional["Command"] = None):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"Modo de execução desconhecido: {mode!r}")
+        # Valida já no registo, para um limite mal escrito falhar no arranque.
+        parse_optional_limit(rate_limit)
+        if (mode == "inline") != inspect.iscoroutinefunction(handler):
+            raise ValueError(
+                f"O handler de '{name}' deve ser uma corrotina no modo \"inline\" "
+                f"e uma função síncrona nos modos \"thread\"/\"process\"."
+            )
+        self.name = name.lower()
+        self.handler = handler
+        self.aliases = [alias.lower() for alias in aliases]
+        self.args: List[Arg] = list(args)
+        self.description = description
+        self.mode = mode
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self.parent = parent
+        self.subcommands: Dict[str, "Command"] = {}
+
+    @property
+    def root(self) -> "Command":
+        """O comando de topo (o próprio, ou o pai de um subcomando)."""
+        return self.parent.root if self.parent is not None else self
+
+    def subcommand(self, name: str, aliases: Iterable[str] = (), args: Iterable[Arg] = (),
+                   description: str = "", mode: ExecutionMode = "inline", timeout: Optional[float] = None):
+        """Decorador que regista um subcomando (ex: `/config set ...`)."""
+        def decorator(handler: CommandHandler) -> CommandHandler:
+            sub = Command(name, handler, aliases=aliases, args=args, description=description,
+                          mode=mode, timeout=timeout, parent=self)
+            for word in [sub.name, *sub.aliases]:
+                self.subcommands[word] = sub
+            return handler
+        return decorator
+
+    def parse_args(self, text: str, pos: int) -> Dict[str, Any]:
+        """Converte o texto a partir de `pos` nos argumentos declarados."""
+        values: Dict[str, Any] = {}
+        for arg in self.args:
+            if arg.greedy:
+                rest = text[pos:].strip()
+                token = rest or None
+                pos = len(text)
+            else:
+                match = _TOKEN_RE.search(text, pos)
+                token = match.group(0) if match else None
+                if match:
+                    pos = match.end()
+            if token is None:
+                if arg.required:
+                    raise ArgumentError(f"Argumento obrigatório em falta: '{arg.name}'.")
+                values[arg.name] = arg.default
+                continue
+            try:
+                values[arg.name] = arg.type(token)
+            except (TypeError, ValueError) as e:
+                raise ArgumentError(f"Valor inválido para '{arg.name}': {token!r}.") from e
+        return values
+
+
+class Invocation:
+    """Resultado do parsing de uma mensagem: o comando encontrado e os seus argumentos."""
+
+    def __init__(self, command: Command, args: Dict[str, Any]):
+        self.command = command
+        self.args = args
+
+
+class _TrieNode:
+    __slots__ = ("children", "command", "unique", "shared")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Comando cuja palavra termina exatamente neste nó.
+        self.command: Optional[Command] = None
+        # Único comando com palavras abaixo deste nó; `shared` se houver mais do que um.
+        self.unique: Optional[Command] = None
+        self.shared = False
+
+    def resolve(self, depth: int) -> Optional[Command]:
+        """Comando da palavra exata, ou do prefixo se for não ambíguo."""
+        if self.command is not None:
+            return self.command
+        if self.shared or depth < _MIN_PREFIX:
+            return None
+        return self.unique
+
+
+class CommandRegistry:
+    """Registo de comandos com roteamento por trie."""
+
+    def __init__(self):
+        self._root = _TrieNode()
+        self._commands: Dict[str, Command] = {}
+
+    def command(self, name: str, aliases: Iterable[str] = (), args: Iterable[Arg] = (),
+                description: str = "", mode: ExecutionMode = "inline", timeout: Optional[float] = None,
+                rate_limit: Optional[str] = None):
+        """Decorador que regista um handler como comando."""
+        def decorator(handler: CommandHandler) -> CommandHandler:
+            self.register(Command(name, handler, aliases=aliases, args=args, description=description,
+                                  mode=mode, timeout=timeout, rate_limit=rate_limit))
+            return handler
+        return decorator
+
+    def register(self, command: Command) -> Command:
+        for word in [command.name, *command.aliases]:
+            if self._lookup_word(word, prefix=False) is not None:
+                raise ValueError(f"A palavra de comando '{word}' já está registada.")
+            node = self._root
+            for char in word:
+                node = node.children.setdefault(char, _TrieNode())
+                if node.unique is None:
+                    node.unique = command
+                elif node.unique is not command:
+                    node.shared = True
+            node.command = command
+        self._commands[command.name] = command
+        return command
+
+    def get(self, name: str) -> Optional[Command]:
+        """Retorna um comando pelo seu nome principal."""
+        return self._commands.get(name.lower())
+
+    @property
+    def commands(self) -> List[Command]:
+        return list(self._commands.values())
+
+    def __contains__(self, word: object) -> bool:
+        return isinstance(word, str) and self._lookup_word(word.lower()) is not None
+
+    def _lookup_word(self, word: str, prefix: bool = True) -> Optional[Command]:
+        node = self._root
+        for char in word:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        if not prefix:
+            return node.command
+        return node.resolve(len(word))
+
+    def match(self, text: str) -> Optional[Tuple[Command, int]]:
+        """
+        Procura um comando no início do texto.
+
+        Returns:
+            (comando, posição logo após a palavra de comando), ou None se o
+            início do texto não for uma palavra de comando registada nem um
+            prefixo não ambíguo de uma.
+        """
+        length = len(text)
+        pos = 0
+        while pos < length and text[pos].isspace():
+            pos += 1
+        start = pos
+        node = self._root
+        while pos < length and not text[pos].isspace():
+            node = node.children.get(text[pos].lower())
+            if node is None:
+                return None
+            pos += 1
+        command = node.resolve(pos - start)
+        if command is None:
+            return None
+        return command, pos
+
+    def resolve(self, text: str) -> Optional[Invocation]:
+        """
+        Faz o parsing completo de uma mensagem: comando, subcomando e argumentos.
+
+        Raises:
+            ArgumentError: Se o comando existir mas os argumentos forem inválidos.
+        """
+        found = self.match(text)
+        if found is None:
+            return None
+        command, pos = found
+        if command.subcommands:
+            token = _TOKEN_RE.search(text, pos)
+            sub = command.subcommands.get(token.group(0).lower()) if token else None
+            if sub is not None:
+                command, pos = sub, token.end()
+        return Invocation(command, command.parse_args(text, pos))
+
+
+# Registo único partilhado pelos handlers e pelo dispatcher.
+registry = CommandRegistry()
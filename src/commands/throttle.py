@@ -0,0 +1,252 @@
+"""
+Proteção contra Flood de Comandos.
+
+Sem limite, cada `/ping` repetido por um membro do grupo vira uma chamada à
+Evolution API e tempo de handler, e envios em excesso põem em risco a
+reputação do número de WhatsApp. O dispatcher consulta este módulo depois de
+encontrar o comando e antes de correr o handler; uma invocação acima do
+limite é descartada em silêncio.
+
+Há dois limites, ambos têm de ser respeitados:
+- por participante: `(instance, chat, participante, comando)`, com o limite
+  do comando (`rate_limit` no registo, `THROTTLE_COMMAND_LIMITS` ou
+  `THROTTLE_DEFAULT_LIMIT`);
+- por chat: `(instance, chat)`, todos os comandos de todos os membros
+  (`THROTTLE_CHAT_LIMIT`).
+
+Os limites escrevem-se "N/período", ex: "5/60s", "20/1m", "100/1h".
+
+Cada contador é um token bucket na forma GCRA (generic cell rate algorithm):
+o estado de uma chave é um único número, o instante teórico em que o bucket
+volta a estar cheio. Uma chave cujo instante já passou equivale a um bucket
+cheio e pode ser esquecida, por isso a memória fica limitada mesmo com
+milhares de utilizadores.
+
+Backends:
+- "memory" (padrão): dicionário local a cada worker, limitado a
+  `THROTTLE_MAX_KEYS` chaves;
+- "redis": script Lua atómico, partilhado entre workers. Se o Redis falhar,
+  o comando é permitido.
+"""
+import abc
+import logging
+import re
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+from src.infra.config import settings
+from src.infra.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+UNLIMITED = "unlimited"
+
+_LIMIT_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d+(?:\.\d+)?)?\s*([smh]?)\s*$")
+_UNIT_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+
+class Limit:
+    """
+    `count` invocações por `period` segundos, com rajada até `count`.
+
+    Em GCRA: cada invocação "custa" `interval` segundos e a rajada tolera
+    `tolerance` segundos de adiantamento.
+    """
+
+    __slots__ = ("count", "period", "interval", "tolerance")
+
+    def __init__(self, count: int, period: float):
+        if count <= 0 or period <= 0:
+            raise ValueError("Um limite precisa de contagem e período positivos.")
+        self.count = count
+        self.period = period
+        self.interval = period / count
+        self.tolerance = self.interval * (count - 1)
+
+    @classmethod
+    def parse(cls, text: str) -> "Limit":
+        """Lê "N/período" (ex: "5/60s", "20/1m", "3/s"). Levanta ValueError."""
+        match = _LIMIT_RE.match(text)
+        if match is None:
+            raise ValueError(f"Limite inválido: {text!r} (formato: \"N/período\", ex: \"5/60s\").")
+        count, amount, unit = match.groups()
+        return cls(int(count), float(amount or 1) * _UNIT_SECONDS[unit])
+
+    def __repr__(self) -> str:
+        return f"{self.count}/{self.period:g}s"
+
+
+def parse_optional_limit(text: Optional[str]) -> Optional[Limit]:
+    """Como `Limit.parse`, mas None, "" e "unlimited" significam sem limite."""
+    if text is None or not text.strip() or text.strip().lower() == UNLIMITED:
+        return None
+    return Limit.parse(text)
+
+
+class Throttle(abc.ABC):
+    """Interface comum: verifica e consome várias chaves de uma só vez."""
+
+    def __init__(self):
+        self._checked = 0
+        self._throttled: Dict[str, int] = {}
+
+    async def acquire(self, checks: Sequence[Tuple[str, Hashable, Limit]]) -> Optional[str]:
+        """
+        Consome uma unidade de cada `(âmbito, chave, limite)`, apenas se todas
+        estiverem dentro do limite.
+
+        Returns:
+            None se a invocação é permitida, ou o âmbito do primeiro limite excedido.
+        """
+        self._checked += 1
+        scope = await self._acquire(checks)
+        if scope is not None:
+            self._throttled[scope] = self._throttled.get(scope, 0) + 1
+        return scope
+
+    @abc.abstractmethod
+    async def _acquire(self, checks: Sequence[Tuple[str, Hashable, Limit]]) -> Optional[str]:
+        ...
+
+    def stats(self) -> Dict[str, object]:
+        return {"checked": self._checked, "throttled": dict(self._throttled)}
+
+
+class MemoryThrottle(Throttle):
+    """
+    GCRA em memória. As chaves são guardadas pelo seu hash (um inteiro) em
+    vez do tuplo completo; uma colisão, extremamente improvável, apenas faria
+    duas chaves partilharem o mesmo contador.
+    """
+
+    def __init__(self, max_keys: int):
+        super().__init__()
+        self._max_keys = max(1, max_keys)
+        # hash da chave -> instante teórico de chegada (TAT), por ordem da última utilização.
+        self._tats: Dict[int, float] = {}
+
+    async def _acquire(self, checks: Sequence[Tuple[str, Hashable, Limit]]) -> Optional[str]:
+        now = time.monotonic()
+        updates: List[Tuple[int, float]] = []
+        for scope, key, limit in checks:
+            slot = hash(key)
+            tat = max(self._tats.get(slot, now), now)
+            if tat - now > limit.tolerance:
+                return scope
+            updates.append((slot, tat + limit.interval))
+        for slot, tat in updates:
+            # Reinserir move a chave para o fim: o início do dicionário fica com as menos recentes.
+            self._tats.pop(slot, None)
+            self._tats[slot] = tat
+        self._evict(now)
+        return None
+
+    def _evict(self, now: float):
+        tats = self._tats
+        while tats:
+            oldest = next(iter(tats))
+            # Bucket já cheio (TAT no passado) equivale a não ter estado; acima
+            # do limite de chaves, descarta mesmo assim (esse contador recomeça).
+            if tats[oldest] > now and len(tats) <= self._max_keys:
+                break
+            del tats[oldest]
+
+    def stats(self) -> Dict[str, object]:
+        return {**super().stats(), "keys": len(self._tats)}
+
+
+# Verifica todas as chaves e só consome se todas passarem. Usa o relógio do
+# Redis, comum a todos os workers. ARGV: pares (intervalo, tolerância) em ms.
+_GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tats = {}
+for i, key in ipairs(KEYS) do
+    local interval = tonumber(ARGV[2 * i - 1])
+    local tolerance = tonumber(ARGV[2 * i])
+    local tat = math.max(tonumber(redis.call('GET', key) or now), now)
+    if tat - now > tolerance then
+        return i
+    end
+    tats[i] = tat + interval
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, tats[i], 'PX', tats[i] - now)
+end
+return 0
+"""
+
+
+class RedisThrottle(Throttle):
+    """GCRA partilhado entre workers, num script Lua atómico."""
+
+    def __init__(self, prefix: str = "throttle"):
+        super().__init__()
+        self._prefix = prefix
+        self._script = None
+
+    async def _acquire(self, checks: Sequence[Tuple[str, Hashable, Limit]]) -> Optional[str]:
+        keys = [f"{self._prefix}:{scope}:" + ":".join(map(str, key)) for scope, key, _ in checks]
+        args: List[int] = []
+        for _, _, limit in checks:
+            args += [max(1, int(limit.interval * 1000)), int(limit.tolerance * 1000)]
+        try:
+            if self._script is None:
+                self._script = get_redis().register_script(_GCRA_SCRIPT)
+            exceeded = int(await self._script(keys=keys, args=args))
+        except Exception as e:
+            # É preferível atender um comando a mais do que bloquear todos.
+            logger.warning(f"Falha ao consultar o Redis para limitação de comandos: {e}")
+            return None
+        return checks[exceeded - 1][0] if exceeded else None
+
+
+class CommandThrottle:
+    """Monta as chaves e os limites de uma invocação e consulta o backend."""
+
+    def __init__(self, backend: Throttle, default_limit: Optional[Limit], chat_limit: Optional[Limit],
+                 command_limits: Dict[str, Optional[Limit]]):
+        self.backend = backend
+        self._default_limit = default_limit
+        self._chat_limit = chat_limit
+        self._command_limits = command_limits
+
+    def limit_for(self, command_name: str, declared: Optional[str]) -> Optional[Limit]:
+        """Limite por participante: configuração > declarado no registo > padrão."""
+        if command_name in self._command_limits:
+            return self._command_limits[command_name]
+        if declared is not None:
+            return parse_optional_limit(declared)
+        return self._default_limit
+
+    async def check(self, instance: str, remote_jid: str, participant: str, command_name: str,
+                    declared: Optional[str] = None) -> Optional[str]:
+        """None se a invocação pode seguir, ou o âmbito excedido ("user" ou "chat")."""
+        checks: List[Tuple[str, Hashable, Limit]] = []
+        limit = self.limit_for(command_name, declared)
+        if limit is not None:
+            checks.append(("user", (instance, remote_jid, participant, command_name), limit))
+        if self._chat_limit is not None:
+            checks.append(("chat", (instance, remote_jid), self._chat_limit))
+        if not checks:
+            return None
+        return await self.backend.acquire(checks)
+
+    def stats(self) -> Dict[str, object]:
+        return self.backend.stats()
+
+
+def create_command_throttle() -> Optional[CommandThrottle]:
+    """Cria o limitador definido nas configurações, ou None se estiver desativado."""
+    if not settings.THROTTLE_ENABLED:
+        return None
+    if settings.THROTTLE_BACKEND == "redis":
+        backend: Throttle = RedisThrottle()
+    else:
+        backend = MemoryThrottle(max_keys=settings.THROTTLE_MAX_KEYS)
+    return CommandThrottle(
+        backend=backend,
+        default_limit=parse_optional_limit(settings.THROTTLE_DEFAULT_LIMIT),
+        chat_limit=parse_optional_limit(settings.THROTTLE_CHAT_LIMIT),
+        command_limits={name.lower(): parse_optional_limit(value)
+                        for name, value in settings.THROTTLE_COMMAND_LIMITS.items()},
+    )
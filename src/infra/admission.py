@@ -0,0 +1,146 @@
+"""
+Controlo de Admissão e Descarte de Carga no `/inspect`.
+
+Sem limites, uma rajada de `messages.update`, presença ou status compete de
+igual para igual com os comandos e pode esgotar a memória do processo. Cada
+payload é classificado numa faixa de prioridade antes de qualquer trabalho:
+
+1. "command": mensagens cujo primeiro token é um comando registado;
+2. "message": restantes `messages.upsert` (conversa, media) e alterações de
+   grupos (que invalidam a cache de metadados e não podem ser descartadas);
+3. "status": tudo o resto (status, presença, atualizações de mensagens...).
+
+Cada faixa tem um limite de pedidos em curso e uma carga máxima do pipeline
+a jusante (ocupação da fila de despacho) acima da qual deixa de ser admitida.
+Um pedido admitido ocupa a vaga da sua faixa até o trabalho que despachou
+(fila de despacho ou encaminhamento para `/process`) terminar, e não apenas
+durante o `/inspect`, por isso o limite de pedidos em curso reflete o
+trabalho realmente acumulado a jusante.
+
+Assim, as faixas de menor prioridade cedem primeiro e os comandos mantêm
+sempre margem livre. Um pedido recusado é descartado em silêncio ("shed") ou
+respondido com 429/503 e `Retry-After`, para a Evolution API tentar mais tarde.
+"""
+from collections import Counter
+from typing import Any, Callable, Container, Dict, Iterable, Literal, Optional
+from src.commands.prefilter import extract_text, leading_token, normalize_event
+
+AdmissionPolicy = Literal["shed", "reject"]
+
+# Ordem de prioridade das faixas (menor valor = mais prioritária).
+LANE_PRIORITY = {"command": 0, "message": 1, "status": 2}
+
+# Eventos que transportam mensagens novas; os restantes vão para a faixa "status".
+MESSAGE_EVENTS = frozenset({"messages.upsert"})
+
+# Alterações de grupos (já normalizadas): seguem na faixa "message", que é
+# recusada com `Retry-After` em vez de descartada.
+GROUP_EVENTS = frozenset({"groups.update", "groups.upsert", "group-participants.update", "group.participants.update"})
+
+
+def classify_lane(payload: Any, commands: Container[str]) -> str:
+    """Atribui a faixa de prioridade olhando apenas para o evento e a primeira palavra."""
+    if not isinstance(payload, dict):
+        return "status"
+    event = payload.get("event")
+    event = normalize_event(event) if isinstance(event, str) else None
+    if event in GROUP_EVENTS:
+        return "message"
+    if event not in MESSAGE_EVENTS:
+        return "status"
+    data = payload.get("data")
+    text = extract_text(data.get("message")) if isinstance(data, dict) else None
+    if text:
+        token = leading_token(text)
+        if token is not None and token in commands:
+            return "command"
+    return "message"
+
+
+class Lane:
+    """
+    Faixa de prioridade.
+
+    Args:
+        name: Nome da faixa ("command", "message", "status").
+        max_inflight: Máximo de pedidos desta faixa em processamento simultâneo.
+        max_load: Ocupação do pipeline a jusante (0.0 a 1.0) acima da qual a
+                  faixa deixa de ser admitida.
+        policy: "shed" confirma e descarta; "reject" responde com erro e `Retry-After`.
+    """
+
+    def __init__(self, name: str, max_inflight: int, max_load: float, policy: AdmissionPolicy):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_load = max_load
+        self.policy = policy
+        self.inflight = 0
+
+
+class AdmissionSlot:
+    """
+    Vaga de um pedido admitido numa faixa. `release` é idempotente: a vaga é
+    libertada no fim do pedido ou, se ele despachou trabalho (`dispatched`),
+    quando esse trabalho termina.
+    """
+
+    __slots__ = ("_controller", "lane", "dispatched", "_released")
+
+    def __init__(self, controller: "AdmissionController", lane: str):
+        self._controller = controller
+        self.lane = lane
+        self.dispatched = False
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller.release(self.lane)
+
+
+class AdmissionController:
+    """
+    Decide, por faixa, se um pedido entra no pipeline.
+
+    `load` é uma função que retorna a ocupação atual do pipeline a jusante
+    (ex: tamanho da fila de despacho sobre o seu limite).
+    """
+
+    def __init__(self, lanes: Iterable[Lane], load: Callable[[], float]):
+        self._lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self._load = load
+        self._counters: Counter = Counter()
+
+    def lane(self, name: str) -> Lane:
+        return self._lanes[name]
+
+    def try_admit(self, name: str) -> Optional[str]:
+        """
+        Tenta admitir um pedido da faixa `name`.
+
+        Returns:
+            None se foi admitido (o chamador deve chamar `release` no fim), ou
+            o motivo da recusa: "inflight" ou "load".
+        """
+        lane = self._lanes[name]
+        if lane.inflight >= lane.max_inflight:
+            reason = "inflight"
+        elif self._load() >= lane.max_load:
+            reason = "load"
+        else:
+            lane.inflight += 1
+            self._counters[f"{name}.admitted"] += 1
+            return None
+        self._counters[f"{name}.{lane.policy}_{reason}"] += 1
+        return reason
+
+    def release(self, name: str):
+        self._lanes[name].inflight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pedidos em curso por faixa, ocupação atual e contadores de admissões e recusas."""
+        return {
+            "load": round(self._load(), 3),
+            "inflight": {name: lane.inflight for name, lane in self._lanes.items()},
+            "counters": dict(self._counters),
+        }
@@ -9,6 +9,7 @@ Para usar, basta importar o objeto 'settings':
 from core.config import settings
 print(settings.EVOLUTION_API_URL)
 """
+from typing import Dict, Literal, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -25,10 +26,186 @@ class Settings(BaseSettings):
     # Configurações da Evolution API
     EVOLUTION_API_URL: str
     AUTHENTICATION_API_KEY: str
-    INTERNAL_API_URL: str
+    # Só é usada no modo de despacho "http" (eco para /v1/webhook/process).
+    INTERNAL_API_URL: str = "http://localhost:8000"
+
+    # Cliente HTTP de saída para a Evolution API (pool de conexões partilhado)
+    EVOLUTION_HTTP_MAX_CONNECTIONS: int = 100
+    EVOLUTION_HTTP_MAX_KEEPALIVE: int = 20
+    EVOLUTION_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    EVOLUTION_HTTP2: bool = False
+    EVOLUTION_HTTP_TIMEOUT: float = 10.0
+    EVOLUTION_HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    # Resiliência das chamadas de saída (Evolution API e encaminhamento interno)
+    RETRY_MAX_ATTEMPTS: int = 4
+    RETRY_BASE_DELAY: float = 0.5
+    RETRY_MAX_DELAY: float = 8.0
+    # Retentativas permitidas: 20% dos pedidos, com um mínimo de 1 por segundo.
+    RETRY_BUDGET_RATIO: float = 0.2
+    RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_TIMEOUT: float = 30.0
+    DEAD_LETTER_PATH: str = "data/dead_letters.jsonl"
+
+    # Despacho de mensagens de saída (agrupamento por chat e limites de taxa)
+    OUTBOUND_REPLY_DELAY_MS: int = 1200
+    OUTBOUND_COALESCE_WINDOW: float = 0.0
+    OUTBOUND_COALESCE_MAX_CHARS: int = 4000
+    OUTBOUND_COALESCE_SEPARATOR: str = "\n\n"
+    OUTBOUND_MAX_PENDING_PER_CHAT: int = 100
+    # Token bucket: taxa (mensagens/segundo) e rajada máxima
+    OUTBOUND_INSTANCE_RATE: float = 5.0
+    OUTBOUND_INSTANCE_BURST: float = 10.0
+    OUTBOUND_CHAT_RATE: float = 1.0
+    OUTBOUND_CHAT_BURST: float = 3.0
 
     # Configurações do Bot
-    TARGET_GROUP_ID: str
+    # Grupo atendido quando não há tabela de rotas (ROUTES_CONFIG_PATH).
+    TARGET_GROUP_ID: Optional[str] = None
+    # Tabela de rotas (instance, remoteJid) -> comandos e definições de resposta,
+    # em JSON (ver src/infra/routing.py). Relida quando o ficheiro muda.
+    ROUTES_CONFIG_PATH: Optional[str] = None
+    ROUTES_RELOAD_INTERVAL: float = 5.0
+    # Sem TARGET_GROUP_ID nem ROUTES_CONFIG_PATH, o arranque falha, a menos
+    # que este valor seja True (nenhum chat é atendido).
+    ROUTES_ALLOW_EMPTY: bool = False
+
+    # Chave exigida no cabeçalho 'X-Admin-Key' pelos endpoints de administração.
+    # Se não for definida, esses endpoints ficam desativados.
+    ADMIN_API_KEY: Optional[str] = None
+
+    # Configurações do Despacho de Comandos
+    # "inprocess": o payload validado em /inspect vai direto para o dispatcher
+    #              através de uma fila interna limitada (padrão).
+    # "http":      o payload é reencaminhado para /v1/webhook/process via
+    #              INTERNAL_API_URL (útil quando o processador corre noutro serviço).
+    DISPATCH_MODE: Literal["inprocess", "http"] = "inprocess"
+    DISPATCH_QUEUE_MAXSIZE: int = 1000
+    DISPATCH_WORKERS: int = 4
+    DISPATCH_SHUTDOWN_TIMEOUT: float = 10.0
+    # Pré-filtro barato (evento, remoteJid, fromMe, primeira palavra) antes da validação
+    PREFILTER_ENABLED: bool = True
+
+    # Controlo de admissão no /inspect, por faixa de prioridade (command > message > status).
+    # Cada faixa tem um limite de pedidos em curso e uma ocupação máxima da fila de
+    # despacho acima da qual é recusada; os comandos só são recusados com a fila cheia.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_COMMAND_MAX_INFLIGHT: int = 200
+    ADMISSION_MESSAGE_MAX_INFLIGHT: int = 100
+    ADMISSION_STATUS_MAX_INFLIGHT: int = 50
+    ADMISSION_MESSAGE_MAX_LOAD: float = 0.8
+    ADMISSION_STATUS_MAX_LOAD: float = 0.5
+    # Faixa "status" quando saturada: "shed" confirma e descarta; "reject" pede novo envio.
+    ADMISSION_STATUS_POLICY: Literal["shed", "reject"] = "shed"
+    ADMISSION_REJECT_STATUS_CODE: Literal[429, 503] = 503
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+
+    # Codec JSON da ingestão e das respostas: "auto" usa orjson ou msgspec se instalados.
+    JSON_BACKEND: Literal["auto", "orjson", "msgspec", "json"] = "auto"
+
+    # Supervisor de tarefas em segundo plano (ex: encaminhamento no modo "http")
+    BACKGROUND_MAX_CONCURRENCY: int = 50
+    BACKGROUND_MAX_PENDING: int = 1000
+
+    # Inspetor web (WebSocket)
+    # Tamanho da fila de saída de cada cliente e o que fazer quando enche:
+    # "drop_oldest" descarta a mensagem mais antiga; "disconnect" fecha o cliente lento.
+    INSPECTOR_WS_QUEUE_SIZE: int = 100
+    INSPECTOR_SLOW_CLIENT_POLICY: Literal["drop_oldest", "disconnect"] = "drop_oldest"
+    # Difusão entre workers: "local" (um único processo) ou "redis" (PUBLISH/SUBSCRIBE).
+    PUBSUB_BACKEND: Literal["local", "redis"] = "local"
+    PUBSUB_CHANNEL: str = "inspector:events"
+
+    # Histórico do inspetor
+    # "sqlite": ficheiro local persistente e indexado (padrão);
+    # "redis": partilhado entre workers/contêineres; "memory": apenas em memória.
+    HISTORY_BACKEND: Literal["sqlite", "redis", "memory"] = "sqlite"
+    HISTORY_SQLITE_PATH: str = "data/inspector_history.sqlite3"
+    HISTORY_MAX_ENTRIES: int = 50000
+    HISTORY_MAX_AGE_SECONDS: float = 7 * 24 * 3600
+    HISTORY_BATCH_SIZE: int = 200
+    HISTORY_FLUSH_INTERVAL: float = 0.5
+    # Backend "memory": orçamento de bytes do buffer circular e compressão das entradas
+    # ("zstd" requer o pacote opcional `zstandard`; sem ele, usa zlib).
+    HISTORY_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024
+    HISTORY_MEMORY_COMPRESSION: Literal["none", "zlib", "zstd"] = "zlib"
+    HISTORY_MEMORY_COMPRESS_MIN_BYTES: int = 512
+
+    # Pipeline de media: armazenamento endereçado por conteúdo e pool de processadores
+    MEDIA_STORE_PATH: str = "data/media"
+    MEDIA_STORE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    MEDIA_MAX_FILE_BYTES: int = 100 * 1024 * 1024
+    MEDIA_CHUNK_SIZE: int = 64 * 1024
+    # Pool partilhado onde correm os processadores: "process" para trabalho de CPU
+    # (miniaturas, transcodificação); "thread" se libertarem o GIL ou forem leves.
+    MEDIA_EXECUTOR: Literal["process", "thread"] = "process"
+    MEDIA_THUMBNAIL_SIZE: int = 320
+
+    # Executores partilhados para handlers e processadores bloqueantes ou de CPU
+    # MAX_PENDING: tarefas submetidas (em execução + à espera) antes de recusar novas.
+    EXECUTOR_THREAD_WORKERS: int = 8
+    EXECUTOR_THREAD_MAX_PENDING: int = 64
+    EXECUTOR_PROCESS_WORKERS: Optional[int] = None  # None: um por CPU
+    EXECUTOR_PROCESS_MAX_PENDING: int = 32
+    # Timeout padrão dos handlers de comandos (segundos); 0 desativa.
+    COMMAND_DEFAULT_TIMEOUT: float = 30.0
+
+    # Proteção contra flood de comandos (src/commands/throttle.py). Limites "N/período", ex: "5/60s".
+    THROTTLE_ENABLED: bool = True
+    THROTTLE_BACKEND: Literal["memory", "redis"] = "memory"
+    # Por participante, para os comandos sem `rate_limit` no registo; "unlimited" (padrão) não limita
+    THROTTLE_DEFAULT_LIMIT: str = "unlimited"
+    # Por chat, somando todos os comandos de todos os membros
+    THROTTLE_CHAT_LIMIT: str = "30/60s"
+    # Limites por comando, em JSON: {"/ping": "2/10s"} (sobrepõe-se ao declarado no registo)
+    THROTTLE_COMMAND_LIMITS: Dict[str, str] = {}
+    THROTTLE_MAX_KEYS: int = 100_000
+
+    # Logging (src/infra/log_pipeline.py): formatação e escrita numa thread em segundo plano
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    # Registos em espera; acima disso, os registos abaixo de ERROR são descartados
+    LOG_QUEUE_SIZE: int = 10_000
+    # Fração mantida por evento de volume elevado ("log_event" no `extra`), em JSON.
+    # Avisos, erros e execuções de comandos nunca são amostrados.
+    LOG_SAMPLE_RATES: Dict[str, float] = {"payload_ignored": 0.01, "payload_processing": 0.1}
+
+    # Profiling a pedido (src/infra/profiling.py), ligado em /v1/admin/profiling/start.
+    # Valores padrão de cada sessão:
+    PROFILING_SAMPLE_RATE: float = 0.05
+    PROFILING_DURATION_SECONDS: float = 300.0
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_SLOW_CALLBACK_MS: float = 100.0
+    # Perfis e relatórios de bloqueio guardados em memória
+    PROFILING_MAX_PROFILES: int = 50
+    PROFILING_MAX_SLOW_REPORTS: int = 50
+
+    # Índice de mensagens recentes por chat (responder/citar/apagar sem pedir à Evolution API)
+    RECENT_MESSAGES_ENABLED: bool = True
+    RECENT_MESSAGES_PER_CHAT: int = 200
+    RECENT_MESSAGES_MAX_AGE_SECONDS: float = 6 * 3600
+    RECENT_MESSAGES_MAX_CHATS: int = 5000
+    RECENT_MESSAGES_SNIPPET_CHARS: int = 160
+
+    # Cache de metadados de grupos e contactos (src/services/metadata.py)
+    METADATA_GROUP_TTL: float = 300.0
+    METADATA_CONTACT_TTL: float = 3600.0
+    # TTL das respostas vazias (grupo ou contacto não encontrado)
+    METADATA_NEGATIVE_TTL: float = 60.0
+    METADATA_MAX_ENTRIES: int = 10_000
+    # Fração do TTL a partir da qual a entrada é renovada em segundo plano
+    METADATA_REFRESH_RATIO: float = 0.8
+
+    # Redis partilhado (opcional, usado pelos backends "redis")
+    REDIS_URL: str = "redis://redis:6379/0"
+
+    # Deduplicação de webhooks reenviados pela Evolution API
+    # "memory": cache LRU/TTL por worker; "redis": partilhada entre workers.
+    DEDUP_ENABLED: bool = True
+    DEDUP_BACKEND: Literal["memory", "redis"] = "memory"
+    DEDUP_TTL_SECONDS: float = 600.0
+    DEDUP_MAX_ENTRIES: int = 50000
 
 # Instância única das configurações que será importada por outros módulos.
 settings = Settings()
@@ -0,0 +1,116 @@
+"""
+Armazenamento de Mensagens Mortas (Dead-Letter).
+
+Quando uma chamada de saída esgota as retentativas (ou o circuito está aberto),
+o pedido é gravado num ficheiro JSONL local em vez de se perder. As entradas
+podem ser listadas e reenviadas mais tarde pelos endpoints de administração.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+from src.infra.config import settings
+
+logger = logging.getLogger(__name__)
+
+ReplayHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class DeadLetterStore:
+    """Ficheiro JSONL append-only com os pedidos de saída que falharam."""
+
+    def __init__(self, path: str):
+        self._path = Path(path)
+        self._lock = asyncio.Lock()
+
+    async def add(self, kind: str, target: str, payload: Dict[str, Any], error: str, method: str = "POST"):
+        """
+        Regista um pedido falhado.
+
+        Args:
+            kind: O tipo de pedido (ex: "evolution", "processor"), usado no reenvio.
+            target: O destino do pedido (ex: o caminho na Evolution API).
+            payload: O corpo do pedido, tal como seria enviado.
+            error: A descrição do último erro.
+            method: O método HTTP do pedido.
+        """
+        entry = {
+            "id": uuid.uuid4().hex,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "kind": kind,
+            "method": method,
+            "target": target,
+            "payload": payload,
+            "error": error,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._append_line, line)
+        logger.warning(f"Pedido '{kind}' para '{target}' guardado na dead-letter ({entry['id']}).")
+
+    async def list(self) -> List[Dict[str, Any]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._read_all)
+
+    async def replay(self, handlers: Dict[str, ReplayHandler]) -> Dict[str, int]:
+        """
+        Reenvia todas as entradas. As que voltarem a falhar permanecem no ficheiro.
+
+        Args:
+            handlers: Função de reenvio para cada `kind`; deve lançar exceção se falhar.
+        """
+        async with self._lock:
+            entries = await asyncio.to_thread(self._read_all)
+            remaining = []
+            replayed = 0
+            for entry in entries:
+                handler = handlers.get(entry.get("kind"))
+                if handler is None:
+                    remaining.append(entry)
+                    continue
+                try:
+                    await handler(entry)
+                    replayed += 1
+                except Exception as e:
+                    entry["error"] = str(e)
+                    remaining.append(entry)
+            await asyncio.to_thread(self._rewrite, remaining)
+        logger.info(f"Dead-letter: {replayed} pedidos reenviados, {len(remaining)} pendentes.")
+        return {"replayed": replayed, "remaining": len(remaining)}
+
+    # --- Operações síncronas (executadas numa thread) ---
+
+    def _append_line(self, line: str):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with self._path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _read_all(self) -> List[Dict[str, Any]]:
+        if not self._path.is_file():
+            return []
+        entries = []
+        with self._path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.error("Linha inválida ignorada no ficheiro de dead-letter.")
+        return entries
+
+    def _rewrite(self, entries: List[Dict[str, Any]]):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix(self._path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        tmp_path.replace(self._path)
+
+
+# Instância única partilhada pelos clientes de saída.
+dead_letters = DeadLetterStore(settings.DEAD_LETTER_PATH)
@@ -0,0 +1,146 @@
+"""
+Deduplicação de Webhooks (Idempotência).
+
+A Evolution API reenvia entregas que considera falhadas, por isso a mesma
+mensagem (`data.key.id`) pode chegar mais de uma vez. Este módulo guarda as
+chaves `(instance, key.id, event)` já vistas durante um tempo limitado, para
+que os duplicados sejam confirmados de imediato sem voltar a ser validados,
+transmitidos ao inspetor ou despachados.
+
+Backends:
+- "memory" (padrão): cache LRU com TTL, local a cada worker.
+- "redis": `SET NX EX` partilhado, para que vários workers concordem.
+"""
+import abc
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from src.infra.config import settings
+from src.infra.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+DedupKey = Tuple[str, str, str]
+
+
+def extract_dedup_key(payload: Any) -> Optional[DedupKey]:
+    """
+    Retorna `(instance, key.id, event)` de um payload bruto, ou None se o
+    payload não tiver um id de mensagem (ex: presença, status de conexão).
+    """
+    if not isinstance(payload, dict):
+        return None
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        return None
+    key = data.get("key")
+    if not isinstance(key, dict):
+        return None
+    message_id = key.get("id")
+    if not message_id:
+        return None
+    return (str(payload.get("instance")), str(message_id), str(payload.get("event")))
+
+
+class DedupCache(abc.ABC):
+    """Interface comum e contadores para o cálculo da taxa de duplicados."""
+
+    def __init__(self):
+        self._checked = 0
+        self._duplicates = 0
+
+    async def is_duplicate(self, key: DedupKey) -> bool:
+        """Regista a chave e retorna True se ela já tinha sido vista dentro do TTL."""
+        self._checked += 1
+        duplicate = await self._check_and_add(key)
+        if duplicate:
+            self._duplicates += 1
+        return duplicate
+
+    @abc.abstractmethod
+    async def _check_and_add(self, key: DedupKey) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def forget(self, key: DedupKey):
+        """
+        Esquece uma chave registada por `is_duplicate` (ex: o payload não chegou
+        a ser aceite), para que o reenvio seja processado.
+        """
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self._checked,
+            "duplicates": self._duplicates,
+            "duplicate_rate": self._duplicates / self._checked if self._checked else 0.0,
+        }
+
+
+class MemoryDedupCache(DedupCache):
+    """Cache LRU com TTL em memória, limitada a `max_entries` chaves."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        super().__init__()
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        # chave -> instante (monotónico) em que expira
+        self._entries: "OrderedDict[DedupKey, float]" = OrderedDict()
+
+    async def _check_and_add(self, key: DedupKey) -> bool:
+        now = time.monotonic()
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            self._entries.move_to_end(key)
+            return True
+        self._entries[key] = now + self._ttl
+        self._entries.move_to_end(key)
+        self._evict(now)
+        return False
+
+    async def forget(self, key: DedupKey):
+        self._entries.pop(key, None)
+
+    def _evict(self, now: float):
+        # As entradas mais antigas ficam no início: remove as expiradas e o excesso.
+        while self._entries:
+            oldest_key, oldest_expiry = next(iter(self._entries.items()))
+            if oldest_expiry > now and len(self._entries) <= self._max_entries:
+                break
+            self._entries.popitem(last=False)
+
+
+class RedisDedupCache(DedupCache):
+    """Cache partilhada entre workers usando `SET NX EX` no Redis."""
+
+    def __init__(self, ttl_seconds: float):
+        super().__init__()
+        self._ttl = max(1, int(ttl_seconds))
+
+    async def _check_and_add(self, key: DedupKey) -> bool:
+        redis_key = "dedup:" + ":".join(key)
+        try:
+            created = await get_redis().set(redis_key, 1, nx=True, ex=self._ttl)
+        except Exception as e:
+            # Em caso de falha do Redis, é preferível processar do que perder mensagens.
+            logger.warning(f"Falha ao consultar o Redis para deduplicação: {e}")
+            return False
+        return not created
+
+    async def forget(self, key: DedupKey):
+        try:
+            await get_redis().delete("dedup:" + ":".join(key))
+        except Exception as e:
+            logger.warning(f"Falha ao remover a chave de deduplicação do Redis: {e}")
+
+
+def create_dedup_cache() -> Optional[DedupCache]:
+    """Cria a cache definida em `settings.DEDUP_BACKEND`, ou None se estiver desativada."""
+    if not settings.DEDUP_ENABLED:
+        return None
+    if settings.DEDUP_BACKEND == "redis":
+        return RedisDedupCache(ttl_seconds=settings.DEDUP_TTL_SECONDS)
+    return MemoryDedupCache(
+        ttl_seconds=settings.DEDUP_TTL_SECONDS,
+        max_entries=settings.DEDUP_MAX_ENTRIES,
+    )
@@ -0,0 +1,135 @@
+"""
+Fila Interna de Despacho de Comandos.
+
+Entrega os payloads já validados pelo endpoint `/inspect` diretamente ao
+dispatcher, sem o "eco" HTTP para `/process` (nova codificação JSON, ida e
+volta TCP e segunda validação). A fila é limitada: quando está cheia, o
+payload é descartado e registado em vez de acumular memória sem controlo.
+
+Os payloads saem por ordem de prioridade (ver `src/infra/admission.py`), por
+isso um comando nunca espera atrás de conversa acumulada.
+"""
+import itertools
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from src.infra.metrics import WEBHOOK_STAGE_SECONDS
+from src.models.evolution import WebhookPayload
+
+logger = logging.getLogger(__name__)
+
+PayloadHandler = Callable[[WebhookPayload], Awaitable[None]]
+
+
+class DispatchQueue:
+    """
+    Fila assíncrona limitada consumida por um número fixo de workers.
+
+    Cada worker retira um `WebhookPayload` da fila e chama o handler
+    configurado (normalmente `src.commands.dispatcher.dispatch`).
+    """
+
+    def __init__(self, handler: PayloadHandler, maxsize: int, workers: int):
+        self._handler = handler
+        self._maxsize = maxsize
+        self._num_workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # Desempata payloads da mesma prioridade por ordem de chegada.
+        self._sequence = itertools.count()
+        # Contadores
+        self._processed = 0
+        self._failed = 0
+        self._dropped = 0
+
+    async def start(self):
+        """Cria a fila e arranca os workers. Deve ser chamado no arranque da aplicação."""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue(maxsize=self._maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"dispatch-worker-{i}")
+            for i in range(self._num_workers)
+        ]
+        logger.info(f"Fila de despacho iniciada com {self._num_workers} workers (limite: {self._maxsize}).")
+
+    def submit(self, payload: WebhookPayload, priority: int = 0,
+               on_done: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Coloca um payload na fila sem bloquear. Valores menores de `priority`
+        são despachados primeiro. `on_done`, se aceite, é chamado quando o
+        handler termina (ex: libertar a vaga do controlo de admissão).
+
+        Returns:
+            True se o payload foi aceite, False se a fila estiver cheia ou parada.
+        """
+        if self._queue is None:
+            self._dropped += 1
+            logger.error("Fila de despacho não iniciada. Payload descartado.")
+            return False
+        try:
+            self._queue.put_nowait((priority, next(self._sequence), payload, time.perf_counter(), on_done))
+            return True
+        except asyncio.QueueFull:
+            self._dropped += 1
+            logger.warning(f"Fila de despacho cheia. Payload do evento '{payload.event}' descartado.")
+            return False
+
+    async def stop(self, timeout: float):
+        """
+        Aguarda (até `timeout` segundos) que os payloads pendentes sejam
+        processados e depois termina os workers.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self._queue.qsize()} payloads não foram processados antes do encerramento.")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    @property
+    def size(self) -> int:
+        """Número de payloads à espera na fila."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def has_capacity(self) -> bool:
+        """True se um `submit` feito agora seria aceite (fila iniciada e com espaço)."""
+        return self._queue is not None and not self._queue.full()
+
+    @property
+    def load(self) -> float:
+        """Ocupação da fila, de 0.0 (vazia) a 1.0 (cheia)."""
+        return self.size / self._maxsize if self._maxsize > 0 else 0.0
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna uma fotografia dos contadores da fila."""
+        return {
+            "queued": self.size,
+            "processed": self._processed,
+            "failed": self._failed,
+            "dropped": self._dropped,
+        }
+
+    async def _worker(self):
+        while True:
+            _, _, payload, enqueued_at, on_done = await self._queue.get()
+            started = time.perf_counter()
+            WEBHOOK_STAGE_SECONDS.observe(started - enqueued_at, "queue_wait")
+            try:
+                await self._handler(payload)
+                self._processed += 1
+            except Exception as e:
+                self._failed += 1
+                logger.error(f"Erro ao processar comando do evento '{payload.event}': {e}", exc_info=True)
+            finally:
+                WEBHOOK_STAGE_SECONDS.observe(time.perf_counter() - started, "dispatch")
+                if on_done is not None:
+                    on_done()
+                self._queue.task_done()
@@ -0,0 +1,183 @@
+"""
+Executores Partilhados para Trabalho Bloqueante ou de CPU.
+
+Um único pool de threads e um único pool de processos servem toda a
+aplicação (handlers de comandos, processadores de media...), em vez de cada
+componente criar o seu. Cada pool é limitado em duas dimensões:
+
+- `workers`: quantas tarefas correm em simultâneo;
+- `max_pending`: quantas podem estar submetidas (em execução ou à espera).
+  Acima disso, `run` levanta `ExecutorSaturatedError` em vez de acumular
+  trabalho sem limite.
+
+O tempo de espera na fila do pool (entre a submissão e o início efetivo) é
+medido e exportado em `/metrics`, separado do tempo de execução.
+
+Os processos do pool são criados com "spawn" e não com "fork": um processo
+criado por fork herdaria o handler de logging ligado a uma fila que ninguém
+consome (a thread de escrita não sobrevive ao fork), e os seus registos
+perder-se-iam. Cada processo configura o seu próprio logging ao arrancar.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Literal, Optional, Tuple
+from src.infra.config import settings
+from src.infra.log_pipeline import log_pipeline
+from src.infra.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ExecutionMode = Literal["inline", "thread", "process"]
+
+EXECUTOR_QUEUE_SECONDS = metrics.histogram(
+    "executor_queue_seconds",
+    "Tempo de espera no pool antes de a tarefa começar a correr.",
+    ["pool"],
+)
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """O pool já tem `max_pending` tarefas submetidas."""
+
+
+def _init_process_worker():
+    # Corre uma vez em cada processo do pool, antes da primeira tarefa.
+    log_pipeline.configure_worker()
+
+
+def _timed_call(func: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[float, Any]:
+    # Corre no worker (thread ou processo): regista o instante de início em
+    # tempo de relógio, comparável entre processos.
+    return time.time(), func(*args)
+
+
+class BoundedExecutor:
+    """Pool de threads ou de processos com limite de tarefas submetidas."""
+
+    def __init__(self, name: str, kind: Literal["thread", "process"], workers: int, max_pending: int):
+        self.name = name
+        self._kind = kind
+        self._workers = max(1, workers)
+        self._max_pending = max(1, max_pending)
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        # Contadores
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self._kind == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix=self.name)
+
+    async def shutdown(self):
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Corre `func(*args)` no pool e retorna o resultado. No pool de processos,
+        `func` e os argumentos têm de ser serializáveis (funções de módulo).
+
+        Se o chamador for cancelado (ex: timeout), a tarefa continua a ocupar a
+        sua vaga até terminar de facto: threads e processos não podem ser
+        interrompidos a meio, e o limite reflete o trabalho real em curso.
+
+        Raises:
+            ExecutorSaturatedError: Se o pool já tiver `max_pending` tarefas.
+        """
+        if self._executor is None:
+            self.start()
+        if self._pending >= self._max_pending:
+            self._rejected += 1
+            raise ExecutorSaturatedError(f"Pool '{self.name}' saturado ({self._pending} tarefas pendentes).")
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        submitted = time.time()
+        try:
+            future = self._executor.submit(_timed_call, func, args)
+        except BaseException:
+            self._pending -= 1
+            raise
+        # O callback corre na thread do pool quando a tarefa termina de facto
+        # (ou é cancelada antes de começar), e não quando o chamador desiste.
+        future.add_done_callback(lambda done: loop.call_soon_threadsafe(self._on_done, done))
+        started, result = await asyncio.wrap_future(future)
+        EXECUTOR_QUEUE_SECONDS.observe(max(0.0, started - submitted), self.name)
+        return result
+
+    def _on_done(self, future: Future):
+        self._pending -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self._failed += 1
+        else:
+            self._completed += 1
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self._workers,
+            "pending": self._pending,
+            "completed": self._completed,  # inclui as tarefas cujo chamador desistiu (timeout)
+            "failed": self._failed,
+            "rejected": self._rejected,
+        }
+
+
+class Executors:
+    """Os pools partilhados da aplicação, criados no arranque e fechados no encerramento."""
+
+    def __init__(self):
+        self.thread = BoundedExecutor(
+            "thread", "thread", settings.EXECUTOR_THREAD_WORKERS, settings.EXECUTOR_THREAD_MAX_PENDING,
+        )
+        self.process = BoundedExecutor(
+            "process", "process", settings.EXECUTOR_PROCESS_WORKERS or os.cpu_count() or 1,
+            settings.EXECUTOR_PROCESS_MAX_PENDING,
+        )
+
+    def get(self, mode: ExecutionMode) -> BoundedExecutor:
+        if mode == "process":
+            return self.process
+        if mode == "thread":
+            return self.thread
+        raise ValueError(f"Modo sem pool associado: {mode!r}")
+
+    def start(self):
+        self.thread.start()
+        self.process.start()
+
+    async def shutdown(self):
+        await self.thread.shutdown()
+        await self.process.shutdown()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"thread": self.thread.stats(), "process": self.process.stats()}
+
+
+# Instância única da aplicação.
+executors = Executors()
+
+metrics.gauge("executor_thread_pending", "Tarefas submetidas ao pool de threads (em execução ou à espera).",
+              lambda: executors.thread.pending)
+metrics.gauge("executor_process_pending", "Tarefas submetidas ao pool de processos (em execução ou à espera).",
+              lambda: executors.process.pending)
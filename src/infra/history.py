@@ -0,0 +1,612 @@
+"""
+Armazenamento do Histórico de Payloads do Inspetor.
+
+Substitui o `deque(maxlen=30)` em memória por um backend configurável:
+- "sqlite" (padrão): ficheiro local append-only, com índices por evento,
+  instância, remoteJid e data, partilhável entre workers do mesmo host (WAL).
+- "redis": partilhado no Redis, para vários workers ou contêineres.
+- "memory": buffer circular compacto em memória, com entradas serializadas e
+  comprimidas e um orçamento de bytes (perde-se ao reiniciar).
+
+As escritas nunca acontecem no caminho do pedido: `append()` apenas coloca a
+entrada numa fila, e uma tarefa em segundo plano grava-as em lotes. Quando o
+chamador fornece os bytes originais do payload, os backends persistentes
+gravam-nos tal como chegaram, sem voltar a codificar o JSON.
+"""
+import abc
+import asyncio
+import datetime
+import logging
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from src.commands.prefilter import normalize_event
+from src.infra import json_codec
+from src.infra.config import settings
+from src.infra.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def extract_index_fields(payload: Any) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Extrai (event, instance, remoteJid) de um payload bruto, sem validação.
+    O evento é normalizado ('MESSAGES_UPSERT' -> 'messages.upsert').
+    """
+    if not isinstance(payload, dict):
+        return None, None, None
+    event = payload.get("event")
+    instance = payload.get("instance")
+    remote_jid = None
+    data = payload.get("data")
+    if isinstance(data, dict):
+        key = data.get("key")
+        if isinstance(key, dict):
+            remote_jid = key.get("remoteJid")
+    return (
+        normalize_event(event) if isinstance(event, str) else None,
+        instance if isinstance(instance, str) else None,
+        remote_jid if isinstance(remote_jid, str) else None,
+    )
+
+
+# Entrada à espera de escrita: (entrada, bytes originais do payload ou None).
+QueuedEntry = Tuple[Dict[str, Any], Optional[bytes]]
+
+
+class HistoryStore(abc.ABC):
+    """Interface comum a todos os backends de histórico."""
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    def append(self, entry: Dict[str, Any], raw_payload: Optional[bytes] = None):
+        """
+        Regista uma entrada `{"timestamp": ..., "payload": ...}` sem bloquear.
+        `raw_payload`, se fornecido, são os bytes JSON originais de `entry["payload"]`.
+        """
+
+    @abc.abstractmethod
+    async def query(
+        self,
+        limit: int = 30,
+        offset: int = 0,
+        event: Optional[str] = None,
+        instance: Optional[str] = None,
+        remote_jid: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """Retorna as entradas mais recentes primeiro, aplicando os filtros dados."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do backend (entradas, bytes, descartes...)."""
+        return {}
+
+
+class _InternTable:
+    """
+    Tabela de strings repetidas (evento, instância, remoteJid) para que cada
+    entrada guarde apenas um inteiro. As strings deixam de ser referenciadas
+    quando a última entrada que as usa é descartada.
+    """
+
+    NONE_ID = 0
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[Optional[str]] = [None]
+        self._refcounts: List[int] = [0]
+        self._free: List[int] = []
+
+    def acquire(self, value: Optional[str]) -> int:
+        if value is None:
+            return self.NONE_ID
+        string_id = self._ids.get(value)
+        if string_id is None:
+            if self._free:
+                string_id = self._free.pop()
+                self._strings[string_id] = value
+            else:
+                string_id = len(self._strings)
+                self._strings.append(value)
+                self._refcounts.append(0)
+            self._ids[value] = string_id
+        self._refcounts[string_id] += 1
+        return string_id
+
+    def release(self, string_id: int):
+        if string_id == self.NONE_ID:
+            return
+        self._refcounts[string_id] -= 1
+        if self._refcounts[string_id] == 0:
+            del self._ids[self._strings[string_id]]
+            self._strings[string_id] = None
+            self._free.append(string_id)
+
+    def lookup(self, value: str) -> Optional[int]:
+        """Id de uma string já presente, ou None se nenhuma entrada a usa."""
+        return self._ids.get(value)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class MemoryHistoryStore(HistoryStore):
+    """
+    Histórico em memória como buffer circular compacto (perde-se ao reiniciar).
+
+    Cada entrada é guardada como um único objeto `bytes`: um cabeçalho de
+    tamanho fixo (timestamp, ids do evento, instância e remoteJid, tamanho
+    original e compressão) seguido do JSON da entrada, comprimido com zlib ou
+    zstd quando passa de `compress_min_bytes`. Os filtros usam só o cabeçalho;
+    o JSON é descomprimido e descodificado apenas para as entradas retornadas.
+
+    O limite é um orçamento de bytes (`max_bytes`) e não um número de
+    entradas: as mais antigas são descartadas até o total caber no orçamento,
+    por maiores que sejam os payloads.
+    """
+
+    # timestamp (float64), event, instance, remoteJid (ids uint32), tamanho original (uint32), compressão (uint8)
+    _HEADER = struct.Struct("<dIIIIB")
+    # Custo aproximado de cada objeto `bytes` e da sua posição no deque.
+    _RECORD_OVERHEAD = sys.getsizeof(b"") + 8
+    _COMPRESSORS = ("none", "zlib", "zstd")
+
+    def __init__(self, max_bytes: int, compression: str = "zlib", compress_min_bytes: int = 512):
+        self._records: deque = deque()
+        self._strings = _InternTable()
+        self._max_bytes = max_bytes
+        self._compress_min_bytes = compress_min_bytes
+        self._bytes = 0
+        self._raw_bytes = 0
+        self.evicted = 0
+        self._compression, self._compress, self._decompressors = self._load_codecs(compression)
+
+    @classmethod
+    def _load_codecs(cls, compression: str):
+        decompressors = {0: lambda data: data, 1: zlib.decompress}
+        compress = lambda data: zlib.compress(data, 1)
+        if compression == "zstd":
+            try:
+                import zstandard
+
+                compressor = zstandard.ZstdCompressor(level=3)
+                decompressor = zstandard.ZstdDecompressor()
+                decompressors[2] = decompressor.decompress
+                return "zstd", compressor.compress, decompressors
+            except ImportError:
+                logger.warning("Pacote 'zstandard' não instalado. O histórico em memória usará zlib.")
+                compression = "zlib"
+        if compression == "none":
+            return "none", None, decompressors
+        return "zlib", compress, decompressors
+
+    def append(self, entry: Dict[str, Any], raw_payload: Optional[bytes] = None):
+        if raw_payload is not None:
+            data = json_codec.entry_bytes(entry["timestamp"], raw_payload)
+        else:
+            data = json_codec.dumps(entry)
+        size = len(data)
+        method = 0
+        if self._compress is not None and len(data) >= self._compress_min_bytes:
+            method = self._COMPRESSORS.index(self._compression)
+            data = self._compress(data)
+        event, instance, remote_jid = extract_index_fields(entry.get("payload"))
+        header = self._HEADER.pack(
+            datetime.datetime.fromisoformat(entry["timestamp"]).timestamp(),
+            self._strings.acquire(event),
+            self._strings.acquire(instance),
+            self._strings.acquire(remote_jid),
+            size,
+            method,
+        )
+        record = header + data
+        self._records.appendleft(record)
+        self._bytes += len(record) + self._RECORD_OVERHEAD
+        self._raw_bytes += size
+        while self._bytes > self._max_bytes and len(self._records) > 1:
+            self._evict(self._records.pop())
+
+    def _evict(self, record: bytes):
+        _, event_id, instance_id, jid_id, raw_size, _ = self._HEADER.unpack_from(record)
+        for string_id in (event_id, instance_id, jid_id):
+            self._strings.release(string_id)
+        self._bytes -= len(record) + self._RECORD_OVERHEAD
+        self._raw_bytes -= raw_size
+        self.evicted += 1
+
+    def _decode(self, record: bytes) -> Dict[str, Any]:
+        method = record[self._HEADER.size - 1]
+        return json_codec.loads(self._decompressors[method](record[self._HEADER.size:]))
+
+    async def query(self, limit=30, offset=0, event=None, instance=None,
+                    remote_jid=None, since=None, until=None):
+        # Um valor que nenhuma entrada usa não precisa de percorrer o buffer.
+        wanted = []
+        for value in (event, instance, remote_jid):
+            if value is None:
+                wanted.append(None)
+                continue
+            string_id = self._strings.lookup(value)
+            if string_id is None:
+                return []
+            wanted.append(string_id)
+        event_id, instance_id, jid_id = wanted
+        since_ts = since.timestamp() if since is not None else None
+        until_ts = until.timestamp() if until is not None else None
+
+        results = []
+        skipped = 0
+        unpack = self._HEADER.unpack_from
+        for record in self._records:
+            ts, entry_event, entry_instance, entry_jid, _, _ = unpack(record)
+            if event_id is not None and entry_event != event_id:
+                continue
+            if instance_id is not None and entry_instance != instance_id:
+                continue
+            if jid_id is not None and entry_jid != jid_id:
+                continue
+            if since_ts is not None and ts < since_ts:
+                continue
+            if until_ts is not None and ts > until_ts:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            results.append(self._decode(record))
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._records),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "uncompressed_bytes": self._raw_bytes,
+            "compression": self._compression,
+            "interned_strings": len(self._strings),
+            "evicted": self.evicted,
+        }
+
+
+class BatchedHistoryStore(HistoryStore):
+    """
+    Base para backends persistentes: `append()` apenas enfileira a entrada, e
+    uma tarefa em segundo plano grava-as em lotes (a cada `flush_interval`
+    segundos ou `batch_size` entradas). A retenção corre no máximo uma vez a
+    cada `_PRUNE_INTERVAL_SECONDS`, removendo entradas mais antigas que
+    `max_age_seconds` e mantendo no máximo `max_entries`.
+
+    As subclasses implementam `_open`, `_close`, `_write_batch` e `_prune`.
+    """
+
+    _PRUNE_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, max_entries: int, max_age_seconds: float, batch_size: int,
+                 flush_interval: float, queue_maxsize: int = 10000):
+        self._max_entries = max_entries
+        self._max_age_seconds = max_age_seconds
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue_maxsize = queue_maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+        # Entradas já retiradas da fila mas ainda não entregues ao backend.
+        self._inflight: List[QueuedEntry] = []
+        self.dropped = 0
+
+    async def start(self):
+        if self._writer is not None:
+            return
+        await self._open()
+        self._queue = asyncio.Queue(maxsize=self._queue_maxsize)
+        self._writer = asyncio.create_task(self._writer_loop(), name="history-writer")
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writer.cancel()
+        await asyncio.gather(self._writer, return_exceptions=True)
+        self._writer = None
+        # Grava o que ainda estiver pendente antes de fechar.
+        batch, self._inflight = self._inflight + self._drain_queue(limit=None), []
+        if batch:
+            await self._write_batch(batch)
+        await self._close()
+        self._queue = None
+
+    def append(self, entry: Dict[str, Any], raw_payload: Optional[bytes] = None):
+        if self._queue is None:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((entry, raw_payload))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Fila de escrita do histórico cheia. Entrada descartada.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize() if self._queue is not None else 0, "dropped": self.dropped}
+
+    async def _open(self):
+        pass
+
+    async def _close(self):
+        pass
+
+    @abc.abstractmethod
+    async def _write_batch(self, batch: List[QueuedEntry]):
+        ...
+
+    @abc.abstractmethod
+    async def _prune(self):
+        ...
+
+    # --- Tarefa de escrita em lotes ---
+
+    def _drain_queue(self, limit: Optional[int]) -> List[QueuedEntry]:
+        batch = []
+        while self._queue is not None and not self._queue.empty():
+            if limit is not None and len(batch) >= limit:
+                break
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _writer_loop(self):
+        while True:
+            self._inflight = [await self._queue.get()]
+            # Espera um pouco para acumular um lote antes de gravar.
+            if self._queue.qsize() < self._batch_size:
+                await asyncio.sleep(self._flush_interval)
+            self._inflight.extend(self._drain_queue(limit=self._batch_size - 1))
+            batch, self._inflight = self._inflight, []
+            try:
+                await self._write_batch(batch)
+                now = time.monotonic()
+                if now - self._last_prune >= self._PRUNE_INTERVAL_SECONDS:
+                    self._last_prune = now
+                    await self._prune()
+            except Exception as e:
+                logger.error(f"Falha ao gravar {len(batch)} entradas no histórico: {e}", exc_info=True)
+
+
+class SQLiteHistoryStore(BatchedHistoryStore):
+    """
+    Histórico persistente num ficheiro SQLite, com índices por evento,
+    instância, remoteJid e data. Em modo WAL, vários workers do mesmo host
+    podem partilhar o mesmo ficheiro.
+    """
+
+    def __init__(self, path: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    async def _open(self):
+        await asyncio.to_thread(self._open_sync)
+        logger.info(f"Histórico do inspetor em SQLite: {self._path}")
+
+    async def _close(self):
+        await asyncio.to_thread(self._close_sync)
+        self._conn = None
+
+    async def _write_batch(self, batch: List[QueuedEntry]):
+        await asyncio.to_thread(self._write_batch_sync, batch)
+
+    async def _prune(self):
+        await asyncio.to_thread(self._prune_sync)
+
+    async def query(self, limit=30, offset=0, event=None, instance=None,
+                    remote_jid=None, since=None, until=None):
+        clauses, params = [], []
+        if event is not None:
+            clauses.append("event = ?")
+            params.append(event)
+        if instance is not None:
+            clauses.append("instance = ?")
+            params.append(instance)
+        if remote_jid is not None:
+            clauses.append("remote_jid = ?")
+            params.append(remote_jid)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("ts <= ?")
+            params.append(until.timestamp())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = f"SELECT timestamp, payload FROM history {where} ORDER BY id DESC LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        rows = await asyncio.to_thread(self._execute_read, sql, params)
+        return [{"timestamp": ts, "payload": json_codec.loads(payload)} for ts, payload in rows]
+
+    # --- Operações síncronas (executadas numa thread) ---
+
+    def _open_sync(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts REAL NOT NULL,
+                timestamp TEXT NOT NULL,
+                event TEXT,
+                instance TEXT,
+                remote_jid TEXT,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_ts ON history (ts);
+            CREATE INDEX IF NOT EXISTS idx_history_event ON history (event, id);
+            CREATE INDEX IF NOT EXISTS idx_history_instance ON history (instance, id);
+            CREATE INDEX IF NOT EXISTS idx_history_remote_jid ON history (remote_jid, id);
+        """)
+        conn.commit()
+        self._conn = conn
+
+    def _close_sync(self):
+        # O lock garante que uma escrita ainda em curso termina antes de fechar.
+        with self._lock:
+            self._conn.close()
+
+    def _execute_read(self, sql: str, params: list):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write_batch_sync(self, batch: List[QueuedEntry]):
+        rows = []
+        for entry, raw_payload in batch:
+            payload = entry.get("payload")
+            event, instance, remote_jid = extract_index_fields(payload)
+            timestamp = entry["timestamp"]
+            ts = datetime.datetime.fromisoformat(timestamp).timestamp()
+            raw = raw_payload if raw_payload is not None else json_codec.dumps(payload)
+            rows.append((ts, timestamp, event, instance, remote_jid, raw.decode("utf-8")))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO history (ts, timestamp, event, instance, remote_jid, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def _prune_sync(self):
+        with self._lock:
+            cutoff = time.time() - self._max_age_seconds
+            self._conn.execute("DELETE FROM history WHERE ts < ?", (cutoff,))
+            self._conn.execute(
+                "DELETE FROM history WHERE id <= "
+                "(SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self._max_entries,),
+            )
+            self._conn.commit()
+
+
+class RedisHistoryStore(BatchedHistoryStore):
+    """
+    Histórico partilhado no Redis, para vários workers ou contêineres.
+
+    Estrutura (prefixo `inspector:history`):
+    - `:entries`  hash id -> entrada serializada;
+    - `:ts`       sorted set id -> timestamp (índice principal);
+    - `:idx:<campo>:<valor>` sorted sets por evento, instância e remoteJid,
+      com expiração igual à idade máxima de retenção.
+
+    As consultas percorrem o índice mais seletivo disponível e verificam os
+    restantes filtros nas entradas lidas.
+    """
+
+    _PREFIX = "inspector:history"
+    _SCAN_CHUNK = 200
+
+    async def _open(self):
+        logger.info("Histórico do inspetor partilhado no Redis.")
+
+    async def _write_batch(self, batch: List[QueuedEntry]):
+        pipe = get_redis().pipeline(transaction=False)
+        ttl = max(1, int(self._max_age_seconds))
+        for entry, raw_payload in batch:
+            ts = datetime.datetime.fromisoformat(entry["timestamp"]).timestamp()
+            entry_id = f"{ts:.6f}-{uuid.uuid4().hex[:8]}"
+            serialized = (json_codec.entry_bytes(entry["timestamp"], raw_payload)
+                          if raw_payload is not None else json_codec.dumps(entry))
+            pipe.hset(f"{self._PREFIX}:entries", entry_id, serialized.decode("utf-8"))
+            pipe.zadd(f"{self._PREFIX}:ts", {entry_id: ts})
+            for field, value in zip(("event", "instance", "remote_jid"), extract_index_fields(entry.get("payload"))):
+                if value is not None:
+                    index_key = f"{self._PREFIX}:idx:{field}:{value}"
+                    pipe.zadd(index_key, {entry_id: ts})
+                    pipe.expire(index_key, ttl)
+        await pipe.execute()
+
+    async def _prune(self):
+        redis = get_redis()
+        cutoff = time.time() - self._max_age_seconds
+        expired = await redis.zrangebyscore(f"{self._PREFIX}:ts", "-inf", cutoff)
+        total = await redis.zcard(f"{self._PREFIX}:ts")
+        excess = total - len(expired) - self._max_entries
+        if excess > 0:
+            expired += await redis.zrange(f"{self._PREFIX}:ts", len(expired), len(expired) + excess - 1)
+        if not expired:
+            return
+        pipe = redis.pipeline(transaction=False)
+        pipe.hdel(f"{self._PREFIX}:entries", *expired)
+        pipe.zrem(f"{self._PREFIX}:ts", *expired)
+        await pipe.execute()
+        # As entradas removidas ainda podem constar nos índices secundários; são
+        # ignoradas na leitura e desaparecem quando o índice expira.
+
+    async def query(self, limit=30, offset=0, event=None, instance=None,
+                    remote_jid=None, since=None, until=None):
+        redis = get_redis()
+        if remote_jid is not None:
+            index_key = f"{self._PREFIX}:idx:remote_jid:{remote_jid}"
+        elif instance is not None:
+            index_key = f"{self._PREFIX}:idx:instance:{instance}"
+        elif event is not None:
+            index_key = f"{self._PREFIX}:idx:event:{event}"
+        else:
+            index_key = f"{self._PREFIX}:ts"
+        max_score = until.timestamp() if until is not None else "+inf"
+        min_score = since.timestamp() if since is not None else "-inf"
+
+        results: List[Dict[str, Any]] = []
+        skipped = 0
+        start = 0
+        while len(results) < limit:
+            ids = await redis.zrevrangebyscore(index_key, max_score, min_score,
+                                               start=start, num=self._SCAN_CHUNK)
+            if not ids:
+                break
+            start += len(ids)
+            for raw in await redis.hmget(f"{self._PREFIX}:entries", ids):
+                if raw is None:
+                    continue
+                entry = json_codec.loads(raw)
+                entry_event, entry_instance, entry_jid = extract_index_fields(entry.get("payload"))
+                if (event is not None and entry_event != event) or \
+                        (instance is not None and entry_instance != instance) or \
+                        (remote_jid is not None and entry_jid != remote_jid):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def create_history_store() -> HistoryStore:
+    """Cria o backend de histórico definido em `settings.HISTORY_BACKEND`."""
+    if settings.HISTORY_BACKEND == "memory":
+        return MemoryHistoryStore(
+            max_bytes=settings.HISTORY_MEMORY_MAX_BYTES,
+            compression=settings.HISTORY_MEMORY_COMPRESSION,
+            compress_min_bytes=settings.HISTORY_MEMORY_COMPRESS_MIN_BYTES,
+        )
+    options = dict(
+        max_entries=settings.HISTORY_MAX_ENTRIES,
+        max_age_seconds=settings.HISTORY_MAX_AGE_SECONDS,
+        batch_size=settings.HISTORY_BATCH_SIZE,
+        flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    )
+    if settings.HISTORY_BACKEND == "redis":
+        return RedisHistoryStore(**options)
+    return SQLiteHistoryStore(path=settings.HISTORY_SQLITE_PATH, **options)
@@ -0,0 +1,193 @@
+"""
+Difusão (fan-out) de Eventos para os Clientes WebSocket do Inspetor.
+
+O endpoint `/inspect` apenas publica o evento no hub, sem esperar por nenhum
+socket: o JSON é serializado uma única vez e colocado na fila de saída de cada
+subscritor. Cada subscritor tem a sua própria tarefa de envio, por isso um
+separador de browser lento ou meio morto não atrasa a receção de webhooks.
+
+Os eventos passam por um backend de pub/sub (ver `src/infra/pubsub.py`), para
+que, com vários workers, cada inspetor receba o tráfego de todos eles.
+
+Cada cliente pode enviar uma subscrição com filtros e projeção de campos (ver
+`src/infra/subscriptions.py`); os eventos que não lhe interessam nunca chegam
+à sua fila. Cada projeção distinta é serializada uma única vez por evento.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Literal, Optional, Set, Tuple
+from fastapi import WebSocket
+from src.infra import json_codec
+from src.infra.pubsub import PubSub
+from src.infra.subscriptions import Subscription, extract_event_fields
+
+logger = logging.getLogger(__name__)
+
+SlowClientPolicy = Literal["drop_oldest", "disconnect"]
+
+
+class Subscriber:
+    """Um cliente WebSocket do inspetor com a sua fila de saída limitada."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.subscription: Optional[Subscription] = None
+        self.dropped = 0
+
+
+class InspectorHub:
+    """
+    Gere os subscritores do inspetor e distribui os eventos sem bloquear.
+
+    Quando a fila de um subscritor enche, aplica-se a política configurada:
+    - "drop_oldest": descarta a mensagem mais antiga da fila e mantém o cliente.
+    - "disconnect": fecha a conexão do cliente lento.
+    """
+
+    def __init__(self, queue_size: int, slow_client_policy: SlowClientPolicy, pubsub: PubSub):
+        self._queue_size = queue_size
+        self._policy = slow_client_policy
+        self._pubsub = pubsub
+        self._subscribers: Set[Subscriber] = set()
+
+    async def start(self):
+        """Liga o hub ao backend de pub/sub. Chamado no arranque da aplicação."""
+        await self._pubsub.start(self._fan_out)
+
+    def subscribe(self, websocket: WebSocket) -> Subscriber:
+        """Regista um WebSocket já aceite e arranca a sua tarefa de envio."""
+        subscriber = Subscriber(websocket, self._queue_size)
+        subscriber.task = asyncio.create_task(self._sender(subscriber))
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        """Remove o subscritor e termina a sua tarefa de envio (idempotente)."""
+        self._subscribers.discard(subscriber)
+        task = subscriber.task
+        if task is not None and task is not asyncio.current_task() and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def publish(self, entry: Dict[str, Any], raw_payload: Optional[bytes] = None):
+        """
+        Serializa o evento uma única vez e publica-o para todos os workers,
+        sem aguardar pelos envios. Com `raw_payload` (os bytes originais do
+        payload), a mensagem é montada sem voltar a codificar o JSON.
+        """
+        if self._pubsub.local and not self._subscribers:
+            return
+        if raw_payload is not None:
+            message = json_codec.entry_bytes(entry["timestamp"], raw_payload).decode("utf-8")
+        else:
+            message = self._encode(entry)
+        self._pubsub.publish(message, entry)
+
+    def handle_client_message(self, subscriber: Subscriber, text: str):
+        """
+        Processa uma mensagem enviada pelo cliente. Textos que não sejam um
+        objeto JSON com "action" (ex: keep-alives) são ignorados.
+        """
+        try:
+            message = json_codec.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict) or "action" not in message:
+            return
+        action = message["action"]
+        if action == "unsubscribe":
+            subscriber.subscription = None
+            self._reply(subscriber, {"type": "unsubscribed"})
+        elif action == "subscribe":
+            try:
+                subscriber.subscription = Subscription.from_message(message)
+            except ValueError as e:
+                self._reply(subscriber, {"type": "error", "detail": str(e)})
+                return
+            self._reply(subscriber, {"type": "subscribed", **subscriber.subscription.describe()})
+        else:
+            self._reply(subscriber, {"type": "error", "detail": f"Ação desconhecida: {action!r}"})
+
+    def _reply(self, subscriber: Subscriber, data: Dict[str, Any]):
+        self._offer(subscriber, self._encode(data))
+
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> str:
+        return json_codec.dumps_str(data)
+
+    def _fan_out(self, message: str, entry: Optional[Dict[str, Any]] = None):
+        """
+        Entrega uma mensagem recebida do pub/sub aos subscritores locais. O
+        JSON só é descodificado se algum cliente tiver filtros ativos.
+        """
+        fields = None
+        projections: Dict[Tuple[str, ...], str] = {}
+        for subscriber in list(self._subscribers):
+            subscription = subscriber.subscription
+            if subscription is None:
+                self._offer(subscriber, message)
+                continue
+            if entry is None:
+                entry = json_codec.loads(message)
+            if fields is None:
+                fields = extract_event_fields(entry)
+            if not subscription.matches(fields):
+                continue
+            if subscription.fields is None:
+                self._offer(subscriber, message)
+                continue
+            projected = projections.get(subscription.fields)
+            if projected is None:
+                projected = projections[subscription.fields] = self._encode(subscription.project(entry))
+            self._offer(subscriber, projected)
+
+    def _offer(self, subscriber: Subscriber, message: str):
+        try:
+            subscriber.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        subscriber.dropped += 1
+        if self._policy == "disconnect":
+            logger.warning("Cliente WebSocket do inspetor demasiado lento. A desconectar.")
+            self._subscribers.discard(subscriber)
+            if subscriber.task is not None:
+                subscriber.task.cancel()
+            return
+        # "drop_oldest": abre espaço descartando a mensagem mais antiga.
+        subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(message)
+
+    async def _sender(self, subscriber: Subscriber):
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                await subscriber.websocket.send_text(message)
+        except asyncio.CancelledError:
+            # Cancelado por desconexão normal ou pela política "disconnect".
+            await self._close_quietly(subscriber.websocket)
+            raise
+        except Exception as e:
+            logger.info(f"Falha ao enviar para cliente WebSocket do inspetor ({e}). A remover.")
+            self._subscribers.discard(subscriber)
+            await self._close_quietly(subscriber.websocket)
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def close(self):
+        """Termina todos os subscritores. Chamado no encerramento da aplicação."""
+        for subscriber in list(self._subscribers):
+            await self.unsubscribe(subscriber)
+        await self._pubsub.close()
+
+    @property
+    def connection_count(self) -> int:
+        """Número de clientes WebSocket ligados."""
+        return len(self._subscribers)
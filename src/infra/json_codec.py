@@ -0,0 +1,94 @@
+"""
+Codificação JSON Rápida e Reutilização dos Bytes Originais.
+
+Centraliza o (des)serializador JSON da aplicação, com backends opcionais:
+- "orjson" ou "msgspec", se estiverem instalados (muito mais rápidos que o
+  módulo `json` da biblioteca padrão, sobretudo em payloads grandes com media);
+- "json" (biblioteca padrão) como alternativa sempre disponível.
+
+Com `JSON_BACKEND=auto` (padrão) usa o primeiro disponível por essa ordem.
+
+O `/inspect` descodifica o corpo do pedido uma única vez e reutiliza os bytes
+originais, sem voltar a codificar, no histórico, na difusão para o inspetor e
+no encaminhamento para `/process` (ver `entry_bytes`).
+"""
+import json
+import logging
+from typing import Any, Callable, Tuple, Union
+from fastapi.responses import JSONResponse
+from src.infra.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _load_backend(name: str) -> Tuple[Callable[[Union[bytes, str]], Any], Callable[[Any], bytes]]:
+    if name == "orjson":
+        import orjson
+
+        return orjson.loads, orjson.dumps
+    if name == "msgspec":
+        import msgspec
+
+        decoder, encoder = msgspec.json.Decoder(), msgspec.json.Encoder()
+
+        def msgspec_loads(data: Union[bytes, str]) -> Any:
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                # Uniformiza com os outros backends: erros de sintaxe são ValueError.
+                raise ValueError(str(e)) from e
+
+        return msgspec_loads, encoder.encode
+
+    def json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    return json.loads, json_dumps
+
+
+def _select_backend() -> str:
+    if settings.JSON_BACKEND != "auto":
+        return settings.JSON_BACKEND
+    for name in ("orjson", "msgspec"):
+        try:
+            _load_backend(name)
+            return name
+        except ImportError:
+            continue
+    return "json"
+
+
+BACKEND = _select_backend()
+_loads, _dumps = _load_backend(BACKEND)
+logger.info(f"Codec JSON: {BACKEND}")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Descodifica JSON a partir de bytes ou texto. Levanta ValueError se for inválido."""
+    return _loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Codifica em JSON compacto (UTF-8, sem escapar caracteres não-ASCII)."""
+    return _dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    """Como `dumps`, mas retorna texto (ex: para `websocket.send_text`)."""
+    return _dumps(obj).decode("utf-8")
+
+
+def entry_bytes(timestamp: str, raw_payload: bytes) -> bytes:
+    """
+    Monta `{"timestamp": ..., "payload": ...}` a partir dos bytes originais do
+    payload, sem o voltar a codificar. `raw_payload` tem de ser JSON válido
+    (já foi descodificado com sucesso pelo endpoint).
+    """
+    return b'{"timestamp":' + _dumps(timestamp) + b',"payload":' + raw_payload + b"}"
+
+
+class FastJSONResponse(JSONResponse):
+    """Resposta JSON que usa o codec configurado em vez do `json` da biblioteca padrão."""
+
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
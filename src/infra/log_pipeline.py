@@ -0,0 +1,227 @@
+"""
+Logging Estruturado e Não-Bloqueante.
+
+Os handlers do `logging` escrevem no terminal de forma síncrona: com muito
+tráfego, formatar e escrever os registos no event loop passa a ser uma fatia
+visível da latência. Aqui, cada chamada a `logger.*` apenas:
+
+1. descarta, por amostragem, os registos de eventos de volume elevado;
+2. anexa os ids de correlação do contexto atual (instância, mensagem...);
+3. coloca o registo numa fila em memória.
+
+Uma thread em segundo plano (`QueueListener`) formata-os (JSON de uma linha,
+ou texto com `LOG_FORMAT=text`) e escreve-os. Se a fila encher, os registos
+abaixo de ERROR são descartados e contados, em vez de bloquear o event loop.
+
+Correlação: o código do pipeline associa ids ao contexto assíncrono, e todos
+os registos emitidos dentro dele (incluindo os dos handlers) levam-nos:
+
+    with log_context(instance=payload.instance, message_id=payload.data.key.id):
+        ...
+
+Amostragem: um registo marcado com `extra={"log_event": "payload_ignored"}`
+é mantido com a probabilidade configurada em `LOG_SAMPLE_RATES`. Avisos,
+erros e execuções de comandos (`log_event="command"`) nunca são descartados.
+
+Prefira `logger.info("... %s", valor)` a f-strings nos caminhos quentes: a
+mensagem só é montada na thread de escrita, e nem isso se o registo for
+filtrado.
+"""
+import contextlib
+import contextvars
+import datetime
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from collections import Counter
+from typing import Any, Dict, Iterator, Mapping, Optional
+from src.infra.config import settings
+from src.infra.json_codec import dumps_str
+
+# Eventos que nunca são amostrados, mesmo que apareçam em LOG_SAMPLE_RATES.
+NEVER_SAMPLED = frozenset({"command"})
+
+_context: contextvars.ContextVar[Mapping[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+# Atributos de todos os LogRecord; o resto são campos de `extra`.
+_RESERVED = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message", "asctime", "context", "color_message",
+}
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+@contextlib.contextmanager
+def log_context(inherit: bool = True, **fields: Any) -> Iterator[None]:
+    """
+    Acrescenta ids de correlação aos registos emitidos dentro do bloco (e das
+    tarefas criadas nele). Com `inherit=False`, descarta os ids herdados (ex:
+    numa tarefa de longa duração criada a partir de um pedido).
+    """
+    token = _context.set({**_context.get(), **fields} if inherit else fields)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class _ContextSamplingFilter(logging.Filter):
+    """Corre no chamador: amostragem e captura do contexto (as contextvars não passam para a thread)."""
+
+    def __init__(self, sample_rates: Mapping[str, float]):
+        super().__init__()
+        self._rates = {event: rate for event, rate in sample_rates.items() if event not in NEVER_SAMPLED}
+        self.sampled_out: Counter = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "log_event", None)
+        if event is not None and record.levelno < logging.WARNING:
+            rate = self._rates.get(event)
+            if rate is not None and random.random() >= rate:
+                self.sampled_out[event] += 1
+                return False
+        record.context = _context.get()
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    `QueueHandler` que não formata no chamador e nunca bloqueia por fila cheia
+    (exceto para ERROR e acima, que esperam pela sua vez).
+
+    O `prepare` original monta a mensagem e o traceback antes de enfileirar,
+    para poder enviar o registo para outro processo; como a fila é local, o
+    registo segue tal como está e a formatação fica para a thread de escrita.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno >= logging.ERROR:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registo: instante, nível, logger, mensagem, contexto e campos de `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", None) or {})
+        for name, value in record.__dict__.items():
+            if name not in _RESERVED:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        try:
+            return dumps_str(entry)
+        except TypeError:
+            # Um campo de `extra` ou do contexto que não é serializável: usa a sua representação.
+            return dumps_str({k: v if isinstance(v, _JSON_SCALARS) else repr(v) for k, v in entry.items()})
+
+
+class _TextFormatter(logging.Formatter):
+    """Formato de texto tradicional, com o contexto no fim da linha."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            line += " [" + " ".join(f"{k}={v}" for k, v in context.items()) + "]"
+        return line
+
+
+def _stderr_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(_TextFormatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    return handler
+
+
+class LogPipeline:
+    """Fila, filtro e thread de escrita instalados no logger raiz."""
+
+    def __init__(self):
+        self._handler: Optional[_NonBlockingQueueHandler] = None
+        self._filter: Optional[_ContextSamplingFilter] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._output: Optional[logging.Handler] = None
+
+    def configure(self):
+        """Substitui os handlers do logger raiz e arranca a thread de escrita."""
+        if self._listener is not None:
+            return
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        output = self._output = _stderr_handler()
+        self._filter = _ContextSamplingFilter(settings.LOG_SAMPLE_RATES)
+        self._handler = _NonBlockingQueueHandler(log_queue)
+        self._handler.addFilter(self._filter)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self._handler)
+        root.setLevel(settings.LOG_LEVEL.upper())
+        self._listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        self._listener.start()
+
+    def configure_worker(self):
+        """
+        Configuração para os processos do pool de processos: escrita direta,
+        sem fila nem thread (o trabalho nesses processos já é bloqueante), no
+        mesmo formato e com a mesma amostragem do processo principal.
+        """
+        output = _stderr_handler()
+        output.addFilter(_ContextSamplingFilter(settings.LOG_SAMPLE_RATES))
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(output)
+        root.setLevel(settings.LOG_LEVEL.upper())
+
+    def shutdown(self):
+        """
+        Escreve os registos pendentes e para a thread (chamado no fim do
+        lifespan). Os registos seguintes são escritos diretamente.
+        """
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+        root = logging.getLogger()
+        root.removeHandler(self._handler)
+        # O filtro continua a anexar o contexto e a amostrar.
+        self._output.addFilter(self._filter)
+        root.addHandler(self._output)
+
+    def stats(self) -> Dict[str, Any]:
+        if self._handler is None:
+            return {"configured": False}
+        return {
+            "configured": True,
+            "queued": self._handler.queue.qsize(),
+            "dropped_queue_full": self._handler.dropped,
+            "sampled_out": dict(self._filter.sampled_out),
+        }
+
+
+# Instância única, configurada no arranque do main.py.
+log_pipeline = LogPipeline()
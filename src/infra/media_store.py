@@ -0,0 +1,164 @@
+"""
+Armazenamento de Media Endereçado por Conteúdo.
+
+Cada ficheiro é guardado em `<raiz>/<aa>/<sha256>`, em que o nome é o SHA-256
+do conteúdo. O mesmo ficheiro recebido várias vezes (reencaminhamentos,
+stickers repetidos) ocupa espaço uma única vez e nunca volta a ser
+descarregado.
+
+A escrita é feita em streaming: os blocos vão sendo acumulados num buffer
+pequeno e gravados num ficheiro temporário numa thread, com o hash calculado
+pelo caminho. No fim, o ficheiro é movido atomicamente para o seu nome
+definitivo. O conteúdo nunca está inteiro em memória.
+
+O espaço total é limitado por `max_bytes`; acima disso, os ficheiros menos
+recentemente usados são removidos.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MediaTooLargeError(Exception):
+    """O conteúdo excedeu o tamanho máximo permitido por ficheiro."""
+
+
+class MediaStore:
+    """
+    Diretório de media endereçado por SHA-256.
+
+    Args:
+        root: Diretório raiz.
+        max_bytes: Espaço total máximo ocupado pelos ficheiros.
+        max_file_bytes: Tamanho máximo de um único ficheiro.
+        buffer_size: Bytes acumulados antes de cada escrita em disco.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_file_bytes: int, buffer_size: int = 1024 * 1024):
+        self._root = Path(root)
+        self._tmp = self._root / "tmp"
+        self._max_bytes = max_bytes
+        self._max_file_bytes = max_file_bytes
+        self._buffer_size = buffer_size
+        self._total_bytes: Optional[int] = None
+        self._prune_lock = asyncio.Lock()
+
+    def path_for(self, sha256_hex: str) -> Path:
+        return self._root / sha256_hex[:2] / sha256_hex
+
+    def lookup(self, sha256_hex: str) -> Optional[Path]:
+        """Caminho do ficheiro se já estiver guardado (e marca-o como usado), ou None."""
+        path = self.path_for(sha256_hex)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    async def write_stream(self, chunks: AsyncIterable[bytes]) -> Tuple[str, Path, int]:
+        """
+        Grava um fluxo de blocos e retorna `(sha256_hex, caminho, tamanho)`.
+        Levanta `MediaTooLargeError` se o fluxo exceder `max_file_bytes`.
+        """
+        await asyncio.to_thread(self._tmp.mkdir, parents=True, exist_ok=True)
+        handle = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=self._tmp, delete=False)
+        digest = hashlib.sha256()
+        size = 0
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self._max_file_bytes:
+                    raise MediaTooLargeError(f"Media excede {self._max_file_bytes} bytes.")
+                buffer += chunk
+                if len(buffer) >= self._buffer_size:
+                    await asyncio.to_thread(self._flush, handle, digest, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(self._flush, handle, digest, bytes(buffer))
+            await asyncio.to_thread(handle.close)
+            sha256_hex = digest.hexdigest()
+            path, created = await asyncio.to_thread(self._commit, Path(handle.name), sha256_hex)
+        except BaseException:
+            await asyncio.to_thread(self._discard, handle)
+            raise
+        if created:
+            await self._account(size)
+        return sha256_hex, path, size
+
+    async def write_bytes(self, data: bytes) -> Tuple[str, Path, int]:
+        """Grava um conteúdo já em memória (ex: base64 incluído no webhook)."""
+        async def single_chunk():
+            yield data
+        return await self.write_stream(single_chunk())
+
+    # --- Operações síncronas (executadas numa thread) ---
+
+    @staticmethod
+    def _flush(handle, digest, data: bytes):
+        digest.update(data)
+        handle.write(data)
+
+    def _commit(self, tmp_path: Path, sha256_hex: str) -> Tuple[Path, bool]:
+        path = self.path_for(sha256_hex)
+        if path.exists():
+            # Já existia (outro download do mesmo conteúdo): descarta a cópia nova.
+            tmp_path.unlink()
+            os.utime(path)
+            return path, False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, path)
+        return path, True
+
+    @staticmethod
+    def _discard(handle):
+        try:
+            handle.close()
+            os.unlink(handle.name)
+        except OSError:
+            pass
+
+    # --- Limite de espaço ---
+
+    async def _account(self, size: int):
+        async with self._prune_lock:
+            if self._total_bytes is None:
+                self._total_bytes = await asyncio.to_thread(self._scan_total)
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self._max_bytes:
+                self._total_bytes = await asyncio.to_thread(self._prune)
+
+    def _files(self):
+        for path in self._root.glob("??/*"):
+            if path.is_file():
+                yield path
+
+    def _scan_total(self) -> int:
+        return sum(path.stat().st_size for path in self._files())
+
+    def _prune(self) -> int:
+        """Remove os ficheiros menos recentemente usados até caber em 90% do limite."""
+        files = sorted(((p.stat().st_mtime, p.stat().st_size, p) for p in self._files()))
+        total = sum(size for _, size, _ in files)
+        target = self._max_bytes * 0.9
+        removed = 0
+        started = time.monotonic()
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        logger.info(f"Armazenamento de media: {removed} ficheiros removidos em {time.monotonic() - started:.2f}s.")
+        return total
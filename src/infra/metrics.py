@@ -0,0 +1,206 @@
+"""
+Métricas no Formato Prometheus.
+
+Subsistema de métricas leve e sem dependências externas, pensado para ficar
+sempre ligado no caminho crítico:
+
+- Cada métrica guarda os valores num dicionário indexado pelo tuplo de labels.
+  Como tudo corre na thread do event loop, não há locks: registar um valor é
+  um lookup num dicionário e uma soma.
+- Nada é formatado no momento do registo; o texto só é gerado quando o
+  endpoint `/metrics` é consultado.
+
+Uso típico:
+
+    STAGE_SECONDS = metrics.histogram("webhook_stage_seconds", "Latência por etapa.", ["stage"])
+    start = time.perf_counter()
+    ...
+    STAGE_SECONDS.observe(time.perf_counter() - start, "validate")
+"""
+import abc
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Limites (em segundos) adequados a etapas que vão de microssegundos a segundos.
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Proteção contra explosão de cardinalidade (ex: nomes de eventos arbitrários).
+MAX_SERIES_PER_METRIC = 500
+OVERFLOW_LABEL = "other"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(abc.ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Sequence[str], series: dict) -> LabelValues:
+        key = tuple(labels)
+        if key not in series and len(series) >= MAX_SERIES_PER_METRIC:
+            return (OVERFLOW_LABEL,) * len(self.labelnames)
+        return key
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    """Contador monotónico."""
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels, self._values)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Valor instantâneo, lido de uma função no momento da consulta."""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, func: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._func = func
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name} {_format_value(float(self._func()))}"]
+
+
+class Histogram(_Metric):
+    """Histograma com limites fixos; guarda contagens por intervalo, soma e total."""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # labels -> [contagem por intervalo..., +Inf, soma]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels, self._series)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self._bounds) + 2)
+        series[bisect.bisect_left(self._bounds, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self._series.items():
+            cumulative = 0.0
+            for bound, count in zip(self._bounds, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {_format_value(cumulative)}")
+            cumulative += series[len(self._bounds)]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {_format_value(cumulative)}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{plain} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Conjunto de métricas da aplicação, exportado em `/metrics`."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def gauge(self, name: str, documentation: str, func: Callable[[], float]) -> Gauge:
+        """Regista (ou substitui) um gauge calculado por `func` no momento da consulta."""
+        gauge = Gauge(name, documentation, func)
+        self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registo único da aplicação.
+metrics = MetricsRegistry()
+
+# --- Métricas partilhadas do pipeline de webhooks ---
+WEBHOOK_STAGE_SECONDS = metrics.histogram(
+    "webhook_stage_seconds",
+    "Latência de cada etapa do pipeline de webhooks.",
+    ["stage"],
+)
+WEBHOOK_EVENTS_TOTAL = metrics.counter(
+    "webhook_events_total",
+    "Webhooks recebidos por tipo de evento e resultado.",
+    ["event", "outcome"],
+)
+COMMAND_SECONDS = metrics.histogram(
+    "command_handler_seconds",
+    "Tempo de execução de cada handler de comando, incluindo a espera no pool (outcome: ok, error, timeout, rejected).",
+    ["command", "outcome"],
+)
+COMMAND_THROTTLED_TOTAL = metrics.counter(
+    "command_throttled_total",
+    "Invocações de comandos descartadas por excederem o limite (scope: user ou chat).",
+    ["command", "scope"],
+)
+EVOLUTION_REQUEST_SECONDS = metrics.histogram(
+    "evolution_request_seconds",
+    "Latência das chamadas de saída à Evolution API.",
+    ["operation", "outcome"],
+)
@@ -0,0 +1,300 @@
+"""
+Profiling a Pedido, sobre o Tráfego Real.
+
+Quando a latência piora em produção, um operador liga o profiler sem
+reiniciar (`POST /v1/admin/profiling/start`) durante um período limitado:
+
+- uma fração dos webhooks (`sample_rate`) é perfilada: enquanto o pedido no
+  `/inspect` ou o seu despacho estão em curso, uma thread amostra a pilha do
+  event loop a cada `interval_ms` (um profiler estatístico, sem instrumentar
+  cada chamada). Um pedido com o cabeçalho `X-Profile: <ADMIN_API_KEY>` é
+  sempre perfilado, mesmo com o profiler desligado;
+- o atraso do event loop (quanto um `sleep` acorda mais tarde do que devia)
+  é exportado em `event_loop_lag_seconds`;
+- qualquer bloqueio do event loop acima de `slow_callback_ms` gera um
+  relatório com a duração e as pilhas que o causaram.
+
+Os perfis recentes ficam em memória e podem ser descarregados no formato
+"collapsed stacks" (`função;função;... contagem`), lido diretamente pelo
+`flamegraph.pl`, speedscope ou inferno.
+
+Com asyncio, vários pedidos partilham o mesmo thread: as amostras de um perfil
+incluem o que mais corria no event loop durante esse pedido. Em sobrecarga,
+isso é precisamente o que interessa ver.
+
+Desligado, o custo por pedido é uma verificação de um booleano: não há
+thread de amostragem nem tarefa de medição do atraso.
+"""
+import asyncio
+import contextlib
+import datetime
+import itertools
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, ContextManager, Deque, Dict, Iterable, List, Optional
+from src.infra.config import settings
+from src.infra.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG_SECONDS = metrics.histogram(
+    "event_loop_lag_seconds",
+    "Atraso do event loop medido enquanto o profiler está ligado.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+_MAX_DEPTH = 128
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """Pilha da raiz até à folha, no formato "a;b;c"."""
+    labels: List[str] = []
+    while frame is not None and len(labels) < _MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def format_collapsed(stacks: Dict[str, int]) -> str:
+    """Texto "collapsed stacks": uma linha "pilha contagem" por pilha."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+class Profile:
+    """Amostras de pilha recolhidas durante um pedido."""
+
+    def __init__(self, profile_id: int, label: str):
+        self.id = profile_id
+        self.label = label
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.stacks: Counter = Counter()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "samples": sum(self.stacks.values()),
+        }
+
+
+class _SlowCallback:
+    """Um bloqueio do event loop em curso ou terminado."""
+
+    def __init__(self, started: float):
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.started = started
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 1),
+            "stacks": [{"stack": stack, "samples": count} for stack, count in self.stacks.most_common(5)],
+        }
+
+
+class Profiler:
+    """Sessão de profiling: amostragem de pedidos, atraso do event loop e bloqueios lentos."""
+
+    def __init__(self, max_profiles: int, max_slow_reports: int):
+        self.enabled = False
+        self._sample_rate = 0.0
+        self._interval = 0.005
+        self._slow_threshold = 0.1
+        self._until = 0.0
+        self._ids = itertools.count(1)
+        self._active: Dict[int, Profile] = {}
+        self._profiles: Deque[Profile] = deque(maxlen=max_profiles)
+        self._slow_reports: Deque[_SlowCallback] = deque(maxlen=max_slow_reports)
+        # Estado partilhado com a thread de amostragem.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    # --- Controlo (chamado no event loop) ---
+
+    def start(self, sample_rate: float, duration: float, interval_ms: float, slow_callback_ms: float):
+        """Liga (ou reconfigura) a sessão durante `duration` segundos."""
+        self._sample_rate = min(1.0, max(0.0, sample_rate))
+        self._interval = max(0.001, interval_ms / 1000)
+        self._slow_threshold = max(self._interval, slow_callback_ms / 1000)
+        self._until = time.monotonic() + duration
+        self.enabled = True
+        self._ensure_running()
+        logger.warning(
+            "Profiler ligado durante %ss (amostragem de %.0f%% dos webhooks, intervalo de %sms).",
+            duration, self._sample_rate * 100, interval_ms,
+        )
+
+    def stop(self):
+        """Desliga a sessão. Os perfis e relatórios recolhidos mantêm-se."""
+        was_enabled, self.enabled = self.enabled, False
+        if not self._active:
+            self._stop_running()
+        if was_enabled:
+            logger.warning("Profiler desligado.")
+
+    def authorized(self, header_value: Optional[str]) -> bool:
+        """True se o cabeçalho `X-Profile` trouxer a chave de administração."""
+        return (
+            header_value is not None
+            and bool(settings.ADMIN_API_KEY)
+            and secrets.compare_digest(header_value, settings.ADMIN_API_KEY)
+        )
+
+    def profile(self, kind: str, detail: str = "", force: bool = False) -> ContextManager[Any]:
+        """
+        Contexto que perfila o bloco se o pedido for amostrado (ou `force`).
+        Desligado, retorna um contexto vazio partilhado (nem o rótulo é montado).
+        """
+        if not self.enabled and not force:
+            return _NULL_CONTEXT
+        if self.enabled and time.monotonic() > self._until:
+            self.stop()
+            if not force:
+                return _NULL_CONTEXT
+        if not force and random.random() >= self._sample_rate:
+            return _NULL_CONTEXT
+        return self._profiled(f"{kind} {detail}" if detail else kind)
+
+    @contextlib.contextmanager
+    def _profiled(self, label: str):
+        self._ensure_running()
+        profile = Profile(next(self._ids), label)
+        self._active[profile.id] = profile
+        try:
+            yield profile
+        finally:
+            profile.finish()
+            self._active.pop(profile.id, None)
+            self._profiles.append(profile)
+            if not self.enabled and not self._active:
+                # Pedido forçado por cabeçalho com a sessão desligada.
+                self._stop_running()
+
+    def _ensure_running(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._heartbeat_task = self._loop.create_task(self._beat(), name="profiler-heartbeat")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def _stop_running(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _beat(self):
+        # Acorda a intervalos curtos: o atraso de cada despertar é o atraso do
+        # event loop, e o instante do último despertar é lido pela thread.
+        period = min(0.05, self._slow_threshold / 4)
+        while True:
+            expected = time.monotonic() + period
+            await asyncio.sleep(period)
+            now = time.monotonic()
+            self._heartbeat = now
+            EVENT_LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+
+    # --- Thread de amostragem ---
+
+    def _sample_loop(self):
+        blocked: Optional[_SlowCallback] = None
+        while not self._stop_event.wait(self._interval):
+            now = time.monotonic()
+            if self.enabled and now > self._until and self._loop is not None:
+                self._loop.call_soon_threadsafe(self.stop)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = collapse_stack(frame) if frame is not None else None
+            del frame
+            if stack is None:
+                continue
+            for profile in list(self._active.values()):
+                profile.stacks[stack] += 1
+            # Bloqueio: o heartbeat não acorda há mais do que o limite.
+            since_beat = now - self._heartbeat
+            if since_beat > self._slow_threshold:
+                if blocked is None:
+                    blocked = _SlowCallback(self._heartbeat)
+                blocked.duration = since_beat
+                blocked.stacks[stack] += 1
+            elif blocked is not None:
+                self._report_slow(blocked)
+                blocked = None
+        if blocked is not None:
+            self._report_slow(blocked)
+
+    def _report_slow(self, report: _SlowCallback):
+        self._slow_reports.append(report)
+        top = report.stacks.most_common(1)[0][0].rsplit(";", 1)[-1] if report.stacks else "?"
+        logger.warning("Event loop bloqueado durante %.0fms (em %s).", report.duration * 1000, top,
+                       extra={"log_event": "slow_callback"})
+
+    # --- Consulta ---
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        for profile in self._profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def collapsed(self, profile_ids: Optional[Iterable[int]] = None) -> str:
+        """Perfis indicados (ou todos os recentes) somados, em "collapsed stacks"."""
+        wanted = set(profile_ids) if profile_ids is not None else None
+        total: Counter = Counter()
+        for profile in list(self._profiles):
+            if wanted is None or profile.id in wanted:
+                total.update(dict(profile.stacks))
+        return format_collapsed(total)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self._sample_rate,
+            "interval_ms": self._interval * 1000,
+            "slow_callback_ms": self._slow_threshold * 1000,
+            "remaining_seconds": max(0.0, round(self._until - time.monotonic(), 1)) if self.enabled else 0.0,
+            "active": len(self._active),
+            "profiles": [profile.describe() for profile in reversed(self._profiles)],
+            "slow_callbacks": [report.describe() for report in reversed(self._slow_reports)],
+        }
+
+
+# Instância única, controlada pelos endpoints de administração.
+profiler = Profiler(
+    max_profiles=settings.PROFILING_MAX_PROFILES,
+    max_slow_reports=settings.PROFILING_MAX_SLOW_REPORTS,
+)
@@ -0,0 +1,137 @@
+"""
+Publicação/Subscrição de Eventos do Inspetor entre Workers.
+
+Com vários workers uvicorn (ou vários contêineres), cada webhook é recebido
+por apenas um deles. Para que todos os clientes do inspetor vejam o fluxo
+completo, os eventos passam por um backend de pub/sub:
+
+- "local" (padrão): entrega direta dentro do próprio processo.
+- "redis": `PUBLISH`/`SUBSCRIBE` num canal do Redis; cada worker recebe os
+  eventos de todos os outros (e os seus próprios) pelo mesmo caminho.
+
+As mensagens são strings JSON já serializadas, para que nenhum worker volte
+a codificar o mesmo evento.
+"""
+import abc
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional
+from src.infra.config import settings
+from src.infra.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Recebe a mensagem serializada e, quando disponível no mesmo processo, a
+# entrada original (evita voltar a descodificar o JSON).
+MessageCallback = Callable[[str, Optional[Dict[str, Any]]], None]
+
+
+class PubSub(abc.ABC):
+    """Interface comum dos backends de pub/sub."""
+
+    # True se as mensagens só chegam a subscritores deste processo.
+    local = False
+
+    @abc.abstractmethod
+    async def start(self, callback: MessageCallback):
+        """Começa a entregar as mensagens publicadas (por qualquer worker) a `callback`."""
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    def publish(self, message: str, entry: Optional[Dict[str, Any]] = None):
+        """Publica uma mensagem sem bloquear o chamador."""
+
+
+class LocalPubSub(PubSub):
+    """Entrega em processo: o comportamento de um único worker."""
+
+    local = True
+
+    def __init__(self):
+        self._callback: Optional[MessageCallback] = None
+
+    async def start(self, callback: MessageCallback):
+        self._callback = callback
+
+    def publish(self, message: str, entry: Optional[Dict[str, Any]] = None):
+        if self._callback is not None:
+            self._callback(message, entry)
+
+
+class RedisPubSub(PubSub):
+    """
+    Pub/sub sobre um canal do Redis.
+
+    A publicação é feita por uma tarefa própria a partir de uma fila limitada,
+    por isso o caminho do pedido nunca espera pela rede. A subscrição volta a
+    ligar-se automaticamente se a conexão com o Redis cair.
+    """
+
+    _RECONNECT_DELAY_SECONDS = 1.0
+
+    def __init__(self, channel: str, queue_maxsize: int = 10000):
+        self._channel = channel
+        self._queue_maxsize = queue_maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self.dropped = 0
+
+    async def start(self, callback: MessageCallback):
+        self._queue = asyncio.Queue(maxsize=self._queue_maxsize)
+        self._tasks = [
+            asyncio.create_task(self._publisher(), name="pubsub-publisher"),
+            asyncio.create_task(self._listener(callback), name="pubsub-listener"),
+        ]
+        logger.info(f"Pub/sub do inspetor no canal Redis '{self._channel}'.")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def publish(self, message: str, entry: Optional[Dict[str, Any]] = None):
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _publisher(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await get_redis().publish(self._channel, message)
+            except Exception as e:
+                self.dropped += 1
+                logger.warning(f"Falha ao publicar evento do inspetor no Redis: {e}")
+
+    async def _listener(self, callback: MessageCallback):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        callback(message["data"], None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Subscrição Redis do inspetor interrompida ({e}). A religar.")
+                await asyncio.sleep(self._RECONNECT_DELAY_SECONDS)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def create_pubsub() -> PubSub:
+    """Cria o backend definido em `settings.PUBSUB_BACKEND`."""
+    if settings.PUBSUB_BACKEND == "redis":
+        return RedisPubSub(channel=settings.PUBSUB_CHANNEL)
+    return LocalPubSub()
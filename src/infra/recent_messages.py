@@ -0,0 +1,260 @@
+"""
+Índice de Mensagens Recentes por Chat.
+
+Responder, citar ou apagar uma mensagem anterior exige a sua `key` e o seu
+conteúdo. Em vez de os procurar no `contextInfo` ou de voltar a pedir à
+Evolution API, o `/inspect` alimenta este índice com as mensagens que vão
+chegando (`messages.upsert` e `send.message`), e os handlers consultam-no:
+
+    original = recent_messages.quoted(payload)          # mensagem citada
+    recent_messages.get(instance, chat, message_id)     # por id
+    recent_messages.by_participant(instance, chat, jid) # de um participante
+    recent_messages.last(instance, chat, 10)            # últimas N do chat
+
+Cada entrada é compacta (key, participante, instante, tipo e um excerto do
+texto) e o índice é limitado por chat (`max_per_chat`), por idade
+(`max_age_seconds`) e pelo número de chats (os menos recentemente ativos são
+descartados primeiro). Só os chats com rota são indexados.
+
+O índice é local ao processo que recebe os webhooks: com `DISPATCH_MODE=http`,
+os handlers do serviço de processamento não o veem.
+"""
+import logging
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Container, Dict, List, Optional, Tuple
+from src.commands.prefilter import extract_text
+from src.infra.config import settings
+from src.infra.routing import routing_table
+from src.models.evolution import MEDIA_KINDS, WebhookPayload
+
+logger = logging.getLogger(__name__)
+
+ChatKey = Tuple[str, str]
+
+_INDEXED_EVENTS = frozenset({"messages.upsert", "send.message"})
+_DELETE_EVENTS = frozenset({"messages.delete"})
+_MEDIA_FIELDS = tuple((f"{kind}Message", kind) for kind in MEDIA_KINDS)
+
+
+class RecentMessage:
+    """Uma mensagem indexada."""
+
+    __slots__ = ("id", "remote_jid", "participant", "from_me", "timestamp", "kind", "snippet")
+
+    def __init__(self, id: str, remote_jid: str, participant: Optional[str], from_me: bool,
+                 timestamp: int, kind: str, snippet: Optional[str]):
+        self.id = id
+        self.remote_jid = remote_jid
+        self.participant = participant
+        self.from_me = from_me
+        self.timestamp = timestamp
+        self.kind = kind
+        self.snippet = snippet
+
+    @property
+    def sender(self) -> str:
+        """Autor da mensagem: o participante num grupo, o próprio chat numa conversa privada."""
+        return self.participant or self.remote_jid
+
+    def key(self) -> Dict[str, Any]:
+        """A `key` da mensagem no formato da Evolution API (ex: para apagar)."""
+        key = {"remoteJid": self.remote_jid, "id": self.id, "fromMe": self.from_me}
+        if self.participant:
+            key["participant"] = self.participant
+        return key
+
+    def quoted(self) -> Dict[str, Any]:
+        """Objeto `quoted_message` para `outbound.send_text` (responder a esta mensagem)."""
+        return {"key": self.key(), "message": {"conversation": self.snippet or ""}}
+
+    def describe(self) -> Dict[str, Any]:
+        return {**self.key(), "timestamp": self.timestamp, "kind": self.kind, "snippet": self.snippet}
+
+
+def _message_kind(message: Any) -> str:
+    if isinstance(message, dict):
+        for field, kind in _MEDIA_FIELDS:
+            if field in message:
+                return kind
+    return "text"
+
+
+class RecentMessageIndex:
+    """
+    Mensagens recentes por `(instance, remoteJid)`, indexadas por id.
+
+    Args:
+        max_per_chat: Mensagens guardadas por chat; as mais antigas saem primeiro.
+        max_age_seconds: Idade máxima (pelo `messageTimestamp`) de uma mensagem.
+        max_chats: Chats guardados; os menos recentemente ativos saem primeiro.
+        snippet_chars: Caracteres do texto guardados por mensagem.
+        remote_jids: Chats indexados (qualquer contentor com `in`, ex: a tabela
+                     de rotas). None indexa todos.
+    """
+
+    def __init__(self, max_per_chat: int, max_age_seconds: float, max_chats: int, snippet_chars: int,
+                 remote_jids: Optional[Container[str]] = None):
+        self._max_per_chat = max(1, max_per_chat)
+        self._max_age = max_age_seconds
+        self._max_chats = max(1, max_chats)
+        self._snippet_chars = snippet_chars
+        self._remote_jids = remote_jids
+        # chat -> (id -> mensagem), ambos por ordem de chegada (a mais recente no fim).
+        self._chats: "OrderedDict[ChatKey, OrderedDict[str, RecentMessage]]" = OrderedDict()
+        self._size = 0
+        # Contadores
+        self._indexed = 0
+        self._evicted = 0
+        self._hits = 0
+        self._misses = 0
+
+    # --- Alimentação (a partir do payload bruto do /inspect) ---
+
+    def observe(self, event: str, payload: Any):
+        """Indexa ou remove a mensagem de um payload bruto, conforme o evento normalizado."""
+        if event in _INDEXED_EVENTS:
+            self._record(payload)
+        elif event in _DELETE_EVENTS:
+            self._forget(payload)
+
+    def _record(self, payload: Dict[str, Any]):
+        data = payload.get("data")
+        key = data.get("key") if isinstance(data, dict) else None
+        if not isinstance(key, dict):
+            return
+        message_id, remote_jid = key.get("id"), key.get("remoteJid")
+        if not isinstance(message_id, str) or not isinstance(remote_jid, str):
+            return
+        if self._remote_jids is not None and remote_jid not in self._remote_jids:
+            return
+        timestamp = data.get("messageTimestamp")
+        timestamp = int(timestamp) if isinstance(timestamp, (int, float)) else int(time.time())
+        if timestamp < time.time() - self._max_age:
+            # Ex: sincronização de histórico ao ligar a instância.
+            return
+        message = data.get("message")
+        text = extract_text(message)
+        participant = key.get("participant")
+        # Os JIDs repetem-se em todas as mensagens do chat: partilham a mesma string.
+        entry = RecentMessage(
+            id=message_id,
+            remote_jid=sys.intern(remote_jid),
+            participant=sys.intern(participant) if isinstance(participant, str) and participant else None,
+            from_me=bool(key.get("fromMe")),
+            timestamp=timestamp,
+            kind=_message_kind(message),
+            snippet=text[:self._snippet_chars] if text else None,
+        )
+        chat_key = (sys.intern(str(payload.get("instance"))), entry.remote_jid)
+        chat = self._chats.get(chat_key)
+        if chat is None:
+            chat = self._chats[chat_key] = OrderedDict()
+        else:
+            self._chats.move_to_end(chat_key)
+        if message_id not in chat:
+            self._size += 1
+        chat[message_id] = entry
+        self._indexed += 1
+        self._trim(chat_key, chat)
+        while len(self._chats) > self._max_chats:
+            _, dropped = self._chats.popitem(last=False)
+            self._size -= len(dropped)
+            self._evicted += len(dropped)
+
+    def _forget(self, payload: Dict[str, Any]):
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            return
+        # Consoante a versão da Evolution API, a key vem em `data.key` ou no próprio `data`.
+        key = data.get("key") if isinstance(data.get("key"), dict) else data
+        chat = self._chats.get((str(payload.get("instance")), key.get("remoteJid")))
+        if chat is not None and chat.pop(key.get("id"), None) is not None:
+            self._size -= 1
+
+    def _trim(self, chat_key: ChatKey, chat: "OrderedDict[str, RecentMessage]"):
+        """Remove do início do chat o excesso e as mensagens mais velhas que `max_age_seconds`."""
+        cutoff = time.time() - self._max_age
+        while chat:
+            oldest = next(iter(chat.values()))
+            if len(chat) <= self._max_per_chat and oldest.timestamp >= cutoff:
+                break
+            chat.popitem(last=False)
+            self._size -= 1
+            self._evicted += 1
+        if not chat:
+            del self._chats[chat_key]
+
+    # --- Consultas (handlers) ---
+
+    def _chat(self, instance: str, remote_jid: str) -> Optional["OrderedDict[str, RecentMessage]"]:
+        chat_key = (instance, remote_jid)
+        chat = self._chats.get(chat_key)
+        if chat is not None:
+            self._trim(chat_key, chat)
+            chat = self._chats.get(chat_key)
+        return chat
+
+    def get(self, instance: str, remote_jid: str, message_id: str) -> Optional[RecentMessage]:
+        """A mensagem com o id dado, ou None se não estiver (ou já não estiver) no índice."""
+        chat = self._chat(instance, remote_jid)
+        entry = chat.get(message_id) if chat is not None else None
+        if entry is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return entry
+
+    def quoted(self, payload: WebhookPayload) -> Optional[RecentMessage]:
+        """A mensagem citada pela mensagem do payload (`contextInfo.stanzaId`), se estiver no índice."""
+        content = payload.data.message
+        extended = content.extendedTextMessage if content is not None else None
+        context = extended.get("contextInfo") if isinstance(extended, dict) else None
+        stanza_id = context.get("stanzaId") if isinstance(context, dict) else None
+        if not isinstance(stanza_id, str):
+            return None
+        return self.get(payload.instance, payload.data.key.remote_jid, stanza_id)
+
+    def by_participant(self, instance: str, remote_jid: str, participant: str,
+                       limit: Optional[int] = None) -> List[RecentMessage]:
+        """Mensagens de um participante no chat, da mais recente para a mais antiga."""
+        chat = self._chat(instance, remote_jid)
+        if chat is None:
+            return []
+        found = []
+        for entry in reversed(chat.values()):
+            if entry.sender == participant:
+                found.append(entry)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def last(self, instance: str, remote_jid: str, count: int) -> List[RecentMessage]:
+        """As últimas `count` mensagens do chat, da mais recente para a mais antiga."""
+        chat = self._chat(instance, remote_jid)
+        if chat is None or count <= 0:
+            return []
+        return list(islice(reversed(chat.values()), count))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chats": len(self._chats),
+            "messages": self._size,
+            "indexed": self._indexed,
+            "evicted": self._evicted,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+# Instância única, alimentada pelo /inspect (se `RECENT_MESSAGES_ENABLED`) e
+# consultada pelos handlers.
+recent_messages = RecentMessageIndex(
+    max_per_chat=settings.RECENT_MESSAGES_PER_CHAT,
+    max_age_seconds=settings.RECENT_MESSAGES_MAX_AGE_SECONDS,
+    max_chats=settings.RECENT_MESSAGES_MAX_CHATS,
+    snippet_chars=settings.RECENT_MESSAGES_SNIPPET_CHARS,
+    remote_jids=routing_table,
+)
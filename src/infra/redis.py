@@ -0,0 +1,39 @@
+"""
+Conexão Partilhada com o Redis.
+
+O Redis já faz parte do `docker-compose.yml` e é usado, de forma opcional, pelos
+componentes que precisam de estado partilhado entre vários workers. A
+dependência `redis` só é importada quando algum desses backends é ativado.
+"""
+import logging
+from typing import Any, Optional
+from src.infra.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[Any] = None
+
+
+def get_redis():
+    """Retorna o cliente assíncrono do Redis, criando-o na primeira utilização."""
+    global _client
+    if _client is None:
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError(
+                "Um backend Redis foi configurado, mas o pacote 'redis' não está instalado."
+            ) from e
+        # Respostas como str: os valores guardados são JSON ou contadores.
+        _client = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        logger.info("Cliente Redis criado.")
+    return _client
+
+
+async def close_redis():
+    """Fecha o cliente do Redis, se tiver sido criado."""
+    global _client
+    if _client is None:
+        return
+    await _client.aclose()
+    _client = None
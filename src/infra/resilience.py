@@ -0,0 +1,251 @@
+"""
+Resiliência para Chamadas HTTP de Saída.
+
+Junta três mecanismos usados pelo `EvolutionClient` e pelo `ProcessorClient`:
+
+1. **Retentativas com backoff exponencial e jitter**, para absorver falhas breves.
+2. **Orçamento de retentativas (retry budget)**: as retentativas são limitadas a
+   uma fração do tráfego normal, para não multiplicar a carga sobre um serviço
+   que já está em dificuldades.
+3. **Circuit breaker por chave** (ex: por instância): depois de várias falhas
+   seguidas, as chamadas falham de imediato durante um período, em vez de
+   acumular corrotinas e conexões à espera de um serviço em baixo.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+import httpx
+from src.infra.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """O circuito para o destino está aberto: a chamada nem foi tentada."""
+
+
+def is_retryable_http_error(exc: BaseException) -> bool:
+    """Erros de rede, 429 e 5xx são transitórios; os restantes 4xx não valem nova tentativa."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(exc, httpx.RequestError)
+
+
+# Erros levantados antes de o pedido sair: o destino nunca o recebeu.
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def is_safe_to_resend(exc: BaseException) -> bool:
+    """
+    Para pedidos não idempotentes (ex: enviar uma mensagem): só é seguro repetir
+    se o pedido não chegou a sair ou se o destino o recusou sem o processar
+    (429, 503). Um timeout de leitura ou uma ligação cortada a meio podem
+    acontecer depois de o destino ter aceitado o pedido.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in (429, 503)
+    return isinstance(exc, _UNSENT_ERRORS)
+
+
+class RetryBudget:
+    """
+    Limita as retentativas a uma fração (`ratio`) dos pedidos, com um mínimo
+    de `min_per_second` retentativas por segundo para tráfego baixo.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, max_tokens: float = 100.0):
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._max_tokens, self._tokens + (now - self._updated) * self._min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """Chamado uma vez por pedido original."""
+        self._refill()
+        self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def withdraw(self) -> bool:
+        """Chamado antes de cada retentativa. Retorna False se o orçamento se esgotou."""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker com os estados "closed", "open" e "half_open".
+
+    Abre após `failure_threshold` falhas seguidas; passados `reset_timeout`
+    segundos deixa passar uma chamada de teste, que fecha o circuito se tiver
+    sucesso ou o volta a abrir se falhar.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self._reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            if self._opened_at is None:
+                logger.warning(f"Circuit breaker aberto após {self._failures} falhas seguidas.")
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """
+        Liberta a chamada de teste sem registar resultado (ex: foi cancelada),
+        para que a próxima chamada possa voltar a testar o circuito.
+        """
+        self._probing = False
+
+
+class ResilientCaller:
+    """
+    Executa chamadas com retentativas, orçamento e um circuit breaker por chave.
+
+    `is_retryable` classifica as falhas do destino (contam para o circuito e,
+    por padrão, são retentadas). Para pedidos não idempotentes, `call` aceita
+    `retry_if=is_safe_to_resend`: as outras falhas continuam a contar para o
+    circuito, mas não são repetidas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        budget: RetryBudget,
+        failure_threshold: int,
+        reset_timeout: float,
+        is_retryable: Callable[[BaseException], bool] = is_retryable_http_error,
+    ):
+        self.name = name
+        self._max_attempts = max(1, max_attempts)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget = budget
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._is_retryable = is_retryable
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_settings(cls, name: str) -> "ResilientCaller":
+        return cls(
+            name=name,
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+            base_delay=settings.RETRY_BASE_DELAY,
+            max_delay=settings.RETRY_MAX_DELAY,
+            budget=RetryBudget(settings.RETRY_BUDGET_RATIO, settings.RETRY_BUDGET_MIN_PER_SECOND),
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+        )
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = self._breakers[key] = CircuitBreaker(self._failure_threshold, self._reset_timeout)
+        return breaker
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": espera aleatória entre 0 e o teto exponencial.
+        ceiling = min(self._max_delay, self._base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+    async def call(self, key: str, func: Callable[..., Awaitable[T]], *args: Any,
+                   retry_if: Optional[Callable[[BaseException], bool]] = None, **kwargs: Any) -> T:
+        """
+        Executa `func(*args, **kwargs)` protegida pelo circuito `key`.
+
+        Args:
+            retry_if: Quais das falhas do destino podem ser repetidas (padrão:
+                      todas as que `is_retryable` considera transitórias).
+
+        Raises:
+            CircuitOpenError: Se o circuito estiver aberto.
+            Exception: A última exceção de `func`, se as tentativas se esgotarem
+                       ou o erro não for transitório.
+        """
+        if retry_if is None:
+            retry_if = self._is_retryable
+        breaker = self.breaker(key)
+        self._budget.deposit()
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise CircuitOpenError(f"[{self.name}] Circuito aberto para '{key}'.")
+            # Depois de `allow()`, half_open significa que esta é a chamada de teste.
+            probe = breaker.state == "half_open"
+            attempt += 1
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if not self._is_retryable(e):
+                    if isinstance(e, httpx.HTTPStatusError):
+                        # O destino respondeu (4xx): não conta como falha do serviço.
+                        breaker.record_success()
+                    elif probe:
+                        # Erro local (ex: resposta ilegível, media demasiado
+                        # grande): não diz nada sobre o destino.
+                        breaker.release()
+                    raise
+                breaker.record_failure()
+                if not retry_if(e) or attempt >= self._max_attempts or not self._budget.withdraw():
+                    raise
+                delay = self._backoff(attempt)
+                logger.info(f"[{self.name}] Falha transitória para '{key}' ({e}). Nova tentativa {attempt + 1} em {delay:.2f}s.")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelamento (timeout do handler, encerramento, cliente que
+                # desligou): não diz nada sobre o destino, mas a chamada de
+                # teste do estado half_open tem de ser libertada.
+                if probe:
+                    breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, str]:
+        """Estado do circuito de cada chave."""
+        return {key: breaker.state for key, breaker in self._breakers.items()}
@@ -0,0 +1,223 @@
+"""
+Tabela de Rotas por Instância e Grupo.
+
+Permite que um único processo sirva muitas instâncias e grupos. Cada rota
+associa um par `(instance, remoteJid)` aos comandos ativos nesse chat e a
+definições próprias de resposta (atraso e limites de envio). Um dos lados
+pode ser "*" para valer para qualquer instância ou qualquer chat.
+
+A tabela é lida de um ficheiro JSON (`ROUTES_CONFIG_PATH`):
+
+    {
+      "defaults": {"commands": "*", "reply_delay_ms": 1200},
+      "routes": [
+        {"instance": "bot", "remoteJid": "123@g.us", "commands": ["/ping"]},
+        {"instance": "*", "remoteJid": "456@g.us", "chat_rate": 0.5, "chat_burst": 2}
+      ]
+    }
+
+Sem ficheiro, existe apenas a rota de `TARGET_GROUP_ID` (qualquer instância,
+todos os comandos), o comportamento anterior; sem nenhum dos dois, o arranque
+falha, a menos que `ROUTES_ALLOW_EMPTY` esteja ativo. O ficheiro é relido quando muda
+(verificado a cada `ROUTES_RELOAD_INTERVAL` segundos) ou a pedido em
+`/v1/admin/routes/reload`, sem reiniciar. Uma configuração inválida é
+rejeitada e a tabela anterior mantém-se.
+
+A consulta no caminho quente são, no máximo, quatro acessos a um dicionário.
+"""
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+from src.infra.config import settings
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+
+_ROUTE_FIELDS = {"instance", "remoteJid", "commands", "reply_delay_ms", "chat_rate", "chat_burst"}
+
+
+class Route:
+    """
+    Definições de um chat.
+
+    Args:
+        instance: Nome da instância, ou "*".
+        remote_jid: JID do chat, ou "*".
+        commands: Comandos ativos (nomes canónicos, ex: "/ping"); None ativa todos.
+        reply_delay_ms: Atraso de "a escrever..." das respostas.
+        chat_rate: Mensagens por segundo enviadas para este chat.
+        chat_burst: Rajada máxima de mensagens para este chat.
+    """
+
+    __slots__ = ("instance", "remote_jid", "commands", "reply_delay_ms", "chat_rate", "chat_burst")
+
+    def __init__(
+        self,
+        instance: str,
+        remote_jid: str,
+        commands: Optional[Iterable[str]] = None,
+        reply_delay_ms: Optional[int] = None,
+        chat_rate: Optional[float] = None,
+        chat_burst: Optional[float] = None,
+    ):
+        self.instance = instance
+        self.remote_jid = remote_jid
+        self.commands: Optional[FrozenSet[str]] = frozenset(c.lower() for c in commands) if commands is not None else None
+        self.reply_delay_ms = reply_delay_ms if reply_delay_ms is not None else settings.OUTBOUND_REPLY_DELAY_MS
+        self.chat_rate = chat_rate if chat_rate is not None else settings.OUTBOUND_CHAT_RATE
+        self.chat_burst = chat_burst if chat_burst is not None else settings.OUTBOUND_CHAT_BURST
+
+    def allows(self, command_name: str) -> bool:
+        """True se o comando está ativo nesta rota."""
+        return self.commands is None or command_name in self.commands
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "instance": self.instance,
+            "remoteJid": self.remote_jid,
+            "commands": sorted(self.commands) if self.commands is not None else WILDCARD,
+            "reply_delay_ms": self.reply_delay_ms,
+            "chat_rate": self.chat_rate,
+            "chat_burst": self.chat_burst,
+        }
+
+
+def _parse_commands(value: Any) -> Optional[Iterable[str]]:
+    if value is None or value == WILDCARD:
+        return None
+    if not isinstance(value, list) or not all(isinstance(c, str) for c in value):
+        raise ValueError("'commands' deve ser \"*\" ou uma lista de nomes de comandos.")
+    return value
+
+
+def parse_routes(config: Any) -> Dict[Tuple[str, str], Route]:
+    """Valida a configuração e constrói o índice `(instance, remoteJid) -> Route`. Levanta ValueError."""
+    if not isinstance(config, dict) or not isinstance(config.get("routes"), list):
+        raise ValueError("A configuração de rotas deve ser um objeto com uma lista 'routes'.")
+    defaults = config.get("defaults") or {}
+    if not isinstance(defaults, dict):
+        raise ValueError("'defaults' deve ser um objeto.")
+    routes: Dict[Tuple[str, str], Route] = {}
+    for position, item in enumerate(config["routes"]):
+        if not isinstance(item, dict):
+            raise ValueError(f"Rota #{position} não é um objeto.")
+        options = {**defaults, **item}
+        unknown = set(options) - _ROUTE_FIELDS
+        if unknown:
+            raise ValueError(f"Rota #{position}: campos desconhecidos: {', '.join(sorted(unknown))}")
+        instance = options.get("instance", WILDCARD)
+        remote_jid = options.get("remoteJid")
+        if not isinstance(instance, str) or not isinstance(remote_jid, str):
+            raise ValueError(f"Rota #{position}: 'instance' e 'remoteJid' devem ser strings.")
+        if (instance, remote_jid) in routes:
+            raise ValueError(f"Rota #{position}: ({instance}, {remote_jid}) está duplicada.")
+        try:
+            routes[(instance, remote_jid)] = Route(
+                instance=instance,
+                remote_jid=remote_jid,
+                commands=_parse_commands(options.get("commands")),
+                reply_delay_ms=int(options["reply_delay_ms"]) if "reply_delay_ms" in options else None,
+                chat_rate=float(options["chat_rate"]) if "chat_rate" in options else None,
+                chat_burst=float(options["chat_burst"]) if "chat_burst" in options else None,
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Rota #{position}: {e}") from e
+    return routes
+
+
+class RoutingTable:
+    """
+    Índice de rotas substituível em bloco.
+
+    Cada recarga constrói um índice novo e troca-o numa única atribuição, por
+    isso as consultas concorrentes veem sempre uma tabela completa. Suporta
+    `jid in table` para ser usada diretamente como filtro de chats no
+    `PreFilter`.
+    """
+
+    def __init__(self, path: Optional[str], reload_interval: float):
+        self._path = Path(path) if path else None
+        self._reload_interval = reload_interval
+        self._routes: Dict[Tuple[str, str], Route] = {}
+        self._jids: FrozenSet[str] = frozenset()
+        self._mtime: Optional[float] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.load()
+
+    def load(self):
+        """(Re)lê a configuração. Levanta ValueError/OSError se for inválida, mantendo a tabela atual."""
+        if self._path is None:
+            routes = {}
+            if settings.TARGET_GROUP_ID:
+                routes[(WILDCARD, settings.TARGET_GROUP_ID)] = Route(WILDCARD, settings.TARGET_GROUP_ID)
+            elif settings.ROUTES_ALLOW_EMPTY:
+                logger.warning("Nem ROUTES_CONFIG_PATH nem TARGET_GROUP_ID definidos: nenhum chat será atendido.")
+            else:
+                raise ValueError(
+                    "Defina TARGET_GROUP_ID ou ROUTES_CONFIG_PATH "
+                    "(ou ROUTES_ALLOW_EMPTY=true para arrancar sem nenhum chat atendido)."
+                )
+        else:
+            self._mtime = self._path.stat().st_mtime
+            try:
+                config = json.loads(self._path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"JSON inválido em {self._path}: {e}") from e
+            routes = parse_routes(config)
+        self._routes = routes
+        self._jids = frozenset(jid for _, jid in routes)
+        self.reloads += 1
+        logger.info(f"Tabela de rotas carregada com {len(routes)} rotas.")
+
+    def lookup(self, instance: str, remote_jid: str) -> Optional[Route]:
+        """Rota mais específica para o chat, ou None se o chat não for atendido."""
+        routes = self._routes
+        return (
+            routes.get((instance, remote_jid))
+            or routes.get((WILDCARD, remote_jid))
+            or routes.get((instance, WILDCARD))
+            or routes.get((WILDCARD, WILDCARD))
+        )
+
+    def __contains__(self, remote_jid: object) -> bool:
+        jids = self._jids
+        return remote_jid in jids or WILDCARD in jids
+
+    async def start(self):
+        """Arranca a verificação periódica de alterações ao ficheiro."""
+        if self._path is None or self._reload_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = asyncio.create_task(self._watch(), name="routes-watcher")
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self._reload_interval)
+            try:
+                if self._path.stat().st_mtime == self._mtime:
+                    continue
+                # `load` guarda o novo mtime antes de validar, por isso uma
+                # configuração inválida só é reportada uma vez.
+                self.load()
+            except (OSError, ValueError) as e:
+                logger.error(f"Configuração de rotas rejeitada; a manter a tabela anterior: {e}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "source": str(self._path) if self._path is not None else "TARGET_GROUP_ID",
+            "reloads": self.reloads,
+            "routes": [route.describe() for route in self._routes.values()],
+        }
+
+
+# Instância única, partilhada pelo dispatcher, pelo pré-filtro e pelo despacho de saída.
+routing_table = RoutingTable(settings.ROUTES_CONFIG_PATH, settings.ROUTES_RELOAD_INTERVAL)
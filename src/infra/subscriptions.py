@@ -0,0 +1,149 @@
+"""
+Filtros de Subscrição dos Clientes WebSocket do Inspetor.
+
+Por padrão, cada cliente de `/inspect/ws` recebe todos os eventos completos.
+O cliente pode restringir o fluxo enviando uma mensagem JSON:
+
+    {"action": "subscribe",
+     "filters": {"event": "messages.upsert", "instance": ["bot"],
+                 "remoteJid": "123@g.us", "fromMe": false},
+     "fields": ["timestamp", "$.payload.data.key.id", "payload.data.message.conversation"]}
+
+- `filters`: cada critério aceita um valor ou uma lista de valores; critérios
+  omitidos aceitam tudo.
+- `fields`: projeção por caminhos JSON (`a.b.c`, com `$.` opcional e índices
+  de lista como `a.0` ou `a[0]`). O evento enviado passa a ser um objeto plano
+  `{caminho: valor}` apenas com os campos pedidos (os ausentes são omitidos).
+
+`{"action": "unsubscribe"}` volta a receber tudo. A filtragem é feita no
+servidor, por isso o que não interessa ao cliente nunca é serializado nem
+enviado.
+"""
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from src.commands.prefilter import normalize_event
+from src.infra.history import extract_index_fields
+
+_PATH_INDEX_RE = re.compile(r"\[(\d+)\]")
+
+# Campos usados para filtrar, extraídos uma única vez por evento.
+EventFields = Tuple[Optional[str], Optional[str], Optional[str], Optional[bool]]
+
+_MISSING = object()
+
+
+def extract_event_fields(entry: Dict[str, Any]) -> EventFields:
+    """Extrai (event normalizado, instance, remoteJid, fromMe) de uma entrada do histórico."""
+    payload = entry.get("payload")
+    event, instance, remote_jid = extract_index_fields(payload)
+    from_me = None
+    data = payload.get("data") if isinstance(payload, dict) else None
+    key = data.get("key") if isinstance(data, dict) else None
+    if isinstance(key, dict) and isinstance(key.get("fromMe"), bool):
+        from_me = key["fromMe"]
+    return (normalize_event(event) if event is not None else None), instance, remote_jid, from_me
+
+
+def _parse_path(path: str) -> Tuple[Union[str, int], ...]:
+    path = path.strip()
+    if path.startswith("$"):
+        path = path[1:].lstrip(".")
+    path = _PATH_INDEX_RE.sub(r".\1", path)
+    segments = [segment for segment in path.split(".") if segment]
+    if not segments:
+        raise ValueError(f"Caminho inválido: '{path}'")
+    return tuple(int(s) if s.isdigit() else s for s in segments)
+
+
+def _resolve(value: Any, segments: Tuple[Union[str, int], ...]) -> Any:
+    for segment in segments:
+        if isinstance(value, dict):
+            value = value.get(str(segment), _MISSING)
+        elif isinstance(value, list) and isinstance(segment, int) and segment < len(value):
+            value = value[segment]
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _as_set(name: str, value: Any, normalize=None) -> Optional[FrozenSet[str]]:
+    if value is None:
+        return None
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"O filtro '{name}' deve ser uma string ou uma lista de strings.")
+    return frozenset(normalize(v) for v in values) if normalize else frozenset(values)
+
+
+class Subscription:
+    """Critérios de filtragem e projeção de um cliente do inspetor."""
+
+    def __init__(
+        self,
+        events: Optional[Iterable[str]] = None,
+        instances: Optional[Iterable[str]] = None,
+        remote_jids: Optional[Iterable[str]] = None,
+        from_me: Optional[bool] = None,
+        fields: Optional[List[str]] = None,
+    ):
+        self.events = frozenset(normalize_event(e) for e in events) if events is not None else None
+        self.instances = frozenset(instances) if instances is not None else None
+        self.remote_jids = frozenset(remote_jids) if remote_jids is not None else None
+        self.from_me = from_me
+        self.fields = tuple(fields) if fields else None
+        self._paths = [_parse_path(f) for f in self.fields] if self.fields else None
+
+    @classmethod
+    def from_message(cls, message: Dict[str, Any]) -> "Subscription":
+        """Constrói a subscrição a partir da mensagem `subscribe` do cliente. Levanta ValueError."""
+        filters = message.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' deve ser um objeto.")
+        unknown = set(filters) - {"event", "instance", "remoteJid", "fromMe"}
+        if unknown:
+            raise ValueError(f"Filtros desconhecidos: {', '.join(sorted(unknown))}")
+        from_me = filters.get("fromMe")
+        if from_me is not None and not isinstance(from_me, bool):
+            raise ValueError("O filtro 'fromMe' deve ser true ou false.")
+        fields = message.get("fields")
+        if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+            raise ValueError("'fields' deve ser uma lista de caminhos.")
+        return cls(
+            events=_as_set("event", filters.get("event")),
+            instances=_as_set("instance", filters.get("instance")),
+            remote_jids=_as_set("remoteJid", filters.get("remoteJid")),
+            from_me=from_me,
+            fields=fields,
+        )
+
+    def matches(self, fields: EventFields) -> bool:
+        event, instance, remote_jid, from_me = fields
+        return (
+            (self.events is None or event in self.events)
+            and (self.instances is None or instance in self.instances)
+            and (self.remote_jids is None or remote_jid in self.remote_jids)
+            and (self.from_me is None or from_me is self.from_me)
+        )
+
+    def project(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Retorna `{caminho: valor}` com os campos pedidos presentes na entrada."""
+        projected = {}
+        for name, segments in zip(self.fields, self._paths):
+            value = _resolve(entry, segments)
+            if value is not _MISSING:
+                projected[name] = value
+        return projected
+
+    def describe(self) -> Dict[str, Any]:
+        """Forma normalizada da subscrição, devolvida ao cliente na confirmação."""
+        return {
+            "filters": {
+                "event": sorted(self.events) if self.events is not None else None,
+                "instance": sorted(self.instances) if self.instances is not None else None,
+                "remoteJid": sorted(self.remote_jids) if self.remote_jids is not None else None,
+                "fromMe": self.from_me,
+            },
+            "fields": list(self.fields) if self.fields else None,
+        }
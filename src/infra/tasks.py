@@ -0,0 +1,114 @@
+"""
+Supervisor de Tarefas em Segundo Plano.
+
+Substitui o `asyncio.create_task` "solto" por um ponto único que:
+1. Guarda uma referência a cada tarefa (evita que sejam recolhidas pelo GC a meio).
+2. Limita quantas tarefas correm em simultâneo e quantas podem estar pendentes.
+3. Permite esvaziar (drain) as tarefas em curso no encerramento da aplicação.
+4. Expõe contadores de tarefas em fila, em execução, falhadas e descartadas.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+class TaskSupervisor:
+    """
+    Executa corrotinas em segundo plano com concorrência limitada.
+
+    `max_concurrency` define quantas tarefas correm ao mesmo tempo; as restantes
+    ficam em fila até `max_pending` no total. Acima disso, o trabalho é descartado.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_pending: int):
+        self.name = name
+        self._max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._tasks: Set[asyncio.Task] = set()
+        self._accepting = True
+        # Contadores
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+
+    def submit(self, func: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> bool:
+        """
+        Agenda `func(*args, **kwargs)` em segundo plano.
+
+        Recebe a função (e não a corrotina já criada) para que o trabalho descartado
+        nunca chegue a criar uma corrotina que ficaria por aguardar.
+
+        Returns:
+            True se o trabalho foi aceite, False se foi descartado.
+        """
+        if not self._accepting or len(self._tasks) >= self._max_pending:
+            self._dropped += 1
+            logger.warning(f"[{self.name}] Limite de tarefas pendentes atingido ou em encerramento. Trabalho descartado.")
+            return False
+        self._queued += 1
+        task = asyncio.create_task(self._run(func, args, kwargs))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, func: Callable[..., Awaitable[Any]], args: tuple, kwargs: dict):
+        started = False
+        try:
+            async with self._semaphore:
+                started = True
+                self._queued -= 1
+                self._running += 1
+                try:
+                    await func(*args, **kwargs)
+                    self._completed += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._failed += 1
+                    logger.error(f"[{self.name}] Tarefa em segundo plano falhou: {e}", exc_info=True)
+                finally:
+                    self._running -= 1
+        finally:
+            if not started:
+                # Cancelada ainda à espera de vaga no semáforo.
+                self._queued -= 1
+
+    async def drain(self, timeout: float):
+        """
+        Deixa de aceitar trabalho novo e aguarda (até `timeout` segundos) que as
+        tarefas em curso terminem. As que não terminarem a tempo são canceladas.
+        """
+        self._accepting = False
+        if not self._tasks:
+            return
+        logger.info(f"[{self.name}] A aguardar {len(self._tasks)} tarefas em curso antes do encerramento.")
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"[{self.name}] {len(pending)} tarefas canceladas no encerramento.")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    @property
+    def has_capacity(self) -> bool:
+        """True se um `submit` feito agora seria aceite."""
+        return self._accepting and len(self._tasks) < self._max_pending
+
+    @property
+    def load(self) -> float:
+        """Ocupação do supervisor, de 0.0 (sem tarefas) a 1.0 (limite de pendentes)."""
+        return len(self._tasks) / self._max_pending if self._max_pending > 0 else 0.0
+
+    def stats(self) -> Dict[str, int]:
+        """Retorna uma fotografia dos contadores do supervisor."""
+        return {
+            "queued": self._queued,
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "dropped": self._dropped,
+        }
@@ -9,8 +9,10 @@ Estes modelos são usados pelo FastAPI para:
 3.  **Documentação:** Gerar schemas detalhados na documentação interativa (/docs),
     mostrando exatamente o que a API espera receber.
 """
-from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional, Dict, Any
+import base64
+import binascii
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, Dict, Any, List, Tuple
 
 
 class MessageKey(BaseModel):
@@ -21,14 +23,115 @@ class MessageKey(BaseModel):
     participant: Optional[str] = None
     from_me: bool = Field(alias="fromMe")
 
+# --- Mensagens de Media ---
+
+class MediaMessage(BaseModel):
+    """
+    Campos comuns às mensagens de media (imagem, áudio, vídeo, documento, sticker).
+
+    O conteúdo binário nunca vem aqui: é descarregado à parte, em blocos, pelo
+    `media_pipeline` (ver src/services/media.py). Os campos cujo formato varia
+    entre versões da Evolution API são aceites de forma tolerante e ficam a
+    None se não forem reconhecidos, para nunca invalidarem o payload inteiro.
+    """
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+    url: Optional[str] = None
+    mimetype: Optional[str] = None
+    caption: Optional[str] = None
+    file_sha256: Optional[str] = Field(None, alias="fileSha256")
+    file_length: Optional[int] = Field(None, alias="fileLength")
+    direct_path: Optional[str] = Field(None, alias="directPath")
+
+    @field_validator("file_sha256", "url", "mimetype", "caption", "direct_path", mode="before")
+    @classmethod
+    def _only_strings(cls, value: Any) -> Optional[str]:
+        return value if isinstance(value, str) else None
+
+    @field_validator("file_length", mode="before")
+    @classmethod
+    def _parse_length(cls, value: Any) -> Optional[int]:
+        # Pode chegar como número, string ou um Long serializado ({"low": ..., "high": ...}).
+        if isinstance(value, dict) and isinstance(value.get("low"), int):
+            return (value.get("high") or 0) * 2**32 + (value["low"] & 0xFFFFFFFF)
+        try:
+            return int(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def sha256_hex(self) -> Optional[str]:
+        """`fileSha256` (base64 no WhatsApp) em hexadecimal, a chave do armazenamento de media."""
+        if not self.file_sha256:
+            return None
+        try:
+            digest = base64.b64decode(self.file_sha256, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        return digest.hex() if len(digest) == 32 else None
+
+
+class ImageMessage(MediaMessage):
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+class AudioMessage(MediaMessage):
+    seconds: Optional[int] = None
+    ptt: Optional[bool] = None
+
+
+class VideoMessage(MediaMessage):
+    seconds: Optional[int] = None
+
+
+class DocumentMessage(MediaMessage):
+    file_name: Optional[str] = Field(None, alias="fileName")
+    title: Optional[str] = None
+
+
+class StickerMessage(MediaMessage):
+    is_animated: Optional[bool] = Field(None, alias="isAnimated")
+
+
+# Tipos de media suportados, pela ordem em que são procurados na mensagem.
+MEDIA_KINDS = ("image", "audio", "video", "document", "sticker")
+
+
 class MessageContent(BaseModel):
     """
-    Modela o conteúdo de uma mensagem de texto simples.
+    Modela o conteúdo de uma mensagem: texto simples ou media.
     O objeto 'message' pode ser muito complexo, então modelamos apenas o que precisamos.
     """
     model_config = ConfigDict(extra="ignore")
     conversation: Optional[str] = None
     extendedTextMessage: Optional[Dict[str, Any]] = None
+    imageMessage: Optional[ImageMessage] = None
+    audioMessage: Optional[AudioMessage] = None
+    videoMessage: Optional[VideoMessage] = None
+    documentMessage: Optional[DocumentMessage] = None
+    stickerMessage: Optional[StickerMessage] = None
+    # Presentes apenas com "webhook base64" ou armazenamento S3 ativos na Evolution API.
+    base64: Optional[str] = None
+    mediaUrl: Optional[str] = None
+
+    @property
+    def text(self) -> Optional[str]:
+        """Texto da mensagem: 'conversation', 'extendedTextMessage.text' ou a legenda da media."""
+        if self.conversation:
+            return self.conversation
+        if self.extendedTextMessage and isinstance(self.extendedTextMessage.get("text"), str):
+            return self.extendedTextMessage["text"]
+        media = self.media()
+        return media[1].caption if media is not None else None
+
+    def media(self) -> Optional[Tuple[str, MediaMessage]]:
+        """Retorna `(tipo, mensagem)` se a mensagem for de media, ou None."""
+        for kind in MEDIA_KINDS:
+            value = getattr(self, f"{kind}Message")
+            if value is not None:
+                return kind, value
+        return None
 
 
 # --- Modelos Principais ---
@@ -49,3 +152,44 @@ class WebhookPayload(BaseModel):
     event: str
     data: MessageData
     sender: Optional[str] = None
+
+
+# --- Metadados de Grupos e Contactos (respostas da Evolution API) ---
+
+class GroupParticipant(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    # "admin", "superadmin" ou None
+    admin: Optional[str] = None
+
+
+class GroupInfo(BaseModel):
+    """Resposta de `/group/findGroupInfos`."""
+    model_config = ConfigDict(extra="ignore")
+
+    id: str
+    subject: Optional[str] = None
+    owner: Optional[str] = None
+    desc: Optional[str] = None
+    size: Optional[int] = None
+    announce: Optional[bool] = None
+    restrict: Optional[bool] = None
+    participants: List[GroupParticipant] = Field(default_factory=list)
+
+    def is_admin(self, jid: str) -> bool:
+        """True se o participante for administrador (ou criador) do grupo."""
+        return any(p.id == jid and p.admin for p in self.participants)
+
+    def admins(self) -> List[str]:
+        return [p.id for p in self.participants if p.admin]
+
+
+class ContactInfo(BaseModel):
+    """Um contacto de `/chat/findContacts`."""
+    model_config = ConfigDict(extra="ignore")
+
+    # Na v2 da Evolution API, o `id` é interno e o JID vem em `remoteJid`.
+    jid: str = Field(validation_alias=AliasChoices("remoteJid", "id"))
+    push_name: Optional[str] = Field(None, alias="pushName")
+    profile_pic_url: Optional[str] = Field(None, alias="profilePicUrl")
@@ -7,90 +7,343 @@ lugar que precisaremos modificar.
 
 Cada função aqui representa uma ação que o nosso bot pode realizar.
 """
-from typing import Optional, Dict, Any
-import requests
+from typing import Optional, Dict, Any, AsyncIterator
+import binascii
+import httpx
 import logging
+import re
+import time
 from src.infra.config import settings  # Importa as nossas configurações centralizadas
+from src.infra.dead_letter import dead_letters
+from src.infra.metrics import EVOLUTION_REQUEST_SECONDS
+from src.infra.resilience import CircuitOpenError, ResilientCaller, is_safe_to_resend
 
 logger = logging.getLogger(__name__)
 
-# --- Funções de Envio de Mensagens ---
 
-def send_text_message(
-    instance: str, 
-    to_number: str, 
-    text: str,
-    quoted_message: Optional[Dict[str, Any]] = None
-):
+class EvolutionClient:
     """
-    Envia uma mensagem de texto, com a opção de responder a uma mensagem anterior.
-    
-    Args:
-        instance: O nome da instância da Evolution API.
-        to_number: O JID do destinatário (grupo ou utilizador).
-        text: O conteúdo da mensagem a ser enviada.
-        quoted_message: Um dicionário opcional contendo os dados da mensagem a ser citada.
-                        Ex: {"key": {"id": "message_id"}, "message": {"conversation": "original text"}}
+    Cliente assíncrono para a Evolution API.
+
+    Mantém um único `httpx.AsyncClient` durante toda a vida da aplicação, para que
+    as chamadas reutilizem conexões TCP/TLS (keep-alive) em vez de abrir uma nova
+    por mensagem, e para que nenhuma chamada bloqueie o event loop do uvicorn.
+    Deve ser iniciado com `start()` no arranque e fechado com `close()` no encerramento.
+
+    Todas as chamadas passam por `_request`, que aplica retentativas com backoff,
+    um circuit breaker por instância e, se as tentativas se esgotarem, guarda o
+    pedido na dead-letter para reenvio posterior.
     """
-    url = f"{settings.EVOLUTION_API_URL}/message/sendText/{instance}"
-    
-    # Monta a estrutura base do payload
-    payload = {
-        "number": to_number,
-        "delay": 1200,
-        "text": text,
-    }
-
-    # Se os dados de uma mensagem a ser citada forem fornecidos, adiciona-os ao payload
-    if quoted_message:
-        payload["quoted"] = quoted_message
-    
-    headers = {
-        "apikey": settings.AUTHENTICATION_API_KEY,
-        "Content-Type": "application/json"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()  # Lança um erro para respostas 4xx ou 5xx
-        logger.info(f"Mensagem de texto enviada com sucesso para {to_number}. Resposta da API: {response.json()}")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Falha ao enviar mensagem de texto para {to_number}: {e}")
-        if e.response:
+
+    DEAD_LETTER_KIND = "evolution"
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.resilience = ResilientCaller.from_settings("evolution")
+
+    async def start(self):
+        """Abre o pool de conexões com os limites e timeouts configurados."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=settings.EVOLUTION_API_URL,
+            headers={
+                "apikey": settings.AUTHENTICATION_API_KEY,
+                "Content-Type": "application/json",
+            },
+            limits=httpx.Limits(
+                max_connections=settings.EVOLUTION_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EVOLUTION_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.EVOLUTION_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.EVOLUTION_HTTP_TIMEOUT,
+                connect=settings.EVOLUTION_HTTP_CONNECT_TIMEOUT,
+            ),
+            http2=settings.EVOLUTION_HTTP2,
+        )
+        logger.info("Cliente da Evolution API iniciado.")
+
+    async def close(self):
+        """Fecha o pool de conexões."""
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        logger.info("Cliente da Evolution API encerrado.")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("EvolutionClient não foi iniciado. Chame 'await evolution_client.start()' primeiro.")
+        return self._client
+
+    # --- Funções de Envio de Mensagens ---
+
+    async def send_text_message(
+        self,
+        instance: str,
+        to_number: str,
+        text: str,
+        quoted_message: Optional[Dict[str, Any]] = None,
+        delay: int = 1200,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Envia uma mensagem de texto, com a opção de responder a uma mensagem anterior.
+
+        Args:
+            instance: O nome da instância da Evolution API.
+            to_number: O JID do destinatário (grupo ou utilizador).
+            text: O conteúdo da mensagem a ser enviada.
+            quoted_message: Um dicionário opcional contendo os dados da mensagem a ser citada.
+                            Ex: {"key": {"id": "message_id"}, "message": {"conversation": "original text"}}
+            delay: Tempo (ms) durante o qual o WhatsApp mostra "a escrever..." antes do envio.
+
+        Returns:
+            O corpo JSON da resposta da API, ou None em caso de falha.
+        """
+        url = f"/message/sendText/{instance}"
+
+        # Monta a estrutura base do payload
+        payload = {
+            "number": to_number,
+            "delay": delay,
+            "text": text,
+        }
+
+        # Se os dados de uma mensagem a ser citada forem fornecidos, adiciona-os ao payload
+        if quoted_message:
+            payload["quoted"] = quoted_message
+
+        data = await self._request(instance, url, payload)
+        if data is not None:
+            # A resposta completa só é formatada se o nível DEBUG estiver ativo.
+            logger.info("Mensagem de texto enviada com sucesso para %s.", to_number)
+            logger.debug("Resposta da API ao envio para %s: %s", to_number, data)
+        return data
+
+    async def delete_message(self, instance: str, message_key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Apaga uma mensagem para todos no chat.
+
+        Args:
+            instance: O nome da instância da Evolution API.
+            message_key: O objeto 'key' da mensagem (id, remoteJid, fromMe e,
+                         num grupo, participant), ex: `RecentMessage.key()`.
+
+        Returns:
+            O corpo JSON da resposta da API, ou None em caso de falha.
+        """
+        data = await self._request(instance, f"/chat/deleteMessageForEveryone/{instance}", message_key,
+                                   method="DELETE")
+        if data is not None:
+            logger.info("Mensagem %s apagada do chat %s.", message_key.get("id"), message_key.get("remoteJid"))
+        return data
+
+    # --- Media ---
+
+    async def stream_media(self, instance: str, message_key: Dict[str, Any],
+                           chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """
+        Descarrega a media de uma mensagem, em blocos já descodificados.
+
+        A Evolution API responde com `{"base64": "...", ...}`; a resposta é lida
+        em streaming e o campo base64 é descodificado à medida que chega, por
+        isso nem o texto base64 nem o binário ficam inteiros em memória.
+
+        Args:
+            instance: O nome da instância da Evolution API.
+            message_key: O objeto 'key' da mensagem (pelo menos o 'id').
+            chunk_size: Tamanho dos blocos lidos da resposta.
+        """
+        path = f"/chat/getBase64FromMediaMessage/{instance}"
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self.client.stream(
+                "POST", path, json={"message": {"key": message_key}, "convertToMp4": False}
+            ) as response:
+                outcome = str(response.status_code)
+                response.raise_for_status()
+                decoder = _Base64FieldDecoder()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    data = decoder.feed(chunk)
+                    if data:
+                        yield data
+                decoder.finish()
+        finally:
+            EVOLUTION_REQUEST_SECONDS.observe(time.perf_counter() - started, "/chat/getBase64FromMediaMessage", outcome)
+
+    # --- Consultas (sem dead-letter: o chamador decide o que fazer em caso de falha) ---
+
+    async def get_group_info(self, instance: str, group_jid: str) -> Dict[str, Any]:
+        """
+        Obtém os metadados de um grupo (assunto, dono, participantes e administradores).
+
+        Raises:
+            CircuitOpenError, httpx.HTTPError: Se o pedido falhar.
+        """
+        return await self.resilience.call(
+            instance, self._get, f"/group/findGroupInfos/{instance}", {"groupJid": group_jid},
+        )
+
+    async def find_contacts(self, instance: str, jid: str) -> Any:
+        """
+        Procura um contacto pelo JID. Retorna a lista de contactos encontrados.
+
+        Raises:
+            CircuitOpenError, httpx.HTTPError: Se o pedido falhar.
+        """
+        return await self.resilience.call(
+            instance, self._post, f"/chat/findContacts/{instance}", {"where": {"remoteJid": jid}},
+        )
+
+    # --- Infraestrutura de Pedidos ---
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Any:
+        operation = path.rsplit("/", 1)[0]
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.get(path, params=params)
+            outcome = str(response.status_code)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            EVOLUTION_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, outcome)
+
+    async def _post(self, path: str, payload: Dict[str, Any], method: str = "POST") -> Dict[str, Any]:
+        # Métrica por operação (ex: "/message/sendText"), sem o nome da instância.
+        operation = path.rsplit("/", 1)[0]
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.client.request(method, path, json=payload)
+            outcome = str(response.status_code)
+            response.raise_for_status()  # Lança um erro para respostas 4xx ou 5xx
+            return response.json()
+        finally:
+            EVOLUTION_REQUEST_SECONDS.observe(time.perf_counter() - started, operation, outcome)
+
+    async def _request(self, instance: str, path: str, payload: Dict[str, Any],
+                       method: str = "POST") -> Optional[Dict[str, Any]]:
+        """
+        Envia um pedido à Evolution API com a política de resiliência.
+
+        Os pedidos que passam por aqui (ex: enviar uma mensagem) não são
+        idempotentes: só são repetidos, e guardados na dead-letter, se for
+        certo que a Evolution API não os processou (erro de ligação, 429,
+        503). Depois de um timeout de leitura, a mensagem pode já ter sido
+        enviada, e repeti-la duplicá-la-ia no chat.
+
+        Returns:
+            O corpo JSON da resposta, ou None se o pedido falhar.
+        """
+        try:
+            return await self.resilience.call(instance, self._post, path, payload, method,
+                                              retry_if=is_safe_to_resend)
+        except CircuitOpenError as e:
+            logger.warning(f"Evolution API indisponível para a instância '{instance}'. Pedido para {path} não tentado.")
+            await dead_letters.add(self.DEAD_LETTER_KIND, path, payload, str(e), method=method)
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Falha no pedido {path}: {e}")
             # Adiciona um log mais detalhado do corpo da resposta em caso de erro
             logger.error(f"Detalhes do erro da API ({e.response.status_code}): {e.response.text}")
+            if is_safe_to_resend(e):
+                await dead_letters.add(self.DEAD_LETTER_KIND, path, payload, str(e), method=method)
+        except httpx.RequestError as e:
+            logger.error(f"Falha no pedido {path}: {e}")
+            if is_safe_to_resend(e):
+                await dead_letters.add(self.DEAD_LETTER_KIND, path, payload, str(e), method=method)
         return None
 
-# def delete_message(instance: str, remote_jid: str, msg_id: str, participant_id: str):
-#     """
-#     Deleta uma mensagem para todos no chat.
-
-#     Args:
-#         instance: O nome da instância da Evolution API.
-#         message_key: O objeto 'key' da mensagem a ser deletada, contendo
-#                      remoteJid, id, e participant.
-
-#     Returns:
-#         True se a mensagem foi deletada com sucesso, False caso contrário.
-#     """
-#     endpoint = f"{settings.EVOLUTION_API_URL}/message/delete/{instance}"
-#     headers = {"apikey": settings.EVOLUTION_API_KEY, "Content-Type": "application/json"}
-    
-#     # O payload para deletar uma mensagem é o próprio objeto 'key'
-#     payload = message_key
-
-#     try:
-#         response = requests.post(endpoint, json=payload, headers=headers)
-#         response.raise_for_status()
-#         logger.info(f"Mensagem {message_key.get('id')} deletada com sucesso do chat {message_key.get('remoteJid')}.")
-#         # A API pode retornar diferentes respostas de sucesso, verificamos o status
-#         return response.status_code in [200, 201]
-#     except requests.RequestException as e:
-#         logger.error(f"Falha ao deletar a mensagem {message_key.get('id')}: {e}")
-#         return False
-
-# # Poderíamos adicionar mais funções aqui no futuro, como:
-# # - send_quoted_message(...)
-# # - send_media_message(...)
-# # - get_group_info(...)
+    async def replay(self, entry: Dict[str, Any]):
+        """Reenvia uma entrada da dead-letter (lança exceção se voltar a falhar)."""
+        await self._post(entry["target"], entry["payload"], entry.get("method", "POST"))
+
+
+class _Base64FieldDecoder:
+    """
+    Descodifica incrementalmente o valor do campo "base64" de uma resposta JSON
+    recebida em blocos, sem a acumular. Aceita também o prefixo `data:...;base64,`.
+
+    Dos escapes JSON, só `\/` (a barra) e `\n`/`\r` (base64 com quebras de
+    linha) podem aparecer num valor base64; qualquer outro é um erro, em vez
+    de ser descodificado como dados (ex: `\n` como o carácter base64 "n").
+    """
+
+    _MARKER_RE = re.compile(rb'"base64"\s*:\s*"')
+    # Bytes guardados enquanto se procura o campo (outros campos são pequenos).
+    _MAX_SEARCH_BUFFER = 64 * 1024
+
+    def __init__(self):
+        self._search = bytearray()
+        self._pending = b""
+        self._in_value = False
+        self._done = False
+        self._prefix_checked = False
+        # Barra invertida no fim do bloco anterior: o escape continua no seguinte.
+        self._escape = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        if self._done:
+            return b""
+        if not self._in_value:
+            self._search += chunk
+            match = self._MARKER_RE.search(self._search)
+            if match is None:
+                if len(self._search) > self._MAX_SEARCH_BUFFER:
+                    # Mantém só o fim, caso o marcador esteja dividido entre blocos.
+                    del self._search[:-32]
+                return b""
+            chunk = bytes(self._search[match.end():])
+            self._search = bytearray()
+            self._in_value = True
+        end = chunk.find(b'"')
+        if end != -1:
+            chunk = chunk[:end]
+            self._done = True
+        data = self._pending + self._unescape(self._escape + chunk)
+        if not self._prefix_checked:
+            if data.startswith(b"data:") or (len(data) < 5 and b"data:".startswith(data) and not self._done):
+                comma = data.find(b",")
+                if comma == -1:
+                    self._pending = data
+                    return b""
+                data = data[comma + 1:]
+            self._prefix_checked = True
+        usable = len(data) if self._done else len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b""
+
+    def _unescape(self, chunk: bytes) -> bytes:
+        if b"\\" not in chunk:
+            self._escape = b""
+            return chunk
+        parts = chunk.split(b"\\")
+        self._escape = b""
+        if parts[-1] == b"":
+            # Termina numa barra: o carácter escapado vem no bloco seguinte (se
+            # o valor terminou aqui, a aspa final estava escapada).
+            if self._done:
+                raise ValueError("Escape inválido no fim do campo 'base64' da resposta da Evolution API.")
+            parts.pop()
+            self._escape = b"\\"
+        out = [parts[0]]
+        for part in parts[1:]:
+            escaped = part[:1]
+            if escaped == b"/":
+                out.append(part)
+            elif escaped in (b"n", b"r"):
+                out.append(part[1:])
+            else:
+                raise ValueError(f"Escape JSON inesperado no campo 'base64' da resposta da Evolution API: {escaped!r}.")
+        return b"".join(out)
+
+    def finish(self):
+        if not self._done:
+            raise ValueError("Campo 'base64' não encontrado ou incompleto na resposta da Evolution API.")
+
+
+# Instância única do cliente, partilhada por todos os handlers.
+evolution_client = EvolutionClient()
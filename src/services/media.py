@@ -0,0 +1,225 @@
+"""
+Pipeline de Media (imagem, áudio, vídeo, documento, sticker).
+
+Para os handlers que precisam do ficheiro de uma mensagem de media:
+
+    media = await media_pipeline.fetch(payload)
+    results = await media_pipeline.process(media)
+
+1. `fetch` obtém o conteúdo sem o guardar inteiro em memória e grava-o no
+   armazenamento endereçado por conteúdo (`src/infra/media_store.py`):
+   - se o `fileSha256` da mensagem já estiver guardado, não há download;
+   - downloads simultâneos da mesma media partilham um único pedido;
+   - a origem é, por ordem: o `base64` incluído no webhook (se a Evolution o
+     enviar), o `mediaUrl` do armazenamento S3 da Evolution, ou o endpoint
+     `getBase64FromMediaMessage`, lido e descodificado em streaming.
+2. `process` corre os processadores registados para o tipo de media
+   (miniaturas, transcodificação...) no pool partilhado escolhido em
+   `MEDIA_EXECUTOR` (ver `src/infra/executors.py`), para que o trabalho de
+   CPU nunca bloqueie o event loop.
+
+Os processadores são funções de módulo (para poderem ser enviadas ao pool)
+com a assinatura `func(path: str, info: dict) -> Any`:
+
+    @media_pipeline.processor("image")
+    def make_thumbnail(path, info): ...
+"""
+import asyncio
+import base64
+import importlib.util
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import httpx
+from src.infra.config import settings
+from src.infra.executors import BoundedExecutor, executors
+from src.infra.media_store import MediaStore
+from src.models.evolution import WebhookPayload
+from src.services.evolution_api import EvolutionClient, evolution_client
+
+logger = logging.getLogger(__name__)
+
+Processor = Callable[[str, Dict[str, Any]], Any]
+
+
+class MediaFile:
+    """Uma media já guardada em disco."""
+
+    __slots__ = ("sha256", "path", "size", "kind", "mimetype")
+
+    def __init__(self, sha256: str, path: Path, size: int, kind: str, mimetype: Optional[str]):
+        self.sha256 = sha256
+        self.path = path
+        self.size = size
+        self.kind = kind
+        self.mimetype = mimetype
+
+    def info(self) -> Dict[str, Any]:
+        return {"sha256": self.sha256, "size": self.size, "kind": self.kind, "mimetype": self.mimetype}
+
+
+class MediaPipeline:
+    """Obtém, guarda e processa as medias das mensagens."""
+
+    def __init__(self, client: EvolutionClient, store: MediaStore, executor: BoundedExecutor):
+        self._client = client
+        self._store = store
+        self._executor = executor
+        self._processors: Dict[str, List[Tuple[str, Processor]]] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+        # Downloads em curso, por hash (ou id da mensagem): os pedidos repetidos esperam pelo mesmo.
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Contadores
+        self._downloads = 0
+        self._cache_hits = 0
+        self._shared = 0
+        self._failed = 0
+
+    async def start(self):
+        """Cria o cliente HTTP para os URLs de media."""
+        if self._http is not None:
+            return
+        # Cliente separado do da Evolution: os URLs de media (S3) não devem receber a apikey.
+        self._http = httpx.AsyncClient(timeout=httpx.Timeout(settings.EVOLUTION_HTTP_TIMEOUT), follow_redirects=True)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def processor(self, *kinds: str, name: Optional[str] = None):
+        """Decorador que regista um processador para os tipos de media dados."""
+        def decorator(func: Processor) -> Processor:
+            for kind in kinds:
+                self._processors.setdefault(kind, []).append((name or func.__name__, func))
+            return func
+        return decorator
+
+    async def fetch(self, payload: WebhookPayload) -> Optional[MediaFile]:
+        """
+        Garante que a media da mensagem está guardada e retorna-a.
+
+        Returns:
+            O `MediaFile`, ou None se a mensagem não tiver media ou o download falhar.
+        """
+        content = payload.data.message
+        media = content.media() if content is not None else None
+        if media is None:
+            return None
+        kind, message = media
+        expected = message.sha256_hex
+        if expected is not None:
+            path = self._store.lookup(expected)
+            if path is not None:
+                self._cache_hits += 1
+                return MediaFile(expected, path, path.stat().st_size, kind, message.mimetype)
+
+        flight_key = expected or f"{payload.instance}:{payload.data.key.id}"
+        pending = self._inflight.get(flight_key)
+        if pending is not None:
+            self._shared += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        result = None
+        try:
+            result = await self._download(payload, kind, message, expected)
+        except Exception as e:
+            self._failed += 1
+            logger.error(f"Falha ao obter media da mensagem {payload.data.key.id}: {e}")
+        finally:
+            # Também em caso de cancelamento, para não deixar os outros pedidos à espera.
+            self._inflight.pop(flight_key, None)
+            future.set_result(result)
+        return result
+
+    async def _download(self, payload: WebhookPayload, kind: str, message, expected: Optional[str]) -> MediaFile:
+        content = payload.data.message
+        if content.base64:
+            # Já veio no webhook: descodifica numa thread para não bloquear o event loop.
+            data = await asyncio.to_thread(base64.b64decode, content.base64)
+            sha256, path, size = await self._store.write_bytes(data)
+        elif content.mediaUrl:
+            sha256, path, size = await self._store.write_stream(self._stream_url(content.mediaUrl))
+        else:
+            key = {"id": payload.data.key.id, "remoteJid": payload.data.key.remote_jid,
+                   "fromMe": payload.data.key.from_me}
+            # Cada tentativa recomeça o download do início.
+            sha256, path, size = await self._client.resilience.call(
+                payload.instance, self._download_from_evolution, payload.instance, key,
+            )
+        self._downloads += 1
+        if expected is not None and sha256 != expected:
+            logger.warning(f"Hash da media {payload.data.key.id} não corresponde ao fileSha256 da mensagem.")
+        return MediaFile(sha256, path, size, kind, message.mimetype)
+
+    async def _download_from_evolution(self, instance: str, key: Dict[str, Any]) -> Tuple[str, Path, int]:
+        return await self._store.write_stream(
+            self._client.stream_media(instance, key, settings.MEDIA_CHUNK_SIZE)
+        )
+
+    async def _stream_url(self, url: str) -> AsyncIterator[bytes]:
+        if self._http is None:
+            raise RuntimeError("MediaPipeline não foi iniciado.")
+        async with self._http.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(settings.MEDIA_CHUNK_SIZE):
+                yield chunk
+
+    async def process(self, media: MediaFile) -> Dict[str, Any]:
+        """
+        Corre no pool todos os processadores registados para o tipo da media.
+
+        Returns:
+            `{nome_do_processador: resultado}`; um processador que falhe tem resultado None.
+        """
+        processors = self._processors.get(media.kind, [])
+        if not processors:
+            return {}
+        info = media.info()
+        futures = [self._executor.run(func, str(media.path), info) for _, func in processors]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        output = {}
+        for (name, _), result in zip(processors, results):
+            if isinstance(result, Exception):
+                logger.error(f"Processador de media '{name}' falhou para {media.sha256}: {result}")
+                result = None
+            output[name] = result
+        return output
+
+    def stats(self) -> Dict[str, int]:
+        """Downloads feitos, evitados por hash, partilhados em curso e falhados."""
+        return {
+            "downloads": self._downloads,
+            "cache_hits": self._cache_hits,
+            "shared_inflight": self._shared,
+            "failed": self._failed,
+            "inflight": len(self._inflight),
+        }
+
+
+def make_thumbnail(path: str, info: Dict[str, Any]) -> Optional[str]:
+    """Gera `<ficheiro>.thumb.jpg` (corre no pool). Requer o pacote opcional Pillow."""
+    from PIL import Image
+
+    thumb_path = f"{path}.thumb.jpg"
+    with Image.open(path) as image:
+        image.thumbnail((settings.MEDIA_THUMBNAIL_SIZE, settings.MEDIA_THUMBNAIL_SIZE))
+        image.convert("RGB").save(thumb_path, "JPEG", quality=80)
+    return thumb_path
+
+
+# Instância única, iniciada e fechada no lifespan do main.py.
+media_pipeline = MediaPipeline(
+    client=evolution_client,
+    store=MediaStore(
+        root=settings.MEDIA_STORE_PATH,
+        max_bytes=settings.MEDIA_STORE_MAX_BYTES,
+        max_file_bytes=settings.MEDIA_MAX_FILE_BYTES,
+    ),
+    executor=executors.get(settings.MEDIA_EXECUTOR),
+)
+
+# Miniaturas de imagens, apenas se o Pillow estiver instalado.
+if importlib.util.find_spec("PIL") is not None:
+    media_pipeline.processor("image", "sticker", name="thumbnail")(make_thumbnail)
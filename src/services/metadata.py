@@ -0,0 +1,268 @@
+"""
+Cache de Metadados de Grupos e Contactos.
+
+Comandos que precisam de saber quem é administrador de um grupo ou o nome de
+um participante consultam este serviço em vez de chamar a Evolution API:
+
+    group = await metadata.group(payload.instance, payload.data.key.remote_jid)
+    if await metadata.is_admin(instance, group_jid, participant): ...
+    name = await metadata.display_name(instance, participant)
+
+Cada tipo de metadados tem a sua `MetadataCache`:
+- TTL por tipo (e um TTL mais curto para respostas vazias, ex: contacto
+  desconhecido), com substituição LRU acima de `max_entries`;
+- single-flight: falhas de cache simultâneas para a mesma chave partilham um
+  único pedido à Evolution API;
+- refresh em segundo plano: a partir de `refresh_ratio` do TTL, a entrada
+  ainda é servida de imediato e é renovada em paralelo, para que os pedidos
+  quase nunca esperem pela rede;
+- em caso de falha, a última versão conhecida continua a ser servida.
+
+Os webhooks `groups.update` e `group-participants.update` invalidam o grupo
+afetado quando são admitidos no `/inspect` (em sobrecarga são recusados com
+`Retry-After`, nunca descartados).
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Set, Tuple, TypeVar
+from src.infra.admission import GROUP_EVENTS
+from src.infra.config import settings
+from src.models.evolution import ContactInfo, GroupInfo
+from src.services.evolution_api import EvolutionClient, evolution_client
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Entry:
+    __slots__ = ("value", "refresh_at", "expires_at")
+
+    def __init__(self, value: Any, ttl: float, refresh_ratio: float):
+        now = time.monotonic()
+        self.value = value
+        self.refresh_at = now + ttl * refresh_ratio
+        self.expires_at = now + ttl
+
+
+class MetadataCache(Generic[K, V]):
+    """
+    Cache TTL/LRU com single-flight e renovação em segundo plano.
+
+    Args:
+        name: Nome para logs e estatísticas.
+        loader: Corrotina `loader(key)` que obtém o valor (None = não existe).
+        ttl: Segundos durante os quais um valor é válido.
+        negative_ttl: Segundos durante os quais um None é guardado.
+        max_entries: Número máximo de chaves guardadas.
+        refresh_ratio: Fração do TTL a partir da qual o valor é renovado em segundo plano.
+    """
+
+    def __init__(self, name: str, loader: Callable[[K], Awaitable[Optional[V]]], ttl: float,
+                 negative_ttl: float, max_entries: int, refresh_ratio: float = 0.8):
+        self.name = name
+        self._loader = loader
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._max_entries = max(1, max_entries)
+        self._refresh_ratio = min(1.0, max(0.0, refresh_ratio))
+        self._entries: "OrderedDict[K, _Entry]" = OrderedDict()
+        # Pedidos em curso por chave. Uma invalidação retira o pedido daqui, e
+        # o seu resultado (possivelmente desatualizado) deixa de ser guardado.
+        self._inflight: Dict[K, asyncio.Task] = {}
+        self._refreshes: Set[asyncio.Task] = set()
+        # Contadores
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._background_refreshes = 0
+        self._stale_served = 0
+        self._failures = 0
+        self._invalidations = 0
+
+    async def get(self, key: K) -> Optional[V]:
+        """Valor da chave, da cache se possível. Levanta a exceção do loader se falhar sem cópia anterior."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now < entry.expires_at:
+            self._hits += 1
+            self._entries.move_to_end(key)
+            if now >= entry.refresh_at and key not in self._inflight:
+                self._refresh_in_background(key)
+            return entry.value
+
+        self._misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key)
+        else:
+            self._coalesced += 1
+        try:
+            # `shield`: o cancelamento de um dos chamadores não cancela o pedido partilhado.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if entry is None:
+                raise
+            self._stale_served += 1
+            logger.warning(f"[{self.name}] Falha ao renovar '{key}' ({e}); a servir a versão anterior.")
+            return entry.value
+
+    def _start_load(self, key: K) -> asyncio.Task:
+        task = asyncio.create_task(self._load(key), name=f"metadata-{self.name}")
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: K) -> Optional[V]:
+        task = asyncio.current_task()
+        try:
+            value = await self._loader(key)
+        except Exception:
+            self._failures += 1
+            raise
+        finally:
+            current = self._inflight.get(key) is task
+            if current:
+                del self._inflight[key]
+        if current:
+            self.set(key, value)
+        return value
+
+    def _refresh_in_background(self, key: K):
+        self._background_refreshes += 1
+        task = asyncio.create_task(self._quiet_refresh(self._start_load(key)))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _quiet_refresh(self, load: asyncio.Task):
+        try:
+            await load
+        except Exception as e:
+            # A entrada atual continua válida até expirar.
+            logger.warning(f"[{self.name}] Renovação em segundo plano falhou: {e}")
+
+    def set(self, key: K, value: Optional[V], ttl: Optional[float] = None):
+        """Guarda um valor (ex: obtido por outra via), com TTL próprio opcional."""
+        if ttl is None:
+            ttl = self._ttl if value is not None else self._negative_ttl
+        self._entries[key] = _Entry(value, ttl, self._refresh_ratio)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: K):
+        """Descarta a chave; o próximo `get` volta a pedi-la (também se um pedido já estiver em curso)."""
+        self._invalidations += 1
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    async def close(self):
+        tasks = [*self._refreshes, *self._inflight.values()]
+        self._inflight.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "background_refreshes": self._background_refreshes,
+            "stale_served": self._stale_served,
+            "failures": self._failures,
+            "invalidations": self._invalidations,
+        }
+
+
+class MetadataService:
+    """Metadados de grupos e contactos, por instância, servidos a partir de cache."""
+
+    def __init__(self, client: EvolutionClient):
+        self._client = client
+        self.groups: MetadataCache[Tuple[str, str], GroupInfo] = MetadataCache(
+            "groups", self._load_group,
+            ttl=settings.METADATA_GROUP_TTL,
+            negative_ttl=settings.METADATA_NEGATIVE_TTL,
+            max_entries=settings.METADATA_MAX_ENTRIES,
+            refresh_ratio=settings.METADATA_REFRESH_RATIO,
+        )
+        self.contacts: MetadataCache[Tuple[str, str], ContactInfo] = MetadataCache(
+            "contacts", self._load_contact,
+            ttl=settings.METADATA_CONTACT_TTL,
+            negative_ttl=settings.METADATA_NEGATIVE_TTL,
+            max_entries=settings.METADATA_MAX_ENTRIES,
+            refresh_ratio=settings.METADATA_REFRESH_RATIO,
+        )
+
+    async def group(self, instance: str, group_jid: str) -> Optional[GroupInfo]:
+        """Metadados do grupo, ou None se não existir. Levanta exceção se a Evolution API falhar."""
+        return await self.groups.get((instance, group_jid))
+
+    async def contact(self, instance: str, jid: str) -> Optional[ContactInfo]:
+        """Contacto, ou None se for desconhecido. Levanta exceção se a Evolution API falhar."""
+        return await self.contacts.get((instance, jid))
+
+    async def is_admin(self, instance: str, group_jid: str, participant: str) -> bool:
+        group = await self.group(instance, group_jid)
+        return group is not None and group.is_admin(participant)
+
+    async def display_name(self, instance: str, jid: str) -> str:
+        """Nome visível do contacto, ou o número do JID se não for conhecido."""
+        try:
+            contact = await self.contact(instance, jid)
+        except Exception as e:
+            logger.warning(f"Não foi possível obter o contacto {jid}: {e}")
+            contact = None
+        if contact is not None and contact.push_name:
+            return contact.push_name
+        return jid.split("@", 1)[0]
+
+    def observe(self, event: str, payload: Any):
+        """Invalida os grupos referidos por um webhook `groups.*`/`group-participants.update` bruto."""
+        if event not in GROUP_EVENTS or not isinstance(payload, dict):
+            return
+        instance = str(payload.get("instance"))
+        data = payload.get("data")
+        # `groups.update` traz uma lista de grupos; `group-participants.update` um único objeto.
+        for item in data if isinstance(data, list) else [data]:
+            group_jid = item.get("id") if isinstance(item, dict) else None
+            if isinstance(group_jid, str):
+                self.groups.invalidate((instance, group_jid))
+                logger.debug(f"Metadados do grupo {group_jid} invalidados por '{event}'.")
+
+    async def close(self):
+        await self.groups.close()
+        await self.contacts.close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"groups": self.groups.stats(), "contacts": self.contacts.stats()}
+
+    # --- Loaders ---
+
+    async def _load_group(self, key: Tuple[str, str]) -> Optional[GroupInfo]:
+        instance, group_jid = key
+        data = await self._client.get_group_info(instance, group_jid)
+        if not isinstance(data, dict) or not data.get("id"):
+            return None
+        return GroupInfo.model_validate(data)
+
+    async def _load_contact(self, key: Tuple[str, str]) -> Optional[ContactInfo]:
+        instance, jid = key
+        data = await self._client.find_contacts(instance, jid)
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                contact = ContactInfo.model_validate(item)
+                if contact.jid == jid:
+                    return contact
+        return None
+
+
+# Instância única, partilhada pelos handlers e alimentada (invalidações) pelo /inspect.
+metadata = MetadataService(evolution_client)
@@ -0,0 +1,247 @@
+"""
+Módulo de Despacho de Mensagens de Saída.
+
+Os handlers não chamam a Evolution API diretamente para responder: colocam a
+resposta na fila do chat de destino e recebem um `asyncio.Future` com o
+resultado da entrega. Para cada chat `(instance, remoteJid)`:
+
+1. Uma resposta num chat sem fila é enviada de imediato. Quando já há
+   respostas à espera (ex: à espera do limite de taxa ou de um envio em
+   curso), as pendentes são agrupadas numa única mensagem. Opcionalmente,
+   `OUTBOUND_COALESCE_WINDOW` atrasa cada resposta isolada para dar tempo a
+   que outras se juntem (desligado por padrão).
+2. Os envios respeitam limites de taxa (token bucket) por instância e por chat,
+   em vez de disparar rajadas que o WhatsApp e a Evolution estrangulam.
+
+O atraso das respostas e os limites por chat vêm da rota do chat na tabela de
+rotas (`src/infra/routing.py`), com os valores `OUTBOUND_*` como padrão.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from src.infra.config import settings
+from src.infra.log_pipeline import log_context
+from src.infra.routing import routing_table
+from src.services.evolution_api import EvolutionClient, evolution_client
+
+logger = logging.getLogger(__name__)
+
+ChatKey = Tuple[str, str]
+
+
+class TokenBucket:
+    """
+    Limitador de taxa por token bucket.
+
+    `reserve()` retira um token imediatamente (o saldo pode ficar negativo) e
+    retorna quantos segundos o chamador deve esperar até esse token existir.
+    Como a reserva é síncrona, vários chamadores concorrentes ficam em fila
+    sem precisarem de um lock.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    @property
+    def idle(self) -> bool:
+        """True se o bucket já recuperou a capacidade total (pode ser descartado)."""
+        now = time.monotonic()
+        return self._tokens + (now - self._updated) * self.rate >= self.capacity
+
+
+class _PendingMessage:
+    __slots__ = ("text", "quoted_message", "delay", "future")
+
+    def __init__(self, text: str, quoted_message: Optional[Dict[str, Any]], delay: int,
+                 future: asyncio.Future):
+        self.text = text
+        self.quoted_message = quoted_message
+        self.delay = delay
+        self.future = future
+
+
+class OutboundDispatcher:
+    """Filas de saída por chat com agrupamento de mensagens e limites de taxa."""
+
+    def __init__(self, client: EvolutionClient):
+        self._client = client
+        self._queues: Dict[ChatKey, Deque[_PendingMessage]] = {}
+        self._workers: Dict[ChatKey, asyncio.Task] = {}
+        self._instance_buckets: Dict[str, TokenBucket] = {}
+        self._chat_buckets: Dict[ChatKey, TokenBucket] = {}
+        self._accepting = False
+        # Contadores
+        self._submitted = 0
+        self._sent_calls = 0
+        self._coalesced = 0
+        self._dropped = 0
+
+    async def start(self):
+        self._accepting = True
+
+    async def stop(self, timeout: float):
+        """Deixa de aceitar mensagens e aguarda (até `timeout`) que as filas esvaziem."""
+        self._accepting = False
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"{len(pending)} filas de saída canceladas no encerramento.")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def send_text(
+        self,
+        instance: str,
+        to_number: str,
+        text: str,
+        quoted_message: Optional[Dict[str, Any]] = None,
+        delay: Optional[int] = None,
+    ) -> asyncio.Future:
+        """
+        Coloca uma mensagem de texto na fila do chat.
+
+        Returns:
+            Um Future resolvido com a resposta da Evolution API (ou None em caso
+            de falha ou descarte). Aguardá-lo é opcional.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self._accepting:
+            self._dropped += 1
+            logger.warning(f"Despacho de saída parado. Mensagem para {to_number} descartada.")
+            future.set_result(None)
+            return future
+        key = (instance, to_number)
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= settings.OUTBOUND_MAX_PENDING_PER_CHAT:
+            self._dropped += 1
+            logger.warning(f"Fila de saída do chat {to_number} cheia. Mensagem descartada.")
+            future.set_result(None)
+            return future
+        if delay is None:
+            route = routing_table.lookup(instance, to_number)
+            delay = route.reply_delay_ms if route is not None else settings.OUTBOUND_REPLY_DELAY_MS
+        queue.append(_PendingMessage(text, quoted_message, delay, future))
+        self._submitted += 1
+        if key not in self._workers:
+            task = asyncio.create_task(self._chat_worker(key))
+            self._workers[key] = task
+        return future
+
+    def _take_batch(self, queue: Deque[_PendingMessage]) -> List[_PendingMessage]:
+        """
+        Retira da fila o próximo grupo de mensagens a enviar numa única chamada.
+        Mensagens com citação são sempre enviadas sozinhas.
+        """
+        first = queue.popleft()
+        batch = [first]
+        if first.quoted_message is not None:
+            return batch
+        size = len(first.text)
+        separator = settings.OUTBOUND_COALESCE_SEPARATOR
+        while queue and queue[0].quoted_message is None:
+            next_size = size + len(separator) + len(queue[0].text)
+            if next_size > settings.OUTBOUND_COALESCE_MAX_CHARS:
+                break
+            batch.append(queue.popleft())
+            size = next_size
+        return batch
+
+    async def _chat_worker(self, key: ChatKey):
+        instance, to_number = key
+        # O worker serve várias mensagens: não fica com os ids da que o criou.
+        with log_context(inherit=False, instance=instance, chat=to_number):
+            await self._drain_chat(key)
+
+    async def _drain_chat(self, key: ChatKey):
+        instance, to_number = key
+        queue = self._queues[key]
+        try:
+            while queue:
+                # Opcional: dá tempo para que outras respostas ao mesmo chat se juntem a esta.
+                if settings.OUTBOUND_COALESCE_WINDOW > 0 and len(queue) == 1:
+                    await asyncio.sleep(settings.OUTBOUND_COALESCE_WINDOW)
+                # O lote só é formado depois da espera pelo limite de taxa: o que
+                # chegar entretanto segue na mesma mensagem.
+                await self._wait_for_rate_limit(key)
+                batch = self._take_batch(queue)
+                text = settings.OUTBOUND_COALESCE_SEPARATOR.join(message.text for message in batch)
+                result = None
+                try:
+                    result = await self._client.send_text_message(
+                        instance=instance,
+                        to_number=to_number,
+                        text=text,
+                        quoted_message=batch[0].quoted_message,
+                        delay=batch[0].delay,
+                    )
+                except Exception as e:
+                    logger.error(f"Erro inesperado ao enviar mensagem para {to_number}: {e}", exc_info=True)
+                finally:
+                    self._sent_calls += 1
+                    self._coalesced += len(batch) - 1
+                    for message in batch:
+                        if not message.future.done():
+                            message.future.set_result(result)
+        finally:
+            # Liberta o estado do chat quando não há mais nada a enviar.
+            # Se o worker foi cancelado, as mensagens restantes são dadas como não entregues.
+            self._workers.pop(key, None)
+            self._queues.pop(key, None)
+            for message in queue:
+                if not message.future.done():
+                    message.future.set_result(None)
+            queue.clear()
+            bucket = self._chat_buckets.get(key)
+            if bucket is not None and bucket.idle:
+                self._chat_buckets.pop(key, None)
+
+    async def _wait_for_rate_limit(self, key: ChatKey):
+        instance, _ = key
+        instance_bucket = self._instance_buckets.get(instance)
+        if instance_bucket is None:
+            instance_bucket = self._instance_buckets[instance] = TokenBucket(
+                settings.OUTBOUND_INSTANCE_RATE, settings.OUTBOUND_INSTANCE_BURST
+            )
+        chat_bucket = self._chat_buckets.get(key)
+        if chat_bucket is None:
+            route = routing_table.lookup(*key)
+            if route is not None:
+                chat_bucket = TokenBucket(route.chat_rate, route.chat_burst)
+            else:
+                chat_bucket = TokenBucket(settings.OUTBOUND_CHAT_RATE, settings.OUTBOUND_CHAT_BURST)
+            self._chat_buckets[key] = chat_bucket
+        wait = max(chat_bucket.reserve(), instance_bucket.reserve())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de mensagens aceites, chamadas à API, agrupamentos e descartes."""
+        return {
+            "submitted": self._submitted,
+            "api_calls": self._sent_calls,
+            "coalesced": self._coalesced,
+            "dropped": self._dropped,
+            "pending": sum(len(queue) for queue in self._queues.values()),
+            "active_chats": len(self._workers),
+        }
+
+
+# Instância única partilhada por todos os handlers.
+outbound = OutboundDispatcher(evolution_client)
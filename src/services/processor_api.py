@@ -0,0 +1,92 @@
+"""
+Módulo de Serviço para o Endpoint Interno de Processamento.
+
+Usado apenas no modo de despacho "http" (`DISPATCH_MODE=http`), em que o
+endpoint público `/inspect` reencaminha os payloads válidos para
+`/v1/webhook/process`, possivelmente noutro serviço.
+Tal como o `EvolutionClient`, mantém um único pool de conexões partilhado.
+"""
+from typing import Any, Dict, Optional
+import httpx
+import logging
+import time
+from src.infra import json_codec
+from src.infra.config import settings
+from src.infra.dead_letter import dead_letters
+from src.infra.metrics import WEBHOOK_STAGE_SECONDS
+from src.infra.resilience import CircuitOpenError, ResilientCaller, is_safe_to_resend
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessorClient:
+    """Cliente HTTP partilhado para o endpoint interno `/v1/webhook/process`."""
+
+    DEAD_LETTER_KIND = "processor"
+    PROCESS_PATH = "/v1/webhook/process"
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.resilience = ResilientCaller.from_settings("processor")
+
+    async def start(self):
+        """Abre o pool de conexões para o processador interno."""
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=settings.INTERNAL_API_URL,
+            limits=httpx.Limits(
+                max_connections=settings.BACKGROUND_MAX_CONCURRENCY,
+                max_keepalive_connections=settings.BACKGROUND_MAX_CONCURRENCY,
+            ),
+            timeout=httpx.Timeout(settings.EVOLUTION_HTTP_TIMEOUT),
+        )
+
+    async def close(self):
+        """Fecha o pool de conexões."""
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+
+    async def forward(self, raw_payload: bytes):
+        """
+        Envia os bytes JSON originais de um payload validado para o endpoint de
+        processamento interno, sem os voltar a codificar.
+
+        Como `/process` executa comandos (e envia respostas), só as falhas em
+        que o pedido não chegou a ser processado (erro de ligação, 429, 503)
+        são retentadas com backoff; se as tentativas se esgotarem (ou o
+        circuito estiver aberto), o payload vai para a dead-letter. Os erros são propagados para que o supervisor de tarefas
+        os contabilize.
+        """
+        started = time.perf_counter()
+        try:
+            await self.resilience.call(settings.INTERNAL_API_URL, self._post, raw_payload,
+                                       retry_if=is_safe_to_resend)
+        except (CircuitOpenError, httpx.HTTPError) as e:
+            if isinstance(e, CircuitOpenError) or is_safe_to_resend(e):
+                await dead_letters.add(self.DEAD_LETTER_KIND, self.PROCESS_PATH,
+                                       json_codec.loads(raw_payload), str(e))
+            raise
+        finally:
+            WEBHOOK_STAGE_SECONDS.observe(time.perf_counter() - started, "forward")
+        logger.info("Payload encaminhado com sucesso para o processador de comandos.")
+
+    async def _post(self, raw_payload: bytes):
+        if self._client is None:
+            raise RuntimeError("ProcessorClient não foi iniciado.")
+        response = await self._client.post(
+            self.PROCESS_PATH,
+            content=raw_payload,
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+
+    async def replay(self, entry: Dict[str, Any]):
+        """Reenvia uma entrada da dead-letter (lança exceção se voltar a falhar)."""
+        await self._post(json_codec.dumps(entry["payload"]))
+
+
+# Instância única, iniciada no lifespan apenas quando DISPATCH_MODE == "http".
+processor_client = ProcessorClient()
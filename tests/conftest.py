@@ -0,0 +1,6 @@
+"""Configuração mínima para importar `src.infra.config` sem um ficheiro .env."""
+import os
+
+os.environ.setdefault("EVOLUTION_API_URL", "http://localhost:8080")
+os.environ.setdefault("AUTHENTICATION_API_KEY", "test")
+os.environ.setdefault("TARGET_GROUP_ID", "test@g.us")
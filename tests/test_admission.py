@@ -0,0 +1,108 @@
+"""Testes do controlo de admissão por faixas (src/infra/admission.py)."""
+import asyncio
+import pytest
+from src.infra.admission import AdmissionController, AdmissionSlot, Lane, classify_lane
+from src.infra.dispatch_queue import DispatchQueue
+from src.models.evolution import WebhookPayload
+
+COMMANDS = {"/ping", "/ajuda"}
+
+
+def _message(text=None, event="messages.upsert", **message):
+    if text is not None:
+        message["conversation"] = text
+    return {
+        "instance": "instance",
+        "event": event,
+        "data": {
+            "key": {"remoteJid": "123@g.us", "id": "ABC", "fromMe": False},
+            "message": message,
+            "messageTimestamp": 1700000000,
+        },
+    }
+
+
+@pytest.mark.parametrize("payload, lane", [
+    (_message("/ping"), "command"),
+    (_message("  /PING agora"), "command"),
+    (_message(imageMessage={"caption": "/ajuda"}), "command"),
+    (_message(extendedTextMessage={"text": "/ajuda"}), "command"),
+    (_message("/ping", event="MESSAGES_UPSERT"), "command"),
+    (_message("olá /ping"), "message"),
+    (_message("/desconhecido"), "message"),
+    (_message(), "message"),
+    (_message(event="GROUP_PARTICIPANTS_UPDATE"), "message"),
+    (_message(event="groups.update"), "message"),
+    (_message("/ping", event="messages.update"), "status"),
+    (_message(event="presence.update"), "status"),
+    ({"event": None}, "status"),
+    ([], "status"),
+])
+def test_classify_lane(payload, lane):
+    assert classify_lane(payload, COMMANDS) == lane
+
+
+def _controller(load=lambda: 0.0) -> AdmissionController:
+    return AdmissionController(
+        [
+            Lane("command", max_inflight=2, max_load=1.0, policy="reject"),
+            Lane("status", max_inflight=10, max_load=0.5, policy="shed"),
+        ],
+        load=lambda: load(),
+    )
+
+
+def test_lane_is_refused_when_inflight_limit_is_reached_until_a_release():
+    controller = _controller()
+    assert controller.try_admit("command") is None
+    assert controller.try_admit("command") is None
+    assert controller.try_admit("command") == "inflight"
+    controller.release("command")
+    assert controller.try_admit("command") is None
+    assert controller.stats()["counters"] == {"command.admitted": 3, "command.reject_inflight": 1}
+
+
+def test_lower_priority_lane_yields_first_under_downstream_load():
+    load = 0.6
+    controller = _controller(load=lambda: load)
+    assert controller.try_admit("status") == "load"
+    assert controller.try_admit("command") is None
+    load = 0.2
+    assert controller.try_admit("status") is None
+    assert controller.stats()["inflight"] == {"command": 1, "status": 1}
+
+
+def test_slot_release_is_idempotent():
+    controller = _controller()
+    assert controller.try_admit("command") is None
+    slot = AdmissionSlot(controller, "command")
+    slot.release()
+    slot.release()
+    assert controller.lane("command").inflight == 0
+
+
+def test_dispatched_work_holds_the_slot_until_the_handler_finishes():
+    async def scenario():
+        controller = _controller()
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def handler(payload):
+            started.set()
+            await finish.wait()
+            raise RuntimeError("falha no handler")
+
+        queue = DispatchQueue(handler, maxsize=10, workers=1)
+        await queue.start()
+        assert controller.try_admit("command") is None
+        slot = AdmissionSlot(controller, "command")
+        assert queue.submit(WebhookPayload.model_validate(_message("/ping")), on_done=slot.release)
+
+        await started.wait()
+        assert controller.lane("command").inflight == 1
+        finish.set()
+        await queue.stop(timeout=1.0)
+        # Mesmo com o handler a falhar, a vaga é libertada.
+        assert controller.lane("command").inflight == 0
+        assert queue.stats()["failed"] == 1
+
+    asyncio.run(scenario())
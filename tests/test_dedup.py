@@ -0,0 +1,75 @@
+"""Testes da deduplicação de webhooks (src/infra/dedup.py)."""
+import asyncio
+import pytest
+from src.infra import dedup
+from src.infra.dedup import MemoryDedupCache, extract_dedup_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(dedup, "time", clock)
+    return clock
+
+
+def _key(message_id: str):
+    return ("instance", message_id, "messages.upsert")
+
+
+def _seen(cache: MemoryDedupCache, message_id: str) -> bool:
+    return asyncio.run(cache.is_duplicate(_key(message_id)))
+
+
+def test_extract_dedup_key():
+    payload = {"instance": "bot", "event": "messages.upsert", "data": {"key": {"id": "ABC"}}}
+    assert extract_dedup_key(payload) == ("bot", "ABC", "messages.upsert")
+    assert extract_dedup_key({"instance": "bot", "event": "presence.update", "data": {}}) is None
+    assert extract_dedup_key({"data": {"key": {"id": ""}}}) is None
+    assert extract_dedup_key([]) is None
+
+
+def test_redelivery_within_the_ttl_is_a_duplicate(clock):
+    cache = MemoryDedupCache(ttl_seconds=60, max_entries=100)
+    assert _seen(cache, "A") is False
+    assert _seen(cache, "A") is True
+    # O mesmo id noutro evento (ex: messages.update) não é duplicado.
+    assert asyncio.run(cache.is_duplicate(("instance", "A", "messages.update"))) is False
+    assert cache.stats() == {"checked": 3, "duplicates": 1, "duplicate_rate": 1 / 3}
+
+
+def test_key_expires_after_the_ttl(clock):
+    cache = MemoryDedupCache(ttl_seconds=60, max_entries=100)
+    assert _seen(cache, "A") is False
+    clock.now += 59
+    assert _seen(cache, "A") is True
+    clock.now += 2
+    assert _seen(cache, "A") is False
+
+
+def test_least_recently_seen_keys_are_evicted_above_max_entries(clock):
+    cache = MemoryDedupCache(ttl_seconds=60, max_entries=3)
+    for message_id in "ABC":
+        assert _seen(cache, message_id) is False
+    # Ver "A" de novo torna-a a mais recente: "B" passa a ser a primeira a sair.
+    assert _seen(cache, "A") is True
+    assert _seen(cache, "D") is False
+    assert _seen(cache, "B") is False
+    assert _seen(cache, "A") is True
+
+
+def test_forgotten_key_is_processed_again(clock):
+    cache = MemoryDedupCache(ttl_seconds=60, max_entries=100)
+    assert _seen(cache, "A") is False
+    asyncio.run(cache.forget(_key("A")))
+    assert _seen(cache, "A") is False
+    assert _seen(cache, "A") is True
+    # Esquecer uma chave desconhecida não falha.
+    asyncio.run(cache.forget(_key("Z")))
@@ -0,0 +1,170 @@
+"""Testes do `EvolutionClient` (src/services/evolution_api.py) contra um transporte HTTP simulado."""
+import asyncio
+import base64
+import json
+import httpx
+import pytest
+from src.infra.dead_letter import DeadLetterStore
+from src.infra.resilience import ResilientCaller, RetryBudget
+from src.services import evolution_api
+from src.services.evolution_api import EvolutionClient
+
+
+@pytest.fixture
+def dead_letters(tmp_path, monkeypatch):
+    store = DeadLetterStore(str(tmp_path / "dead_letters.jsonl"))
+    monkeypatch.setattr(evolution_api, "dead_letters", store)
+    return store
+
+
+def _client(handler) -> EvolutionClient:
+    client = EvolutionClient()
+    client.resilience = ResilientCaller(
+        name="test",
+        max_attempts=3,
+        base_delay=0.0,
+        max_delay=0.0,
+        budget=RetryBudget(ratio=1.0, min_per_second=0.0),
+        failure_threshold=100,
+        reset_timeout=30.0,
+    )
+    client._client = httpx.AsyncClient(base_url="http://evolution", transport=httpx.MockTransport(handler))
+    return client
+
+
+def _send(client: EvolutionClient):
+    return asyncio.run(client.send_text_message("instance", "123@s.whatsapp.net", "olá"))
+
+
+def test_read_timeout_on_send_is_not_retried_nor_dead_lettered(dead_letters):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        # A Evolution API recebeu o pedido, mas a resposta não chegou a tempo.
+        raise httpx.ReadTimeout("timeout de leitura", request=request)
+
+    assert _send(_client(handler)) is None
+    assert len(attempts) == 1
+    assert asyncio.run(dead_letters.list()) == []
+
+
+def test_connect_error_on_send_is_retried_and_dead_lettered(dead_letters):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        raise httpx.ConnectError("ligação recusada", request=request)
+
+    assert _send(_client(handler)) is None
+    assert len(attempts) == 3
+    entries = asyncio.run(dead_letters.list())
+    assert [entry["target"] for entry in entries] == ["/message/sendText/instance"]
+
+
+def test_service_unavailable_on_send_is_retried_until_it_succeeds(dead_letters):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            return httpx.Response(503)
+        return httpx.Response(201, json={"key": {"id": "ABC"}})
+
+    assert _send(_client(handler)) == {"key": {"id": "ABC"}}
+    assert len(attempts) == 3
+    assert asyncio.run(dead_letters.list()) == []
+
+
+def test_server_error_on_send_is_not_retried(dead_letters):
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(500, json={"error": "falha interna"})
+
+    assert _send(_client(handler)) is None
+    assert len(attempts) == 1
+    assert asyncio.run(dead_letters.list()) == []
+
+
+MESSAGE_KEY = {"id": "ABC", "remoteJid": "123@g.us", "fromMe": False, "participant": "456@s.whatsapp.net"}
+
+
+def test_delete_message_sends_the_key_for_everyone(dead_letters):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(201, json={"status": "ok"})
+
+    client = _client(handler)
+    assert asyncio.run(client.delete_message("instance", MESSAGE_KEY)) == {"status": "ok"}
+    assert [(r.method, r.url.path) for r in requests] == [("DELETE", "/chat/deleteMessageForEveryone/instance")]
+    assert json.loads(requests[0].content) == MESSAGE_KEY
+
+
+def test_dead_lettered_delete_is_replayed_with_the_same_method(dead_letters):
+    requests = []
+
+    def unreachable(request):
+        raise httpx.ConnectError("ligação recusada", request=request)
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(201, json={"status": "ok"})
+
+    assert asyncio.run(_client(unreachable).delete_message("instance", MESSAGE_KEY)) is None
+    [entry] = asyncio.run(dead_letters.list())
+    asyncio.run(_client(handler).replay(entry))
+    assert [(r.method, r.url.path) for r in requests] == [("DELETE", "/chat/deleteMessageForEveryone/instance")]
+    assert json.loads(requests[0].content) == MESSAGE_KEY
+
+
+# --- _Base64FieldDecoder ---
+
+MEDIA = bytes(range(256)) * 3 + b"fim"
+
+
+def _json_body(encoded: bytes) -> bytes:
+    return b'{"mediaType": "imageMessage", "base64": "' + encoded + b'", "mimetype": "image/jpeg"}'
+
+
+def _decode(body: bytes, chunk_size: int) -> bytes:
+    decoder = evolution_api._Base64FieldDecoder()
+    out = b"".join(decoder.feed(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size))
+    decoder.finish()
+    return out
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 4096])
+def test_decoder_handles_markers_and_padding_split_across_chunks(chunk_size):
+    body = _json_body(base64.b64encode(MEDIA))
+    assert _decode(body, chunk_size) == MEDIA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64])
+def test_decoder_accepts_data_url_prefix(chunk_size):
+    body = _json_body(b"data:image/jpeg;base64," + base64.b64encode(MEDIA))
+    assert _decode(body, chunk_size) == MEDIA
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 76, 4096])
+def test_decoder_undoes_slash_and_line_break_escapes(chunk_size):
+    # Base64 com quebras de linha a cada 76 caracteres, serializado em JSON ("\n", "\/").
+    wrapped = base64.encodebytes(MEDIA).replace(b"\n", b"\\n").replace(b"/", b"\\/")
+    assert b"\\n" in wrapped and b"\\/" in wrapped
+    assert _decode(_json_body(wrapped), chunk_size) == MEDIA
+
+
+@pytest.mark.parametrize("escape", [b"\\u0041", b"\\t", b"\\\\", b"\\\""])
+def test_decoder_rejects_other_escapes(escape):
+    encoded = base64.b64encode(MEDIA)
+    body = _json_body(encoded[:8] + escape + encoded[8:])
+    with pytest.raises(ValueError):
+        _decode(body, 5)
+
+
+def test_decoder_requires_the_base64_field():
+    with pytest.raises(ValueError):
+        _decode(b'{"mediaType": "imageMessage"}', 4)
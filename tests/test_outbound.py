@@ -0,0 +1,147 @@
+"""Testes do despacho de saída: agrupamento por chat e token bucket (src/services/outbound.py)."""
+import asyncio
+import pytest
+from src.infra.config import settings
+from src.services import outbound
+from src.services.outbound import OutboundDispatcher, TokenBucket
+
+CHAT = "999@g.us"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class _FakeClient:
+    """Regista os envios; cada envio espera por `release` para simular uma chamada em curso."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def send_text_message(self, instance, to_number, text, quoted_message=None, delay=None):
+        self.calls.append({"to": to_number, "text": text, "quoted": quoted_message, "delay": delay})
+        await self.release.wait()
+        return {"key": {"id": f"S{len(self.calls)}"}}
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOUND_INSTANCE_RATE", 0.0)
+    monkeypatch.setattr(settings, "OUTBOUND_CHAT_RATE", 0.0)
+    monkeypatch.setattr(settings, "OUTBOUND_COALESCE_WINDOW", 0.0)
+    monkeypatch.setattr(settings, "OUTBOUND_COALESCE_SEPARATOR", "\n")
+
+
+def _run(scenario):
+    async def main():
+        client = _FakeClient()
+        dispatcher = OutboundDispatcher(client)
+        await dispatcher.start()
+        await scenario(dispatcher, client)
+        client.release.set()
+        await dispatcher.stop(timeout=1.0)
+
+    asyncio.run(main())
+
+
+def test_replies_waiting_behind_a_send_are_coalesced():
+    async def scenario(dispatcher, client):
+        first = dispatcher.send_text("bot", CHAT, "um")
+        await asyncio.sleep(0)
+        # "um" já está a ser enviado; as seguintes acumulam-se atrás dele.
+        rest = [dispatcher.send_text("bot", CHAT, text) for text in ("dois", "três", "quatro")]
+        client.release.set()
+        results = await asyncio.gather(first, *rest)
+
+        assert [call["text"] for call in client.calls] == ["um", "dois\ntrês\nquatro"]
+        assert results == [{"key": {"id": "S1"}}] + [{"key": {"id": "S2"}}] * 3
+        assert dispatcher.stats()["coalesced"] == 2
+        assert dispatcher.stats()["api_calls"] == 2
+
+    _run(scenario)
+
+
+def test_quoted_replies_and_the_size_limit_split_batches(monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOUND_COALESCE_MAX_CHARS", 10)
+
+    async def scenario(dispatcher, client):
+        futures = [dispatcher.send_text("bot", CHAT, "início")]
+        await asyncio.sleep(0)
+        quoted = {"key": {"id": "Q"}}
+        futures += [
+            dispatcher.send_text("bot", CHAT, "aaaa"),
+            dispatcher.send_text("bot", CHAT, "bbbb"),
+            dispatcher.send_text("bot", CHAT, "cccc"),
+            dispatcher.send_text("bot", CHAT, "citada", quoted_message=quoted),
+            dispatcher.send_text("bot", CHAT, "fim"),
+        ]
+        client.release.set()
+        await asyncio.gather(*futures)
+
+        assert [(call["text"], call["quoted"]) for call in client.calls] == [
+            ("início", None),
+            ("aaaa\nbbbb", None),
+            ("cccc", None),
+            ("citada", quoted),
+            ("fim", None),
+        ]
+
+    _run(scenario)
+
+
+def test_chats_are_independent_and_use_the_default_delay():
+    async def scenario(dispatcher, client):
+        client.release.set()
+        results = await asyncio.gather(
+            dispatcher.send_text("bot", CHAT, "a"),
+            dispatcher.send_text("bot", "888@g.us", "b"),
+        )
+        assert sorted(call["to"] for call in client.calls) == ["888@g.us", CHAT]
+        assert all(call["delay"] == settings.OUTBOUND_REPLY_DELAY_MS for call in client.calls)
+        assert None not in results
+        assert dispatcher.stats()["active_chats"] == 0
+
+    _run(scenario)
+
+
+def test_full_chat_queue_and_stopped_dispatcher_drop_messages(monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOUND_MAX_PENDING_PER_CHAT", 2)
+
+    async def scenario(dispatcher, client):
+        futures = [dispatcher.send_text("bot", CHAT, str(i)) for i in range(3)]
+        assert futures[2].done() and futures[2].result() is None
+        assert dispatcher.stats()["dropped"] == 1
+
+    _run(scenario)
+
+    async def stopped():
+        dispatcher = OutboundDispatcher(_FakeClient())
+        future = dispatcher.send_text("bot", CHAT, "olá")
+        assert future.done() and future.result() is None
+
+    asyncio.run(stopped())
+
+
+def test_token_bucket_allows_a_burst_then_spaces_reservations(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(outbound, "time", clock)
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Sem tokens: cada reserva seguinte espera mais meio segundo.
+    assert [bucket.reserve() for _ in range(2)] == [0.5, 1.0]
+    assert not bucket.idle
+    clock.now += 1.0
+    assert bucket.reserve() == 0.5
+    clock.now += 10
+    assert bucket.idle
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.0, 0.5]
+
+
+def test_token_bucket_with_zero_rate_never_waits():
+    bucket = TokenBucket(rate=0.0, capacity=1)
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
@@ -0,0 +1,82 @@
+"""Testes do roteamento por trie do `CommandRegistry` (src/commands/registry.py)."""
+import pytest
+from src.commands.registry import Arg, ArgumentError, CommandRegistry
+
+
+async def _handler(payload, args):
+    pass
+
+
+def _registry() -> CommandRegistry:
+    registry = CommandRegistry()
+    registry.command("/ping", aliases=["/p"])(_handler)
+    registry.command("/perfil")(_handler)
+    registry.command("/soma", args=[Arg("a", int), Arg("b", int, required=False, default=0)])(_handler)
+    registry.command("/eco", args=[Arg("texto", greedy=True)])(_handler)
+    registry.command("/config")(_handler)
+    registry.get("/config").subcommand("set", aliases=["s"], args=[Arg("chave"), Arg("valor", greedy=True)])(_handler)
+    return registry
+
+
+def _name(registry: CommandRegistry, text: str):
+    invocation = registry.resolve(text)
+    return invocation.command.name if invocation is not None else None
+
+
+def test_exact_words_and_aliases_resolve_to_the_command():
+    registry = _registry()
+    assert _name(registry, "/ping") == "/ping"
+    assert _name(registry, "  /PING agora") == "/ping"
+    # "/p" é um alias registado: tem precedência sobre a ambiguidade com /perfil.
+    assert _name(registry, "/p") == "/ping"
+    assert _name(registry, "/perfil") == "/perfil"
+
+
+def test_unique_prefix_resolves_but_ambiguous_or_short_prefix_does_not():
+    registry = _registry()
+    assert _name(registry, "/pi") == "/ping"
+    assert _name(registry, "/pe") == "/perfil"
+    assert _name(registry, "/so 1") == "/soma"
+    assert _name(registry, "/c") == "/config"
+    # "/" sozinho está abaixo do prefixo mínimo.
+    assert _name(registry, "/") is None
+
+
+def test_text_that_is_not_a_command_is_rejected():
+    registry = _registry()
+    assert registry.resolve("olá a todos") is None
+    assert registry.resolve("/pingue") is None
+    assert registry.resolve("/desconhecido") is None
+    assert registry.resolve("") is None
+
+
+def test_registering_a_word_twice_is_rejected():
+    registry = _registry()
+    with pytest.raises(ValueError):
+        registry.command("/x", aliases=["/ping"])(_handler)
+    # Um prefixo de uma palavra existente pode ser registado e passa a ter precedência.
+    registry.command("/pin")(_handler)
+    assert _name(registry, "/pin") == "/pin"
+    assert _name(registry, "/pi") is None
+
+
+def test_arguments_are_converted_to_the_declared_types():
+    registry = _registry()
+    assert registry.resolve("/soma 2 3").args == {"a": 2, "b": 3}
+    assert registry.resolve("/soma 2").args == {"a": 2, "b": 0}
+    assert registry.resolve("/eco  olá   mundo ").args == {"texto": "olá   mundo"}
+    with pytest.raises(ArgumentError):
+        registry.resolve("/soma")
+    with pytest.raises(ArgumentError):
+        registry.resolve("/soma dois")
+
+
+def test_subcommands_and_their_aliases_are_resolved_after_the_command():
+    registry = _registry()
+    for text in ("/config set tema escuro total", "/conf S tema escuro total"):
+        invocation = registry.resolve(text)
+        assert invocation.command.name == "set"
+        assert invocation.command.root.name == "/config"
+        assert invocation.args == {"chave": "tema", "valor": "escuro total"}
+    # Sem subcomando reconhecido, fica o comando de topo.
+    assert _name(registry, "/config outro") == "/config"
@@ -0,0 +1,103 @@
+"""Testes do circuit breaker do `ResilientCaller` (src/infra/resilience.py)."""
+import asyncio
+import httpx
+from src.infra.resilience import CircuitOpenError, ResilientCaller, RetryBudget
+
+
+def _caller(reset_timeout: float) -> ResilientCaller:
+    return ResilientCaller(
+        name="test",
+        max_attempts=1,
+        base_delay=0.0,
+        max_delay=0.0,
+        budget=RetryBudget(ratio=0.0, min_per_second=0.0),
+        failure_threshold=1,
+        reset_timeout=reset_timeout,
+    )
+
+
+async def _fail():
+    raise httpx.ConnectError("ligação recusada")
+
+
+async def _ok():
+    return "ok"
+
+
+def test_cancelled_half_open_probe_releases_the_circuit():
+    async def scenario():
+        caller = _caller(reset_timeout=0.01)
+        try:
+            await caller.call("instance", _fail)
+        except httpx.ConnectError:
+            pass
+        assert caller.breaker("instance").state == "open"
+        await asyncio.sleep(0.02)
+        assert caller.breaker("instance").state == "half_open"
+
+        # A chamada de teste fica pendurada e é cancelada (ex: timeout do handler).
+        probe = asyncio.create_task(caller.call("instance", asyncio.sleep, 10))
+        await asyncio.sleep(0)
+        try:
+            await caller.call("instance", _ok)
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("Uma segunda chamada não devia passar durante o teste.")
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        assert await caller.call("instance", _ok) == "ok"
+        assert caller.breaker("instance").state == "closed"
+
+    asyncio.run(scenario())
+
+
+async def _bad_request():
+    request = httpx.Request("POST", "http://evolution/message/sendText/i")
+    raise httpx.HTTPStatusError("400", request=request, response=httpx.Response(400, request=request))
+
+
+async def _local_bug():
+    raise ValueError("resposta ilegível")
+
+
+async def _open_until_half_open(caller: ResilientCaller):
+    try:
+        await caller.call("instance", _fail)
+    except httpx.ConnectError:
+        pass
+    await asyncio.sleep(0.02)
+    assert caller.breaker("instance").state == "half_open"
+
+
+def test_local_error_in_half_open_probe_does_not_close_the_circuit():
+    async def scenario():
+        caller = _caller(reset_timeout=0.01)
+        await _open_until_half_open(caller)
+        try:
+            await caller.call("instance", _local_bug)
+        except ValueError:
+            pass
+        # Nem fechado nem preso: a próxima chamada volta a ser a chamada de teste.
+        assert caller.breaker("instance").state == "half_open"
+        assert await caller.call("instance", _ok) == "ok"
+        assert caller.breaker("instance").state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_client_error_response_closes_a_half_open_circuit():
+    async def scenario():
+        caller = _caller(reset_timeout=0.01)
+        await _open_until_half_open(caller)
+        try:
+            await caller.call("instance", _bad_request)
+        except httpx.HTTPStatusError:
+            pass
+        assert caller.breaker("instance").state == "closed"
+
+    asyncio.run(scenario())
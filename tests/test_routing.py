@@ -0,0 +1,125 @@
+"""Testes da tabela de rotas por instância e grupo (src/infra/routing.py)."""
+import asyncio
+import json
+import os
+import pytest
+from src.infra.config import settings
+from src.infra.routing import RoutingTable, parse_routes
+
+CONFIG = {
+    "defaults": {"reply_delay_ms": 500},
+    "routes": [
+        {"instance": "bot", "remoteJid": "1@g.us", "commands": ["/PING"]},
+        {"instance": "*", "remoteJid": "1@g.us", "chat_rate": 0.5},
+        {"instance": "bot", "remoteJid": "*", "reply_delay_ms": 0},
+        {"instance": "*", "remoteJid": "2@g.us", "commands": "*"},
+    ],
+}
+
+
+def _write(path, config):
+    path.write_text(json.dumps(config), encoding="utf-8")
+
+
+def _table(tmp_path, config=CONFIG, reload_interval: float = 0.0) -> RoutingTable:
+    path = tmp_path / "routes.json"
+    _write(path, config)
+    return RoutingTable(str(path), reload_interval)
+
+
+def _where(route):
+    return (route.instance, route.remote_jid) if route is not None else None
+
+
+def test_lookup_prefers_the_most_specific_route(tmp_path):
+    table = _table(tmp_path)
+    assert _where(table.lookup("bot", "1@g.us")) == ("bot", "1@g.us")
+    assert _where(table.lookup("outro", "1@g.us")) == ("*", "1@g.us")
+    assert _where(table.lookup("bot", "3@g.us")) == ("bot", "*")
+    assert _where(table.lookup("outro", "2@g.us")) == ("*", "2@g.us")
+    assert table.lookup("outro", "3@g.us") is None
+
+
+def test_route_settings_and_commands(tmp_path):
+    table = _table(tmp_path)
+    exact = table.lookup("bot", "1@g.us")
+    assert exact.allows("/ping") and not exact.allows("/perfil")
+    assert exact.reply_delay_ms == 500
+    assert table.lookup("outro", "1@g.us").chat_rate == 0.5
+    assert table.lookup("bot", "3@g.us").reply_delay_ms == 0
+    assert table.lookup("outro", "2@g.us").allows("/qualquer")
+
+
+def test_contains_honours_the_chat_wildcard(tmp_path):
+    assert "3@g.us" not in _table(tmp_path, {"routes": [{"remoteJid": "1@g.us"}]})
+    assert "1@g.us" in _table(tmp_path, {"routes": [{"remoteJid": "1@g.us"}]})
+    # Uma rota "remoteJid": "*" faz com que qualquer chat passe o pré-filtro.
+    assert "3@g.us" in _table(tmp_path)
+
+
+@pytest.mark.parametrize("config", [
+    [],
+    {"routes": {}},
+    {"routes": [1]},
+    {"routes": [{"instance": "bot"}]},
+    {"routes": [{"remoteJid": "1@g.us", "cor": "azul"}]},
+    {"routes": [{"remoteJid": "1@g.us"}, {"instance": "*", "remoteJid": "1@g.us"}]},
+    {"routes": [{"remoteJid": "1@g.us", "commands": "/ping"}]},
+    {"routes": [{"remoteJid": "1@g.us", "chat_rate": "rápido"}]},
+    {"defaults": ["reply_delay_ms"], "routes": []},
+])
+def test_invalid_configuration_is_rejected(config):
+    with pytest.raises(ValueError):
+        parse_routes(config)
+
+
+def test_reload_keeps_the_previous_table_when_the_file_is_invalid(tmp_path):
+    table = _table(tmp_path)
+    path = tmp_path / "routes.json"
+    path.write_text("{ não é json", encoding="utf-8")
+    with pytest.raises(ValueError):
+        table.load()
+    assert _where(table.lookup("bot", "1@g.us")) == ("bot", "1@g.us")
+    _write(path, {"routes": [{"remoteJid": "9@g.us"}]})
+    table.load()
+    assert table.lookup("bot", "1@g.us") is None
+    assert _where(table.lookup("bot", "9@g.us")) == ("*", "9@g.us")
+
+
+def test_file_changes_are_picked_up_without_restarting(tmp_path):
+    async def scenario():
+        table = _table(tmp_path, reload_interval=0.01)
+        path = tmp_path / "routes.json"
+        await table.start()
+        try:
+            _write(path, {"routes": [{"remoteJid": "9@g.us"}]})
+            # Garante que o mtime muda mesmo em sistemas de ficheiros com pouca resolução.
+            mtime = path.stat().st_mtime + 10
+            os.utime(path, (mtime, mtime))
+            for _ in range(100):
+                if table.lookup("x", "9@g.us") is not None:
+                    break
+                await asyncio.sleep(0.01)
+            assert table.lookup("bot", "1@g.us") is None
+            assert _where(table.lookup("x", "9@g.us")) == ("*", "9@g.us")
+            assert table.reloads == 2
+        finally:
+            await table.close()
+
+    asyncio.run(scenario())
+
+
+def test_without_a_file_the_target_group_is_the_only_route(monkeypatch):
+    monkeypatch.setattr(settings, "TARGET_GROUP_ID", "alvo@g.us")
+    table = RoutingTable(None, 0.0)
+    assert _where(table.lookup("qualquer", "alvo@g.us")) == ("*", "alvo@g.us")
+    assert table.lookup("qualquer", "outro@g.us") is None
+
+
+def test_without_any_route_startup_fails_unless_explicitly_allowed(monkeypatch):
+    monkeypatch.setattr(settings, "TARGET_GROUP_ID", None)
+    with pytest.raises(ValueError):
+        RoutingTable(None, 0.0)
+    monkeypatch.setattr(settings, "ROUTES_ALLOW_EMPTY", True)
+    table = RoutingTable(None, 0.0)
+    assert "1@g.us" not in table
@@ -0,0 +1,95 @@
+"""Testes dos filtros e da projeção das subscrições do inspetor (src/infra/subscriptions.py)."""
+import pytest
+from src.infra.subscriptions import Subscription, extract_event_fields
+
+
+def _entry(event="messages.upsert", instance="bot", remote_jid="1@g.us", from_me=False):
+    return {
+        "timestamp": "2026-01-01T00:00:00+00:00",
+        "payload": {
+            "event": event,
+            "instance": instance,
+            "data": {
+                "key": {"remoteJid": remote_jid, "id": "ABC", "fromMe": from_me},
+                "message": {"conversation": "olá"},
+                "mentions": ["a@s.whatsapp.net", "b@s.whatsapp.net"],
+            },
+        },
+    }
+
+
+def _matches(message, entry) -> bool:
+    return Subscription.from_message(message).matches(extract_event_fields(entry))
+
+
+def test_extract_event_fields():
+    assert extract_event_fields(_entry(event="MESSAGES_UPSERT", from_me=True)) == (
+        "messages.upsert", "bot", "1@g.us", True,
+    )
+    assert extract_event_fields({"payload": {"event": "presence.update"}}) == ("presence.update", None, None, None)
+    assert extract_event_fields({"payload": None}) == (None, None, None, None)
+
+
+def test_without_filters_everything_matches():
+    assert _matches({"action": "subscribe"}, _entry())
+    assert _matches({"action": "subscribe", "filters": {}}, {"payload": None})
+
+
+@pytest.mark.parametrize("filters, entry, expected", [
+    ({"event": "MESSAGES_UPSERT"}, _entry(), True),
+    ({"event": ["messages.update", "messages.upsert"]}, _entry(), True),
+    ({"event": "messages.update"}, _entry(), False),
+    ({"instance": ["bot", "outro"]}, _entry(instance="outro"), True),
+    ({"instance": "bot"}, _entry(instance="outro"), False),
+    ({"remoteJid": "1@g.us", "fromMe": False}, _entry(), True),
+    ({"remoteJid": "1@g.us", "fromMe": True}, _entry(), False),
+    ({"fromMe": False}, {"payload": {"event": "presence.update"}}, False),
+    ({"event": "messages.upsert", "instance": "bot", "remoteJid": "2@g.us"}, _entry(), False),
+])
+def test_filters_combine_with_and(filters, entry, expected):
+    assert _matches({"filters": filters}, entry) is expected
+
+
+@pytest.mark.parametrize("message", [
+    {"filters": ["event"]},
+    {"filters": {"participant": "x"}},
+    {"filters": {"event": 1}},
+    {"filters": {"instance": ["bot", 2]}},
+    {"filters": {"fromMe": "false"}},
+    {"fields": "timestamp"},
+    {"fields": ["$."]},
+])
+def test_invalid_subscriptions_are_rejected(message):
+    with pytest.raises(ValueError):
+        Subscription.from_message(message)
+
+
+def test_projection_by_json_paths():
+    subscription = Subscription.from_message({"fields": [
+        "timestamp",
+        "$.payload.data.key.id",
+        "payload.data.message.conversation",
+        "payload.data.mentions[1]",
+        "payload.data.mentions.0",
+        "payload.data.mentions.5",
+        "payload.data.ausente",
+        "payload.event.x",
+    ]})
+    assert subscription.project(_entry()) == {
+        "timestamp": "2026-01-01T00:00:00+00:00",
+        "$.payload.data.key.id": "ABC",
+        "payload.data.message.conversation": "olá",
+        "payload.data.mentions[1]": "b@s.whatsapp.net",
+        "payload.data.mentions.0": "a@s.whatsapp.net",
+    }
+
+
+def test_describe_returns_the_normalized_subscription():
+    subscription = Subscription.from_message({
+        "filters": {"event": ["MESSAGES_UPSERT"], "instance": "bot"},
+        "fields": ["timestamp"],
+    })
+    assert subscription.describe() == {
+        "filters": {"event": ["messages.upsert"], "instance": ["bot"], "remoteJid": None, "fromMe": None},
+        "fields": ["timestamp"],
+    }
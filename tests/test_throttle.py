@@ -0,0 +1,111 @@
+"""Testes da limitação de comandos por GCRA (src/commands/throttle.py)."""
+import asyncio
+import pytest
+from src.commands import throttle
+from src.commands.throttle import CommandThrottle, Limit, MemoryThrottle, create_command_throttle
+from src.infra.config import settings
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(throttle, "time", clock)
+    return clock
+
+
+def _check(command_throttle: CommandThrottle, participant: str = "membro", command: str = "/ping",
+           declared=None):
+    return asyncio.run(command_throttle.check("instance", "123@g.us", participant, command, declared))
+
+
+@pytest.mark.parametrize("text, count, period", [
+    ("5/60s", 5, 60.0), ("20/1m", 20, 60.0), ("3/s", 3, 1.0), ("100/1h", 100, 3600.0),
+])
+def test_limit_parse(text, count, period):
+    limit = Limit.parse(text)
+    assert (limit.count, limit.period) == (count, period)
+
+
+@pytest.mark.parametrize("text", ["5", "0/60s", "5/60x", "cinco/60s"])
+def test_limit_parse_rejects_invalid_text(text):
+    with pytest.raises(ValueError):
+        Limit.parse(text)
+
+
+def test_burst_up_to_the_count_then_one_per_interval(clock):
+    backend = MemoryThrottle(max_keys=100)
+    checks = [("user", ("a",), Limit.parse("3/30s"))]
+
+    def acquire():
+        return asyncio.run(backend.acquire(checks))
+
+    assert [acquire() for _ in range(4)] == [None, None, None, "user"]
+    # Cada invocação custa 10s: ao fim de 10s volta a caber exatamente uma.
+    clock.now += 10
+    assert acquire() is None
+    assert acquire() == "user"
+    # Com o bucket de novo cheio, a chave já pode ser esquecida.
+    clock.now += 100
+    assert [acquire() for _ in range(4)] == [None, None, None, "user"]
+    assert backend.stats()["throttled"] == {"user": 3}
+
+
+def test_nothing_is_consumed_when_one_of_the_limits_is_exceeded(clock):
+    backend = MemoryThrottle(max_keys=100)
+    user = ("user", ("a",), Limit.parse("5/60s"))
+    chat = ("chat", ("chat",), Limit.parse("1/60s"))
+    assert asyncio.run(backend.acquire([user, chat])) is None
+    for _ in range(3):
+        assert asyncio.run(backend.acquire([user, chat])) == "chat"
+    # As tentativas recusadas não gastaram o limite do participante.
+    assert [asyncio.run(backend.acquire([user])) for _ in range(5)] == [None] * 4 + ["user"]
+
+
+def test_memory_backend_is_bounded_by_max_keys(clock):
+    backend = MemoryThrottle(max_keys=10)
+    limit = Limit.parse("1/60s")
+    for i in range(50):
+        asyncio.run(backend.acquire([("user", (i,), limit)]))
+    assert backend.stats()["keys"] == 10
+
+
+def test_chat_limit_is_shared_by_all_members(clock):
+    command_throttle = CommandThrottle(MemoryThrottle(max_keys=100), default_limit=None,
+                                       chat_limit=Limit.parse("2/60s"), command_limits={})
+    assert _check(command_throttle, "a") is None
+    assert _check(command_throttle, "b") is None
+    assert _check(command_throttle, "c") == "chat"
+
+
+def test_only_commands_with_a_limit_are_limited_per_member(clock):
+    command_throttle = CommandThrottle(MemoryThrottle(max_keys=100), default_limit=None,
+                                       chat_limit=None, command_limits={})
+    assert [_check(command_throttle) for _ in range(20)] == [None] * 20
+    assert [_check(command_throttle, command="/sorteio", declared="1/60s") for _ in range(2)] == [None, "user"]
+    # Outro membro tem o seu próprio contador.
+    assert _check(command_throttle, "outro", command="/sorteio", declared="1/60s") is None
+
+
+def test_configured_command_limits_override_the_registry(clock, monkeypatch):
+    monkeypatch.setattr(settings, "THROTTLE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "THROTTLE_DEFAULT_LIMIT", "unlimited")
+    monkeypatch.setattr(settings, "THROTTLE_CHAT_LIMIT", "unlimited")
+    monkeypatch.setattr(settings, "THROTTLE_COMMAND_LIMITS", {"/PING": "2/10s", "/sorteio": "unlimited"})
+    command_throttle = create_command_throttle()
+
+    assert [_check(command_throttle, declared="10/10s") for _ in range(3)] == [None, None, "user"]
+    assert [_check(command_throttle, command="/sorteio", declared="1/60s") for _ in range(3)] == [None] * 3
+    assert command_throttle.limit_for("/outro", None) is None
+
+
+def test_throttling_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "THROTTLE_ENABLED", False)
+    assert create_command_throttle() is None